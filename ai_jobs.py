@@ -0,0 +1,172 @@
+"""Background AI analysis jobs with pluggable language-model backends.
+
+Calls to a hosted model take seconds, so they never run in a request
+handler: AnalysisJobRunner executes them on a small bounded thread pool
+and collapses concurrent submissions for the same job key into one run.
+The backend is chosen by configuration; StubAnalysisBackend is a local,
+deterministic stand-in that needs no network or API key.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AnalysisQueueFullError(Exception):
+    """Raised when the analysis job queue is at capacity"""
+
+
+class AnalysisBackend:
+    """Turns an analysis context (patient conditions + NumPy statistics) into a narrative"""
+
+    name = 'base'
+
+    def analyze(self, context):
+        raise NotImplementedError
+
+
+class StubAnalysisBackend(AnalysisBackend):
+    """Deterministic template backend: identical context, identical output"""
+
+    name = 'stub'
+
+    def analyze(self, context):
+        analysis = context['analysis']
+        conditions = [name for name, tracked in context['conditions'].items() if tracked] or ['no conditions']
+        statistics = analysis.get('severity_statistics', {})
+        lines = [
+            f"Tracking {', '.join(conditions)} over {analysis.get('data_points_analyzed', 0)} logs.",
+            f"Outlook: {analysis.get('prediction_type', 'insufficient_data')}"
+            f" (confidence {analysis.get('confidence_score', 0)}).",
+        ]
+        if statistics:
+            lines.append(f"Recent average severity {statistics['recent_average']}"
+                         f" against {statistics['overall_average']} overall.")
+        lines += [f"- {item}" for item in analysis.get('recommendations', [])]
+        fingerprint = hashlib.sha1(json.dumps(context, sort_keys=True, default=str).encode()).hexdigest()[:12]
+        return {'summary': '\n'.join(lines), 'model': 'stub', 'fingerprint': fingerprint}
+
+
+class OpenAIAnalysisBackend(AnalysisBackend):
+    """Chat completion via the openai 0.28 client"""
+
+    name = 'openai'
+
+    def __init__(self, api_key, model='gpt-3.5-turbo', timeout=60):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+
+    def analyze(self, context):
+        import openai  # Optional dependency; only needed when this backend is configured
+
+        response = openai.ChatCompletion.create(
+            api_key=self.api_key,
+            model=self.model,
+            temperature=0.2,
+            request_timeout=self.timeout,
+            messages=[
+                {'role': 'system', 'content': (
+                    'You are assisting an ENT doctor. Summarise the patient symptom statistics '
+                    'you are given in a short clinical note. Do not invent data.')},
+                {'role': 'user', 'content': json.dumps(context, default=str)}
+            ]
+        )
+        return {
+            'summary': response['choices'][0]['message']['content'].strip(),
+            'model': response.get('model', self.model)
+        }
+
+
+def build_analysis_backend(config):
+    """Backend named by AI_ANALYSIS_BACKEND; 'auto' uses OpenAI only when a key is set"""
+    name = config.get('AI_ANALYSIS_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'openai' if config.get('OPENAI_API_KEY') else 'stub'
+    if name == 'openai':
+        return OpenAIAnalysisBackend(config['OPENAI_API_KEY'], config['AI_ANALYSIS_MODEL'],
+                                     config['AI_ANALYSIS_TIMEOUT'])
+    if name == 'stub':
+        return StubAnalysisBackend()
+    raise ValueError(f'Unknown AI_ANALYSIS_BACKEND: {name}')
+
+
+class AnalysisJobRunner:
+    """Bounded thread pool that runs each job key at most once at a time.
+
+    ``workers=0`` runs jobs inline, which keeps tests and CLI use simple.
+    Like the password hasher, the pool is created lazily and re-created
+    after a fork.
+    """
+
+    def __init__(self, workers=2, max_pending=32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.failed = 0
+        atexit.register(self.shutdown)
+
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ai-analysis')
+            self._executor_pid = os.getpid()
+            self._in_flight = {}
+        return self._executor
+
+    def submit(self, key, func, *args):
+        """Schedule ``func(*args)`` unless a job with ``key`` is already queued or running"""
+        if not self.workers:
+            self.submitted += 1
+            self._call(key, func, *args)
+            return True
+
+        with self._lock:
+            executor = self._get_executor()
+            if key in self._in_flight:
+                self.deduplicated += 1
+                return False
+            if len(self._in_flight) >= self.max_pending:
+                self.rejected += 1
+                raise AnalysisQueueFullError('AI analysis queue is full')
+            # Registered under the lock, so _call cannot clear it before it is set
+            self._in_flight[key] = True
+            executor.submit(self._call, key, func, *args)
+            self.submitted += 1
+            return True
+
+    def _call(self, key, func, *args):
+        try:
+            func(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'in_flight': len(self._in_flight),
+                'max_pending': self.max_pending,
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'failed': self.failed
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
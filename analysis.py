@@ -0,0 +1,319 @@
+"""Symptom trend analysis computed on the server with NumPy.
+
+This mirrors the rules the AI Analysis page used to run in the browser
+(calculateTrend, calculateVariability, recommendations, risk factors...)
+so the doctor UI only has to render the result.
+"""
+import math
+from datetime import datetime
+
+import numpy as np
+
+RHINITIS_FIELDS = [
+    'rhinitis_runny_nose', 'rhinitis_congestion', 'rhinitis_sneezing',
+    'rhinitis_itchiness', 'rhinitis_loss_smell'
+]
+TINNITUS_FIELDS = ['tinnitus_loudness', 'tinnitus_impact']
+SERIES_FIELDS = RHINITIS_FIELDS + ['vertigo_severity'] + TINNITUS_FIELDS
+
+MIN_DATA_POINTS = 3
+RECENT_WINDOW = 7
+
+
+def _row_mean(block):
+    """Mean of the non-null values in each row, NaN where a row has none"""
+    counts = np.sum(~np.isnan(block), axis=1)
+    sums = np.nansum(block, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def build_severity_series(rows, conditions):
+    """Per-log condition averages and overall severity as NumPy arrays.
+
+    ``rows`` are sequences ordered like SERIES_FIELDS (None for missing
+    scores), oldest first. ``conditions`` maps rhinitis/vertigo/tinnitus
+    to booleans. Matches calculate_log_severity() in app.py.
+    """
+    if len(rows) == 0:
+        empty = np.empty(0)
+        return {'overall': empty, 'rhinitis': empty, 'vertigo': empty, 'tinnitus': empty}
+
+    matrix = np.array(rows, dtype=float)  # None becomes NaN
+    rhinitis = matrix[:, :5]
+    vertigo = matrix[:, 5]
+    tinnitus = matrix[:, 6:8]
+
+    active = []
+    if conditions.get('rhinitis'):
+        active.append(rhinitis)
+    if conditions.get('vertigo'):
+        # A zero vertigo score does not count towards the overall average
+        active.append(np.where(vertigo == 0, np.nan, vertigo)[:, None])
+    if conditions.get('tinnitus'):
+        active.append(tinnitus)
+
+    if active:
+        overall = np.nan_to_num(_row_mean(np.hstack(active)), nan=0.0)
+    else:
+        overall = np.zeros(len(rows))
+
+    nan_series = np.full(len(rows), np.nan)
+    return {
+        'overall': np.round(overall, 2),
+        'rhinitis': np.round(_row_mean(rhinitis), 2) if conditions.get('rhinitis') else nan_series,
+        'vertigo': vertigo if conditions.get('vertigo') else nan_series,
+        'tinnitus': np.round(_row_mean(tinnitus), 2) if conditions.get('tinnitus') else nan_series
+    }
+
+
+def calculate_trend(values):
+    """Compare the mean of the last three valid points against the first three"""
+    valid = values[~np.isnan(values)]
+    if len(valid) < 2:
+        return 'stable'
+
+    # Both windows are divided by three even when shorter, as on the client
+    recent = valid[-3:].sum() / 3
+    earlier = valid[:3].sum() / 3
+
+    if earlier == 0:
+        return 'worsening' if recent > 0 else 'stable'
+    change = (recent - earlier) / earlier * 100
+
+    if change > 10:
+        return 'worsening'
+    if change < -10:
+        return 'improving'
+    return 'stable'
+
+
+def calculate_variability(values):
+    """Population standard deviation"""
+    if len(values) == 0:
+        return 0.0
+    return float(np.std(values))
+
+
+def _recommendations(trends, avg_severity, variability, conditions):
+    recommendations = []
+
+    if avg_severity >= 4:
+        recommendations.append('Consider immediate consultation with specialist')
+        recommendations.append('Review current treatment plan effectiveness')
+    elif avg_severity >= 3:
+        recommendations.append('Monitor symptoms closely and consider treatment adjustment')
+        recommendations.append('Schedule follow-up appointment within 2 weeks')
+    elif avg_severity >= 2:
+        recommendations.append('Continue current treatment plan')
+        recommendations.append('Encourage consistent symptom logging')
+    else:
+        recommendations.append('Maintain current management approach')
+        recommendations.append('Consider gradual treatment reduction if appropriate')
+
+    if variability > 1.5:
+        recommendations.append('High symptom variability detected - investigate potential triggers')
+        recommendations.append('Consider keeping a trigger diary')
+
+    if conditions.get('rhinitis') and trends['rhinitis'] == 'worsening':
+        recommendations.append('Review environmental allergen exposure')
+        recommendations.append('Consider nasal irrigation therapy')
+
+    if conditions.get('vertigo') and trends['vertigo'] == 'worsening':
+        recommendations.append('Assess for vestibular rehabilitation therapy')
+        recommendations.append('Review medication side effects that may affect balance')
+
+    if conditions.get('tinnitus') and trends['tinnitus'] == 'worsening':
+        recommendations.append('Evaluate hearing protection and noise exposure')
+        recommendations.append('Consider tinnitus retraining therapy')
+
+    if trends['overall'] == 'improving':
+        recommendations.append('Current treatment appears effective - continue approach')
+        recommendations.append('Document successful strategies for future reference')
+
+    return recommendations
+
+
+def _risk_factors(trends, avg_severity, max_severity, variability):
+    risk_factors = []
+    if trends['overall'] == 'worsening':
+        risk_factors.append('Deteriorating symptom pattern')
+    if max_severity >= 4:
+        risk_factors.append('High peak symptom severity')
+    if variability > 2:
+        risk_factors.append('Highly variable symptom patterns')
+    if avg_severity >= 3.5:
+        risk_factors.append('Consistently high symptom severity')
+    return risk_factors
+
+
+def _improvement_indicators(trends, overall):
+    indicators = []
+    if trends['overall'] == 'improving':
+        indicators.append('Overall symptom severity trending downward')
+    if trends['rhinitis'] == 'improving':
+        indicators.append('Rhinitis symptoms showing improvement')
+    if trends['vertigo'] == 'improving':
+        indicators.append('Vertigo episodes decreasing in severity')
+    if trends['tinnitus'] == 'improving':
+        indicators.append('Tinnitus impact reducing over time')
+
+    recent = overall[-5:]
+    if len(recent) >= 3 and np.all(recent <= 3):
+        indicators.append('Consistent moderate-to-low symptom levels')
+    return indicators
+
+
+def _concerns(trends, avg_severity, max_severity, variability):
+    concerns = []
+    if trends['overall'] == 'worsening':
+        concerns.append('Worsening symptom trajectory requires attention')
+    if avg_severity >= 4:
+        concerns.append('High average symptom severity affecting quality of life')
+    if variability > 2:
+        concerns.append('High symptom variability may indicate uncontrolled triggers')
+    if max_severity == 5:
+        concerns.append('Maximum severity episodes recorded')
+    return concerns
+
+
+def analyze_series(series, conditions):
+    """Build the AI Analysis report from the output of build_severity_series()"""
+    overall = series['overall']
+    conditions_tracked = [name for name, active in conditions.items() if active]
+
+    if len(overall) < MIN_DATA_POINTS:
+        return {
+            'prediction_type': 'insufficient_data',
+            'confidence_score': 0.3,
+            'prediction_text': 'Insufficient data for accurate predictions. Need at least 3 symptom logs.',
+            'recommendations': [
+                'Encourage patient to log symptoms more regularly',
+                'Schedule follow-up in 2 weeks',
+                'Consider baseline symptom assessment'
+            ],
+            'risk_factors': [],
+            'improvement_indicators': [],
+            'concerns': ['Limited data availability'],
+            'analysis_date': datetime.utcnow().isoformat(),
+            'data_points_analyzed': int(len(overall)),
+            'conditions_tracked': conditions_tracked
+        }
+
+    trends = {
+        'overall': calculate_trend(overall),
+        'rhinitis': calculate_trend(series['rhinitis']) if conditions.get('rhinitis') else None,
+        'vertigo': calculate_trend(series['vertigo']) if conditions.get('vertigo') else None,
+        'tinnitus': calculate_trend(series['tinnitus']) if conditions.get('tinnitus') else None
+    }
+
+    recent = overall[-RECENT_WINDOW:]
+    avg_severity = float(recent.mean())
+    max_severity = float(recent.max())
+    variability = calculate_variability(recent)
+
+    if trends['overall'] == 'improving':
+        prediction_type = 'improvement'
+        confidence = 0.75 + (0.15 if variability < 1 else 0)
+        prediction_text = (
+            'Patient shows strong signs of improvement. Overall symptom severity has decreased by an '
+            f'average of {float(overall[0]) - avg_severity:.1f} points over the tracking period.'
+        )
+    elif trends['overall'] == 'worsening':
+        prediction_type = 'deterioration'
+        confidence = 0.7 + (0.2 if variability < 1 else 0)
+        prediction_text = (
+            'Patient condition appears to be worsening. Recent symptom severity has increased, with '
+            f'current average at {avg_severity:.1f}/5. Immediate attention recommended.'
+        )
+    else:
+        prediction_type = 'stable'
+        confidence = 0.65
+        prediction_text = (
+            'Patient condition remains stable with minimal fluctuation. Average severity maintained '
+            f'at {avg_severity:.1f}/5 over recent entries.'
+        )
+
+    return {
+        'prediction_type': prediction_type,
+        'confidence_score': round(min(confidence, 0.95), 2),
+        'prediction_text': prediction_text,
+        'recommendations': _recommendations(trends, avg_severity, variability, conditions),
+        'risk_factors': _risk_factors(trends, avg_severity, max_severity, variability),
+        'improvement_indicators': _improvement_indicators(trends, overall),
+        'concerns': _concerns(trends, avg_severity, max_severity, variability),
+        'trends': trends,
+        'severity_statistics': {
+            'recent_average': round(avg_severity, 2),
+            'recent_max': round(max_severity, 2),
+            'recent_variability': round(variability, 2),
+            'overall_average': round(float(overall.mean()), 2),
+            'overall_min': round(float(overall.min()), 2),
+            'overall_max': round(float(overall.max()), 2)
+        },
+        'analysis_date': datetime.utcnow().isoformat(),
+        'data_points_analyzed': int(len(overall)),
+        'conditions_tracked': conditions_tracked
+    }
+
+
+COHORT_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def percentile_bands(period_keys, values, percentiles=COHORT_PERCENTILES):
+    """Percentiles of ``values`` within each distinct period key.
+
+    Both arguments are equal-length arrays (one entry per patient-period);
+    NaN values are ignored. Returns (period_key, sample_count, percentiles)
+    tuples in period order.
+    """
+    valid = ~np.isnan(values)
+    keys, values = period_keys[valid], values[valid]
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    unique, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    return [
+        (key, int(count), np.percentile(values[start:start + count], percentiles))
+        for key, start, count in zip(unique, starts, counts)
+    ]
+
+
+def grouped_means(group_ids, sums, counts):
+    """Weighted mean per group id from partial sums/counts, e.g. rollup rows"""
+    unique, inverse = np.unique(group_ids, return_inverse=True)
+    total = np.bincount(inverse, weights=sums, minlength=len(unique))
+    count = np.bincount(inverse, weights=counts, minlength=len(unique))
+    has_data = count > 0
+    return unique[has_data], total[has_data] / count[has_data]
+
+
+def percentile_rank(distribution, value):
+    """Percent of the sorted ``distribution`` below ``value``, counting ties as half"""
+    below = np.searchsorted(distribution, value, side='left')
+    at_or_below = np.searchsorted(distribution, value, side='right')
+    return float((below + at_or_below) / 2 / len(distribution) * 100)
+
+
+def welford_update(count, mean, m2, value):
+    """One step of Welford's online mean/variance; returns the new (count, mean, m2)"""
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+
+def ewma_update(ewma, value, alpha):
+    return value if ewma is None else alpha * value + (1 - alpha) * ewma
+
+
+def deviation_score(value, count, mean, m2, min_count=5, sd_floor=0.5):
+    """Standard deviations ``value`` sits above a running baseline; None while the baseline is too short.
+
+    ``sd_floor`` stops a patient with very steady scores from turning a
+    one-point change into a huge score.
+    """
+    if count < max(min_count, 2):
+        return None
+    sd = math.sqrt(m2 / (count - 1))
+    return (value - mean) / max(sd, sd_floor)
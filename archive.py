@@ -0,0 +1,180 @@
+"""Tiered storage for symptom logs: the hot table plus a compressed cold tier.
+
+``flask archive-logs`` moves logs older than ARCHIVE_AFTER_DAYS (rounded
+down to a month boundary) out of symptom_logs into symptom_log_segments:
+zlib-compressed, append-only segments, one per patient and calendar
+month, indexed by the time range they cover. The hot table and its
+indexes then stay proportional to recent activity.
+
+iter_archived_logs() yields transient SymptomLog objects - never added to
+the session - so code that reads log attributes works on both tiers. Only
+segments overlapping the requested range are fetched, nearest first, and
+they are decompressed lazily, so a page stops reading once it is full; a
+patient with no archive costs one index lookup.
+
+Idempotency keys and anomaly flags of archived logs are kept inside their
+segment, so replays of logs older than the horizon are no longer
+recognised as duplicates.
+"""
+import heapq
+import itertools
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from extensions import db
+from models import LOG_FIELDS, SymptomLog, SymptomLogFlag, SymptomLogIdempotency, SymptomLogSegment
+
+SEGMENT_COLUMNS = ['log_id', 'log_timestamp', 'created_at'] + LOG_FIELDS
+DATETIME_COLUMNS = ['log_timestamp', 'created_at']
+MAX_SEGMENT_LOGS = 5000
+
+
+def log_key(log):
+    """Sort key shared by both tiers (the logs keyset order)"""
+    return (log.created_at, log.log_id)
+
+
+def encode_segment(logs, idempotency_keys, flags):
+    """Compressed JSON columns for logs of one patient, oldest first"""
+    columns = {column: [getattr(log, column) for log in logs] for column in SEGMENT_COLUMNS}
+    for column in DATETIME_COLUMNS:
+        columns[column] = [value.isoformat() if value else None for value in columns[column]]
+    columns['idempotency_key'] = [idempotency_keys.get(log.log_id) for log in logs]
+    columns['flag_metric'] = [flags[log.log_id].metric if log.log_id in flags else None for log in logs]
+    columns['flag_score'] = [flags[log.log_id].score if log.log_id in flags else None for log in logs]
+    return zlib.compress(json.dumps(columns, separators=(',', ':')).encode(), 9)
+
+
+def decode_segment(segment):
+    """A segment's logs as transient SymptomLog objects, oldest first"""
+    columns = json.loads(zlib.decompress(segment.payload))
+    for column in DATETIME_COLUMNS:
+        columns[column] = [datetime.fromisoformat(value) if value else None for value in columns[column]]
+    return [
+        SymptomLog(patient_id=segment.patient_id, **{column: columns[column][index] for column in SEGMENT_COLUMNS})
+        for index in range(segment.log_count)
+    ]
+
+
+def segments_statement(patient_id, newer_than=None, older_than=None, newest_first=False):
+    """Segments of a patient that may hold logs between the bounds, nearest first"""
+    statement = db.select(SymptomLogSegment).where(SymptomLogSegment.patient_id == patient_id)
+    if newer_than:
+        statement = statement.where(SymptomLogSegment.last_created_at >= newer_than[0])
+    if older_than:
+        statement = statement.where(SymptomLogSegment.first_created_at <= older_than[0])
+    return statement.order_by(
+        SymptomLogSegment.last_created_at.desc() if newest_first else SymptomLogSegment.first_created_at.asc()
+    )
+
+
+def iter_archived_logs(patient_id, newer_than=None, older_than=None, newest_first=False):
+    """Archived logs strictly between two (created_at, log_id) bounds, in keyset order.
+
+    Segments are decompressed one at a time as the caller consumes logs;
+    stopping early (a page, islice) leaves the remaining segments unread.
+    """
+    result = db.session.scalars(
+        segments_statement(patient_id, newer_than, older_than, newest_first).execution_options(yield_per=4)
+    )
+    pending = []
+    try:
+        for segment in result:
+            # Logs that sort before everything in this (and any later) segment are final
+            pending.sort(key=log_key, reverse=newest_first)
+            if newest_first:
+                ready = next((i for i, log in enumerate(pending) if log.created_at <= segment.last_created_at), len(pending))
+            else:
+                ready = next((i for i, log in enumerate(pending) if log.created_at >= segment.first_created_at), len(pending))
+            yield from pending[:ready]
+            pending = pending[ready:] + [
+                log for log in decode_segment(segment)
+                if (newer_than is None or log_key(log) > newer_than) and (older_than is None or log_key(log) < older_than)
+            ]
+            db.session.expunge(segment)
+    finally:
+        result.close()
+    yield from sorted(pending, key=log_key, reverse=newest_first)
+
+
+def archived_logs(patient_id, newer_than=None, older_than=None, newest_first=False, limit=None):
+    """iter_archived_logs() as a list of at most ``limit`` logs"""
+    return list(itertools.islice(iter_archived_logs(patient_id, newer_than, older_than, newest_first), limit))
+
+
+def with_archived_logs(logs, patient_id, newer_than=None, older_than=None, newest_first=False, limit=None):
+    """Merge the archived logs from the same range into an ordered page of hot logs"""
+    if limit and len(logs) >= limit:
+        # Only archived logs that sort before the last hot one can still make the page
+        edge = log_key(logs[limit - 1])
+        if newest_first:
+            newer_than = max(newer_than, edge) if newer_than else edge
+        else:
+            older_than = min(older_than, edge) if older_than else edge
+    archived = archived_logs(patient_id, newer_than, older_than, newest_first, limit)
+    if not archived:
+        return logs
+    return list(itertools.islice(heapq.merge(logs, archived, key=log_key, reverse=newest_first), limit))
+
+
+def archived_log_count(patient_id):
+    return db.session.query(func.coalesce(func.sum(SymptomLogSegment.log_count), 0)).filter(
+        SymptomLogSegment.patient_id == patient_id
+    ).scalar()
+
+
+def iter_patient_logs(patient_id, batch_size=500):
+    """Every log of a patient across both tiers, oldest first"""
+    hot = SymptomLog.query.filter_by(patient_id=patient_id).order_by(
+        SymptomLog.created_at.asc(), SymptomLog.log_id.asc()
+    ).yield_per(batch_size)
+    return heapq.merge(iter_archived_logs(patient_id), hot, key=log_key)
+
+
+def archive_cutoff(days, now=None):
+    """Start of the month containing ``now - days``; only whole months are archived"""
+    moment = (now or datetime.utcnow()) - timedelta(days=days)
+    return datetime(moment.year, moment.month, 1)
+
+
+def archive_patient_logs(patient_id, cutoff):
+    """Move a patient's logs created before ``cutoff`` into monthly segments; returns the number moved"""
+    archived = 0
+    while True:
+        logs = SymptomLog.query.filter(
+            SymptomLog.patient_id == patient_id, SymptomLog.created_at < cutoff
+        ).order_by(SymptomLog.created_at.asc(), SymptomLog.log_id.asc()).limit(MAX_SEGMENT_LOGS).all()
+        if not logs:
+            return archived
+        month = (logs[0].created_at.year, logs[0].created_at.month)
+        logs = [log for log in logs if (log.created_at.year, log.created_at.month) == month]
+        log_ids = [log.log_id for log in logs]
+
+        keys = dict(db.session.query(SymptomLogIdempotency.log_id, SymptomLogIdempotency.idempotency_key).filter(
+            SymptomLogIdempotency.log_id.in_(log_ids)
+        ).all())
+        flags = {flag.log_id: flag for flag in SymptomLogFlag.query.filter(SymptomLogFlag.log_id.in_(log_ids))}
+        db.session.add(SymptomLogSegment(
+            patient_id=patient_id,
+            first_created_at=logs[0].created_at,
+            last_created_at=logs[-1].created_at,
+            log_count=len(logs),
+            payload=encode_segment(logs, keys, flags)
+        ))
+        # Segment in, hot rows out, in one transaction
+        for model in (SymptomLogIdempotency, SymptomLogFlag, SymptomLog):
+            model.query.filter(model.log_id.in_(log_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.expunge_all()
+        archived += len(logs)
+
+
+def archive_logs(cutoff):
+    """Archive logs created before ``cutoff`` on the current shard; returns (patients, logs)"""
+    patient_ids = [row.patient_id for row in db.session.query(SymptomLog.patient_id).filter(
+        SymptomLog.created_at < cutoff
+    ).distinct().all()]
+    return len(patient_ids), sum(archive_patient_logs(patient_id, cutoff) for patient_id in patient_ids)
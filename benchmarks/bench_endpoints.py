@@ -0,0 +1,217 @@
+"""Endpoint latency, throughput and SQL statement count benchmark.
+
+Generates a synthetic dataset (see benchmarks/datagen.py), drives the
+main endpoints through the Flask test client and reports p50/p95/p99
+latency, throughput and SQL statements per request. With --budgets the
+run fails when an endpoint issues more statements than allowed, which
+catches new N+1 query patterns.
+
+    python -m benchmarks.bench_endpoints --patients 500 --logs 100 \\
+        --database-url sqlite:////tmp/bench.db --budgets benchmarks/query_budgets.json
+
+Pass --base-url to drive a running server (e.g. a local gunicorn) over
+HTTP instead; statement counts are only available in-process.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+
+def endpoint_cases(patient_id):
+    """(name, method, path, json body, client role) for every benchmarked call"""
+    return [
+        ('dashboard', 'GET', '/api/doctor/dashboard', None, 'doctor'),
+        ('analytics_raw', 'GET', f'/api/doctor/patient/{patient_id}/analytics', None, 'doctor'),
+        ('analytics_week', 'GET', f'/api/doctor/patient/{patient_id}/analytics?bucket=week', None, 'doctor'),
+        ('analysis', 'GET', f'/api/doctor/patient/{patient_id}/analysis', None, 'doctor'),
+        ('logs_full', 'GET', f'/api/doctor/patient/{patient_id}/logs', None, 'doctor'),
+        ('logs_page', 'GET', f'/api/doctor/patient/{patient_id}/logs?limit=50', None, 'doctor'),
+        ('attention', 'GET', '/api/doctor/attention', None, 'doctor'),
+        ('log_symptoms', 'POST', '/api/symptoms', {
+            'rhinitis_congestion': 3, 'rhinitis_sneezing': 2, 'vertigo_severity': 1, 'tinnitus_loudness': 2
+        }, 'patient'),
+    ]
+
+
+class StatementCounter:
+    """Counts SQL statements sent through an engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        from extensions import db
+
+        self.app = app
+        self.clients = {'doctor': app.test_client(), 'patient': app.test_client()}
+        with app.app_context():
+            self.counter = StatementCounter(db.engine)
+
+    def login(self, role, username, password):
+        path = '/api/doctor/login' if role == 'doctor' else '/api/login'
+        response = self.clients[role].post(path, json={'username': username, 'password': password})
+        if response.status_code != 200:
+            raise RuntimeError(f'{role} login failed: {response.status_code}')
+
+    def request(self, role, method, path, body):
+        self.counter.count = 0
+        response = self.clients[role].open(path, method=method, json=body)
+        response.get_data()  # drain streamed bodies
+        return response.status_code, self.counter.count
+
+
+class HttpDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.openers = {
+            role: urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+            for role in ('doctor', 'patient')
+        }
+
+    def login(self, role, username, password):
+        path = '/api/doctor/login' if role == 'doctor' else '/api/login'
+        status, _ = self.request(role, 'POST', path, {'username': username, 'password': password})
+        if status != 200:
+            raise RuntimeError(f'{role} login failed: {status}')
+
+    def request(self, role, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with self.openers[role].open(req) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def run_case(driver, role, method, path, body, requests):
+    latencies = []
+    statements = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        status, count = driver.request(role, method, path, body)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if status >= 400:
+            errors += 1
+        if count is not None:
+            statements.append(count)
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else None,
+        'statements': max(statements) if statements else None
+    }
+
+
+def print_report(results):
+    header = f"{'endpoint':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'SQL/req':>9}{'errors':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        statements = '-' if r['statements'] is None else r['statements']
+        print(f"{name:<16}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['throughput_rps']:>10}{statements:>9}{r['errors']:>8}")
+
+
+def check_budgets(results, budgets):
+    """Return a list of human-readable budget violations"""
+    violations = []
+    for name, budget in budgets.items():
+        result = results.get(name)
+        if result is None or result['statements'] is None:
+            continue
+        if result['statements'] > budget:
+            violations.append(f"{name}: {result['statements']} SQL statements per request (budget {budget})")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--logs', type=int, default=100, help='symptom logs per patient')
+    parser.add_argument('--requests', type=int, default=50, help='requests per endpoint')
+    parser.add_argument('--database-url', help='overrides DATABASE_URL (SQLite or PostgreSQL)')
+    parser.add_argument('--base-url', help='benchmark a running server over HTTP instead of the test client')
+    parser.add_argument('--skip-generate', action='store_true', help='reuse data already in the database')
+    parser.add_argument('--patient-id', type=int, help='patient used for per-patient endpoints')
+    parser.add_argument('--budgets', help='JSON file of {endpoint: max SQL statements per request}')
+    parser.add_argument('--write-budgets', help='write the measured statement counts to this file')
+    parser.add_argument('--json', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    from app import create_app
+    from extensions import db
+    from models import Patient
+    from schema import init_database
+    from benchmarks.datagen import BENCH_PASSWORD, generate
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        if args.skip_generate:
+            patient_ids = [args.patient_id] if args.patient_id else [
+                db.session.query(Patient.patient_id).filter(Patient.username.like('bench_%')).first()[0]
+            ]
+        else:
+            print(f"Generating {args.patients} patients x {args.logs} logs...")
+            patient_ids = generate(args.patients, args.logs)
+        patient_id = args.patient_id or patient_ids[0]
+        patient_username = db.session.get(Patient, patient_id).username
+
+    driver = HttpDriver(args.base_url) if args.base_url else TestClientDriver(app)
+    driver.login('doctor', 'doctor', 'admin123')
+    driver.login('patient', patient_username, BENCH_PASSWORD)
+
+    results = {}
+    for name, method, path, body, role in endpoint_cases(patient_id):
+        driver.request(role, method, path, body)  # warm caches and connections
+        results[name] = run_case(driver, role, method, path, body, args.requests)
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.write_budgets:
+        with open(args.write_budgets, 'w') as f:
+            json.dump({name: r['statements'] for name, r in results.items() if r['statements'] is not None},
+                      f, indent=2)
+            f.write('\n')
+    if args.budgets:
+        with open(args.budgets) as f:
+            violations = check_budgets(results, json.load(f))
+        if violations:
+            print('\nSQL statement budget exceeded:')
+            for violation in violations:
+                print(f'  {violation}')
+            sys.exit(1)
+        print('\nSQL statement budgets OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Cold-start benchmark: import time, app construction and first requests.
+
+Every run starts a fresh interpreter (like a new dyno or worker) and
+times, in order: importing the app module, create_app(), the first
+request, and the first database round trip. The median over the runs is
+reported, followed by the slowest imports from ``python -X importtime``.
+
+    python -m benchmarks.cold_start --runs 10 --database-url sqlite:////tmp/bench.db
+
+Initialise the database first (flask --app app init-db): nothing here
+touches the schema, just as a worker would not.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+client = flask_app.test_client()
+client.get('/api/status')
+first_request = time.perf_counter()
+from sqlalchemy import text
+from extensions import db
+with flask_app.app_context():
+    db.session.execute(text('SELECT 1'))
+first_query = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first_request - created) * 1000,
+    'first_query_ms': (first_query - first_request) * 1000,
+    'total_ms': (first_query - started) * 1000,
+}))
+'''
+
+STAGES = ['import_ms', 'create_app_ms', 'first_request_ms', 'first_query_ms', 'total_ms']
+
+
+def run_child(env):
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(env, top=15):
+    """(cumulative us, self us, module) for the slowest imports of `import app`"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative_us), int(self_us), module))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', help='overrides DATABASE_URL')
+    parser.add_argument('--json', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+
+    runs = [run_child(env) for _ in range(args.runs)]
+    results = {stage: round(statistics.median(run[stage] for run in runs), 2) for stage in STAGES}
+
+    print(f"cold start, median of {args.runs} fresh interpreters")
+    for stage in STAGES:
+        print(f"  {stage:<18}{results[stage]:>10}")
+    print('\nslowest imports (cumulative ms, self ms)')
+    imports = slowest_imports(env)
+    for cumulative_us, self_us, module in imports:
+        print(f"  {cumulative_us / 1000:>8.1f}{self_us / 1000:>8.1f}  {module}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'stages': results, 'runs': runs, 'imports': imports}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Synthetic patient and symptom log data for benchmarks.
+
+Fills the schema with N patients x M SymptomLog rows using bulk inserts,
+then rebuilds the derived tables (patient_summary, symptom_rollups,
+patient_baselines) so
+the dataset looks like one produced through the API.
+
+    python -m benchmarks.datagen --patients 1000 --logs 200 --database-url sqlite:////tmp/bench.db
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+BENCH_PASSWORD = 'bench-password'
+INSERT_CHUNK_SIZE = 5000
+
+
+def generate(patients=100, logs_per_patient=100, history_days=365, seed=42):
+    """Insert synthetic patients, conditions and logs (app context required); returns the new patient ids"""
+    from sqlalchemy import insert, inspect
+
+    from extensions import db, password_hasher
+    from models import LOG_FIELDS, Patient, PatientConditions, SymptomLog
+    from projections import rebuild_patient_baseline, rebuild_patient_rollups, rebuild_patient_summary
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    # Hashing is deliberately slow, so every synthetic patient shares one hash
+    password_hash = password_hasher.hash(BENCH_PASSWORD)
+
+    run_tag = f'{seed}_{int(now.timestamp())}'
+    patient_rows = []
+    for i in range(patients):
+        patient_rows.append({
+            'username': f'bench_{run_tag}_{i}',
+            'password': password_hash,
+            'first_name': rng.choice(['Ava', 'Ben', 'Chloe', 'Dev', 'Ema', 'Finn', 'Gia', 'Hugo']),
+            'last_name': rng.choice(['Silva', 'Perera', 'Jones', 'Khan', 'Nguyen', 'Smith']),
+            'created_at': now - timedelta(days=history_days),
+            'updated_at': now - timedelta(days=history_days)
+        })
+    patient_ids = db.session.scalars(
+        insert(Patient).returning(Patient.patient_id, sort_by_parameter_order=True),
+        patient_rows
+    ).all()
+    db.session.execute(insert(PatientConditions), [{
+        'patient_id': patient_id,
+        'has_rhinitis': rng.random() < 0.6,
+        'has_vertigo': rng.random() < 0.4,
+        'has_tinnitus': rng.random() < 0.5
+    } for patient_id in patient_ids])
+
+    log_rows = []
+    for patient_id in patient_ids:
+        baseline = rng.uniform(1, 4)
+        drift = rng.uniform(-1.5, 1.5)
+        for i in range(logs_per_patient):
+            progress = i / max(logs_per_patient - 1, 1)
+            created_at = now - timedelta(days=history_days * (1 - progress), minutes=rng.randint(0, 600))
+
+            def score():
+                value = round(baseline + drift * progress + rng.gauss(0, 0.8))
+                return min(5, max(0, value)) if rng.random() > 0.05 else None
+
+            row = {'patient_id': patient_id, 'log_timestamp': created_at, 'created_at': created_at}
+            for field in LOG_FIELDS:
+                row[field] = score()
+            log_rows.append(row)
+            if len(log_rows) >= INSERT_CHUNK_SIZE:
+                db.session.execute(insert(SymptomLog), log_rows)
+                log_rows = []
+    if log_rows:
+        db.session.execute(insert(SymptomLog), log_rows)
+    db.session.commit()
+
+    # storage_report generates on the baseline schema, before patient_baselines exists
+    with_baselines = inspect(db.engine).has_table('patient_baselines')
+    for patient_id in patient_ids:
+        rebuild_patient_summary(patient_id)
+        rebuild_patient_rollups(patient_id)
+        if with_baselines:
+            rebuild_patient_baseline(patient_id)
+    db.session.commit()
+    return patient_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=100)
+    parser.add_argument('--logs', type=int, default=100, help='symptom logs per patient')
+    parser.add_argument('--days', type=int, default=365, help='history length in days')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='overrides DATABASE_URL')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    from app import create_app
+    from schema import init_database
+
+    with create_app().app_context():
+        init_database()
+        patient_ids = generate(args.patients, args.logs, args.days, args.seed)
+    print(f"Generated {len(patient_ids)} patients x {args.logs} logs")
+
+
+if __name__ == '__main__':
+    main()
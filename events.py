@@ -0,0 +1,167 @@
+"""Fan-out of dashboard change events to Server-Sent Events subscribers.
+
+EventBroker delivers events to the SSE streams of the current process.
+PostgresEventBroker adds cross-worker delivery: events are sent with
+``pg_notify`` inside the committing transaction (so rolled-back changes
+are never announced) and a LISTEN thread in every worker feeds them to
+that worker's subscribers.
+"""
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger('symptom_tracker.events')
+
+RESYNC_EVENT = {'type': 'resync'}
+
+
+class EventBroker:
+    """In-process fan-out with one bounded queue per subscriber.
+
+    A subscriber that falls behind has its queue replaced by a single
+    ``resync`` event, telling the client to reload instead of patching.
+    """
+
+    transactional = False
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, events):
+        """Deliver events to every subscriber of this process"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += len(events)
+        for subscriber in subscribers:
+            for event in events:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    self._resync(subscriber)
+                    break
+
+    def _resync(self, subscriber):
+        with self._lock:
+            self.dropped += 1
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(RESYNC_EVENT)
+
+    @property
+    def wants_events(self):
+        """False when nobody could receive an event, so callers can skip building it"""
+        return bool(self._subscribers)
+
+    def send_in_transaction(self, session, events):
+        """Hook for brokers that publish as part of the committing transaction"""
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'local',
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'resyncs': self.dropped
+            }
+
+
+class PostgresEventBroker(EventBroker):
+    """EventBroker fed by Postgres LISTEN/NOTIFY so every worker sees every event"""
+
+    transactional = True
+
+    def __init__(self, engine, channel='dashboard_events', max_queue=256, poll_seconds=5):
+        super().__init__(max_queue)
+        self.engine = engine
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self):
+        self._ensure_listener()
+        return super().subscribe()
+
+    @property
+    def wants_events(self):
+        # Subscribers may be connected to any worker
+        return True
+
+    def send_in_transaction(self, session, events):
+        for event in events:
+            session.execute(text('SELECT pg_notify(:channel, :payload)'),
+                            {'channel': self.channel, 'payload': json.dumps(event)})
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            # A listener thread inherited through fork does not exist in this process
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._listen_forever, name='dashboard-events-listener', daemon=True).start()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning('Event listener disconnected: %s', e)
+                time.sleep(1)
+
+    def _listen(self):
+        # A dedicated connection, detached from the pool so it is never handed out
+        pooled = self.engine.raw_connection()
+        pooled.detach()
+        connection = pooled.driver_connection
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while True:
+                if select.select([connection], [], [], self.poll_seconds) == ([], [], []):
+                    continue
+                connection.poll()
+                events = []
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    events.append(json.loads(notify.payload))
+                if events:
+                    self.publish(events)
+        finally:
+            connection.close()
+
+    def stats(self):
+        stats = super().stats()
+        stats['backend'] = 'postgres'
+        stats['channel'] = self.channel
+        return stats
+
+
+def build_event_broker(engine, backend='auto'):
+    """Postgres LISTEN/NOTIFY when available (or requested), otherwise in-process"""
+    if backend == 'postgres' or (backend == 'auto' and engine.dialect.name == 'postgresql'):
+        return PostgresEventBroker(engine)
+    return EventBroker()
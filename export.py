@@ -0,0 +1,59 @@
+"""Constant-memory encoders for bulk symptom log exports.
+
+Rows arrive in partitions (lists of tuples) straight from a server-side
+cursor; each partition is encoded and, optionally, gzip-compressed before
+the next one is fetched, so memory use does not grow with the export.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(columns, partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def encode_ndjson(columns, partitions):
+    for rows in partitions:
+        yield ''.join(
+            json.dumps({column: _plain(value) for column, value in zip(columns, row)}) + '\n'
+            for row in rows
+        ).encode()
+
+
+def encode_rows(export_format, columns, partitions):
+    if export_format == 'csv':
+        return encode_csv(columns, partitions)
+    return encode_ndjson(columns, partitions)
+
+
+def gzip_chunks(chunks, level=6):
+    """Incrementally gzip a stream of byte chunks"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,115 @@
+"""Flask extensions and the per-application services built on top of them.
+
+Extensions are created unbound and attached by create_app(). Services
+(caches, thread pools, the event broker, ...) are built from each app's
+config by init_services() and reached through the proxies below, so
+importing a module never reads configuration or touches the database.
+"""
+import os
+
+from flask import current_app
+from flask_cors import CORS
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.local import LocalProxy
+
+from ai_jobs import AnalysisJobRunner, build_analysis_backend
+from cache import LRUCache
+from dbpool import build_engine_options
+from events import build_event_broker
+from hashing import PasswordHasher
+from metrics import RequestMetrics
+from profiling import RequestProfiler
+from replicas import ReplicaRouter, RoutingSession
+from sharding import ShardRouter
+
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+ANALYSIS_CACHE_SIZE = 1024
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+login_manager = LoginManager()
+login_manager.session_protection = "strong"
+cors = CORS()
+
+
+def _service(name):
+    return LocalProxy(lambda: current_app.extensions['symptom_tracker'][name])
+
+
+password_hasher = _service('password_hasher')
+principal_cache = _service('principal_cache')
+response_cache = _service('response_cache')
+analysis_cache = _service('analysis_cache')
+cohort_cache = _service('cohort_cache')
+finished_job_cache = _service('finished_job_cache')  # Succeeded jobs never change; failed ones can be retried
+request_metrics = _service('request_metrics')
+request_profiler = _service('request_profiler')
+event_broker = _service('event_broker')
+replica_router = _service('replica_router')
+shard_router = _service('shard_router')
+analysis_backend = _service('analysis_backend')
+analysis_jobs = _service('analysis_jobs')
+
+
+def init_migrate(app):
+    """Attach Flask-Migrate on first use; alembic is a large import that web workers never need"""
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=MIGRATIONS_DIRECTORY, render_as_batch=True)
+    return app.extensions['migrate'].migrate
+
+
+def init_services(app):
+    """Build the app's services from its config (needs an app context for the engine)"""
+    config = app.config
+    replica_router = ReplicaRouter(
+        config['DATABASE_REPLICA_URLS'],
+        engine_options=lambda url: build_engine_options(config, url),
+        max_lag_seconds=config['REPLICA_MAX_LAG_SECONDS'],
+        health_interval=config['REPLICA_HEALTH_INTERVAL']
+    )
+    shard_router = ShardRouter(
+        db.engine,
+        config['DATABASE_SHARD_URLS'],
+        engine_options=lambda url: build_engine_options(config, url),
+        directory_ttl=config['SHARD_DIRECTORY_TTL'],
+        workers=config['SHARD_GATHER_WORKERS']
+    )
+    request_metrics = RequestMetrics()
+    request_metrics.init_app(app, db.engine)
+    request_profiler = RequestProfiler(
+        config['PROFILE_DIRECTORY'],
+        max_files=config['PROFILE_MAX_FILES'],
+        sample_rate=config['PROFILE_SAMPLE_RATE'],
+        endpoints=config['PROFILE_ENDPOINTS'],
+        interval_ms=config['PROFILE_INTERVAL_MS'],
+        enabled=config['PROFILE_REQUESTS']
+    )
+    request_profiler.init_app(app, db.engine)
+    for engine in [replica.engine for replica in replica_router.replicas] + [shard.engine for shard in shard_router.shards[1:]]:
+        request_metrics.instrument_engine(engine)
+        request_profiler.instrument_engine(engine)
+
+    app.extensions['symptom_tracker'] = {
+        'password_hasher': PasswordHasher(
+            method=config['PASSWORD_HASH_METHOD'],
+            workers=config['PASSWORD_HASH_WORKERS'],
+            max_pending=config['PASSWORD_HASH_MAX_PENDING'],
+            timeout=config['PASSWORD_HASH_TIMEOUT']
+        ),
+        'principal_cache': LRUCache(maxsize=config['PRINCIPAL_CACHE_SIZE'], ttl=config['PRINCIPAL_CACHE_TTL']),
+        'response_cache': LRUCache(maxsize=config['RESPONSE_CACHE_SIZE']),
+        'analysis_cache': LRUCache(maxsize=ANALYSIS_CACHE_SIZE),
+        'cohort_cache': LRUCache(maxsize=64, ttl=config['COHORT_ANALYTICS_REFRESH']),
+        'finished_job_cache': LRUCache(maxsize=1024),
+        'request_metrics': request_metrics,
+        'request_profiler': request_profiler,
+        'event_broker': build_event_broker(db.engine, config['EVENTS_BACKEND']),
+        'replica_router': replica_router,
+        'shard_router': shard_router,
+        'analysis_backend': build_analysis_backend(config),
+        'analysis_jobs': AnalysisJobRunner(
+            workers=config['AI_ANALYSIS_WORKERS'],
+            max_pending=config['AI_ANALYSIS_MAX_PENDING']
+        )
+    }
@@ -8,6 +8,7 @@ function AIAnalysis() {
   const navigate = useNavigate();
   const [patientData, setPatientData] = useState(null);
   const [aiPrediction, setAiPrediction] = useState(null);
+  const [aiNarrative, setAiNarrative] = useState(null);
   const [loading, setLoading] = useState(true);
   const [generating, setGenerating] = useState(false);
   const [error, setError] = useState('');
@@ -18,20 +19,9 @@ function AIAnalysis() {
 
   const fetchPatientData = async () => {
     try {
-      const response = await fetch(`${config.API_BASE_URL}/api/doctor/patient/<int:patient_id>/analytics`, {
-        method: 'GET',
-        credentials: 'include',
-      });
-
-      if (!response.ok) {
-        throw new Error('Failed to fetch patient data');
-      }
-
-      const data = await response.json();
+      const data = await fetchAnalysis();
       setPatientData(data);
-      
-      // Generate AI analysis automatically
-      generateAIAnalysis(data);
+      setAiPrediction(data.analysis);
     } catch (error) {
       setError('Failed to load patient data');
     } finally {
@@ -39,239 +29,63 @@ function AIAnalysis() {
     }
   };
 
-  const generateAIAnalysis = async (data) => {
-    setGenerating(true);
-    
-    // Simulate AI analysis - In real implementation, this would call your AI service
-    // You can integrate with OpenAI, local ML models, or custom analytics
-    
-    try {
-      // Simulate API delay
-      await new Promise(resolve => setTimeout(resolve, 2000));
-      
-      const analysis = analyzePatientData(data);
-      setAiPrediction(analysis);
-    } catch (error) {
-      setError('Failed to generate AI analysis');
-    } finally {
-      setGenerating(false);
-    }
-  };
-
-  // Simulated AI Analysis Function
-  const analyzePatientData = (data) => {
-    const chartData = data.chart_data || [];
-    const patient = data.patient;
-    
-    if (chartData.length < 3) {
-      return {
-        prediction_type: 'insufficient_data',
-        confidence_score: 0.3,
-        prediction_text: 'Insufficient data for accurate predictions. Need at least 3 symptom logs.',
-        recommendations: [
-          'Encourage patient to log symptoms more regularly',
-          'Schedule follow-up in 2 weeks',
-          'Consider baseline symptom assessment'
-        ],
-        risk_factors: [],
-        improvement_indicators: [],
-        concerns: ['Limited data availability']
-      };
-    }
-
-    // Calculate trends for each condition
-    const trends = {
-      overall: calculateTrend(chartData, 'overall_severity'),
-      rhinitis: patient.conditions.rhinitis ? calculateTrend(chartData, 'rhinitis_avg') : null,
-      vertigo: patient.conditions.vertigo ? calculateTrend(chartData, 'vertigo_severity') : null,
-      tinnitus: patient.conditions.tinnitus ? calculateTrend(chartData, 'tinnitus_avg') : null
-    };
-
-    // Calculate severity statistics
-    const recentData = chartData.slice(-7); // Last 7 entries
-    const averageSeverity = recentData.reduce((sum, d) => sum + d.overall_severity, 0) / recentData.length;
-    const maxSeverity = Math.max(...recentData.map(d => d.overall_severity));
-    const variability = calculateVariability(recentData.map(d => d.overall_severity));
-
-    // Determine prediction type and confidence
-    let predictionType, confidence, predictionText;
-    
-    if (trends.overall === 'improving') {
-      predictionType = 'improvement';
-      confidence = 0.75 + (variability < 1 ? 0.15 : 0);
-      predictionText = `Patient shows strong signs of improvement. Overall symptom severity has decreased by an average of ${((chartData[0]?.overall_severity || 0) - averageSeverity).toFixed(1)} points over the tracking period.`;
-    } else if (trends.overall === 'worsening') {
-      predictionType = 'deterioration';
-      confidence = 0.7 + (variability < 1 ? 0.2 : 0);
-      predictionText = `Patient condition appears to be worsening. Recent symptom severity has increased, with current average at ${averageSeverity.toFixed(1)}/5. Immediate attention recommended.`;
-    } else {
-      predictionType = 'stable';
-      confidence = 0.65;
-      predictionText = `Patient condition remains stable with minimal fluctuation. Average severity maintained at ${averageSeverity.toFixed(1)}/5 over recent entries.`;
-    }
-
-    // Generate recommendations based on analysis
-    const recommendations = generateRecommendations(trends, averageSeverity, maxSeverity, variability, patient.conditions);
-    const riskFactors = identifyRiskFactors(trends, averageSeverity, maxSeverity, variability);
-    const improvementIndicators = identifyImprovementIndicators(trends, chartData);
-    const concerns = identifyConcerns(trends, averageSeverity, maxSeverity, variability);
-
-    return {
-      prediction_type: predictionType,
-      confidence_score: Math.min(confidence, 0.95), // Cap at 95%
-      prediction_text: predictionText,
-      recommendations,
-      risk_factors: riskFactors,
-      improvement_indicators: improvementIndicators,
-      concerns,
-      analysis_date: new Date().toISOString(),
-      data_points_analyzed: chartData.length,
-      conditions_tracked: Object.entries(patient.conditions).filter(([_, active]) => active).map(([condition, _]) => condition)
-    };
-  };
-
-  const calculateTrend = (data, field) => {
-    if (data.length < 2) return 'stable';
-    
-    const validData = data.filter(d => d[field] !== null && d[field] !== undefined);
-    if (validData.length < 2) return 'stable';
-    
-    const recent = validData.slice(-3).reduce((sum, d) => sum + d[field], 0) / 3;
-    const earlier = validData.slice(0, 3).reduce((sum, d) => sum + d[field], 0) / 3;
-    
-    const change = ((recent - earlier) / earlier) * 100;
-    
-    if (change > 10) return 'worsening';
-    if (change < -10) return 'improving';
-    return 'stable';
-  };
-
-  const calculateVariability = (values) => {
-    const mean = values.reduce((sum, val) => sum + val, 0) / values.length;
-    const variance = values.reduce((sum, val) => sum + Math.pow(val - mean, 2), 0) / values.length;
-    return Math.sqrt(variance);
-  };
-
-  const generateRecommendations = (trends, avgSeverity, maxSeverity, variability, conditions) => {
-    const recommendations = [];
-
-    // General recommendations based on severity
-    if (avgSeverity >= 4) {
-      recommendations.push('Consider immediate consultation with specialist');
-      recommendations.push('Review current treatment plan effectiveness');
-    } else if (avgSeverity >= 3) {
-      recommendations.push('Monitor symptoms closely and consider treatment adjustment');
-      recommendations.push('Schedule follow-up appointment within 2 weeks');
-    } else if (avgSeverity >= 2) {
-      recommendations.push('Continue current treatment plan');
-      recommendations.push('Encourage consistent symptom logging');
-    } else {
-      recommendations.push('Maintain current management approach');
-      recommendations.push('Consider gradual treatment reduction if appropriate');
-    }
-
-    // Variability-based recommendations
-    if (variability > 1.5) {
-      recommendations.push('High symptom variability detected - investigate potential triggers');
-      recommendations.push('Consider keeping a trigger diary');
-    }
-
-    // Condition-specific recommendations
-    if (conditions.rhinitis && trends.rhinitis === 'worsening') {
-      recommendations.push('Review environmental allergen exposure');
-      recommendations.push('Consider nasal irrigation therapy');
-    }
-
-    if (conditions.vertigo && trends.vertigo === 'worsening') {
-      recommendations.push('Assess for vestibular rehabilitation therapy');
-      recommendations.push('Review medication side effects that may affect balance');
-    }
-
-    if (conditions.tinnitus && trends.tinnitus === 'worsening') {
-      recommendations.push('Evaluate hearing protection and noise exposure');
-      recommendations.push('Consider tinnitus retraining therapy');
-    }
-
-    // Improvement recommendations
-    if (trends.overall === 'improving') {
-      recommendations.push('Current treatment appears effective - continue approach');
-      recommendations.push('Document successful strategies for future reference');
-    }
-
-    return recommendations;
-  };
-
-  const identifyRiskFactors = (trends, avgSeverity, maxSeverity, variability) => {
-    const riskFactors = [];
+  // Analysis is computed and cached on the server; it is only recomputed
+  // there when the patient logs new symptoms
+  const fetchAnalysis = async () => {
+    const response = await fetch(`${config.API_BASE_URL}/api/doctor/patient/${patientId}/analysis`, {
+      method: 'GET',
+      credentials: 'include',
+    });
 
-    if (trends.overall === 'worsening') {
-      riskFactors.push('Deteriorating symptom pattern');
+    if (!response.ok) {
+      throw new Error('Failed to fetch patient analysis');
     }
 
-    if (maxSeverity >= 4) {
-      riskFactors.push('High peak symptom severity');
-    }
-
-    if (variability > 2) {
-      riskFactors.push('Highly variable symptom patterns');
-    }
-
-    if (avgSeverity >= 3.5) {
-      riskFactors.push('Consistently high symptom severity');
-    }
-
-    return riskFactors;
+    return response.json();
   };
 
-  const identifyImprovementIndicators = (trends, chartData) => {
-    const indicators = [];
-
-    if (trends.overall === 'improving') {
-      indicators.push('Overall symptom severity trending downward');
+  // The narrative is produced by a background job; submit it, then poll until it finishes
+  const fetchNarrative = async () => {
+    const response = await fetch(`${config.API_BASE_URL}/api/doctor/patient/${patientId}/analysis/jobs`, {
+      method: 'POST',
+      credentials: 'include',
+    });
+    if (!response.ok) {
+      throw new Error('Failed to submit analysis job');
     }
 
-    if (trends.rhinitis === 'improving') {
-      indicators.push('Rhinitis symptoms showing improvement');
-    }
-
-    if (trends.vertigo === 'improving') {
-      indicators.push('Vertigo episodes decreasing in severity');
-    }
-
-    if (trends.tinnitus === 'improving') {
-      indicators.push('Tinnitus impact reducing over time');
+    let job = await response.json();
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      const poll = await fetch(`${config.API_BASE_URL}/api/doctor/analysis/jobs/${job.job_id}`, {
+        method: 'GET',
+        credentials: 'include',
+      });
+      if (!poll.ok) {
+        throw new Error('Failed to fetch analysis job');
+      }
+      job = await poll.json();
     }
 
-    // Check for consistency
-    const recentData = chartData.slice(-5);
-    const isConsistent = recentData.every(d => d.overall_severity <= 3);
-    if (isConsistent && recentData.length >= 3) {
-      indicators.push('Consistent moderate-to-low symptom levels');
+    if (job.status !== 'succeeded') {
+      throw new Error(job.error || 'Analysis job failed');
     }
-
-    return indicators;
+    return job.result;
   };
 
-  const identifyConcerns = (trends, avgSeverity, maxSeverity, variability) => {
-    const concerns = [];
-
-    if (trends.overall === 'worsening') {
-      concerns.push('Worsening symptom trajectory requires attention');
-    }
-
-    if (avgSeverity >= 4) {
-      concerns.push('High average symptom severity affecting quality of life');
-    }
-
-    if (variability > 2) {
-      concerns.push('High symptom variability may indicate uncontrolled triggers');
-    }
+  const generateAIAnalysis = async () => {
+    setGenerating(true);
 
-    if (maxSeverity === 5) {
-      concerns.push('Maximum severity episodes recorded');
+    try {
+      const data = await fetchAnalysis();
+      setPatientData(data);
+      setAiPrediction(data.analysis);
+      setAiNarrative(await fetchNarrative());
+    } catch (error) {
+      setError('Failed to generate AI analysis');
+    } finally {
+      setGenerating(false);
     }
-
-    return concerns;
   };
 
   const getConfidenceColor = (confidence) => {
@@ -371,6 +185,13 @@ function AIAnalysis() {
               </div>
             </div>
 
+            {aiNarrative && (
+              <div className="ai-section">
+                <h3>🧠 AI Summary</h3>
+                <p style={{ whiteSpace: 'pre-line' }}>{aiNarrative.summary}</p>
+              </div>
+            )}
+
             {/* Recommendations */}
             <div className="ai-section">
               <h3>💡 Clinical Recommendations</h3>
@@ -437,7 +258,7 @@ function AIAnalysis() {
             <div className="ai-actions">
               <button 
                 className="action-button primary"
-                onClick={() => generateAIAnalysis(patientData)}
+                onClick={() => generateAIAnalysis()}
                 disabled={generating}
               >
                 🔄 Regenerate Analysis
@@ -460,7 +281,7 @@ function AIAnalysis() {
           <div className="ai-error">
             <h3>❌ Analysis Failed</h3>
             <p>Unable to generate AI analysis. Please try again.</p>
-            <button onClick={() => generateAIAnalysis(patientData)}>
+            <button onClick={() => generateAIAnalysis()}>
               Retry Analysis
             </button>
           </div>
@@ -1,23 +1,84 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import './styles.css';
 import config from './config';
 
+const PAGE_SIZE = 100;
+
 function DoctorDashboard() {
   const [patients, setPatients] = useState([]);
+  const [totalPatients, setTotalPatients] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [attention, setAttention] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedCondition, setSelectedCondition] = useState('all');
+  const [sortBy, setSortBy] = useState('patient_id');
+  const filtersRef = useRef({ searchTerm: '', selectedCondition: 'all', sortBy: 'patient_id' });
   const navigate = useNavigate();
 
   useEffect(() => {
-    fetchDashboardData();
+    fetchAttention();
+  }, []);
+
+  // Filtering, sorting and paging happen on the server; debounce typing in the search box
+  useEffect(() => {
+    filtersRef.current = { searchTerm, selectedCondition, sortBy };
+    const timer = setTimeout(() => fetchDashboardData(), 250);
+    return () => clearTimeout(timer);
+  }, [searchTerm, selectedCondition, sortBy]);
+
+  const fetchAttention = async () => {
+    try {
+      const response = await fetch(`${config.API_BASE_URL}/api/doctor/attention`, {
+        method: 'GET',
+        credentials: 'include',
+      });
+      if (response.ok) {
+        const data = await response.json();
+        setAttention(data.patients);
+      }
+    } catch (error) {
+      console.error('Attention list error:', error);
+    }
+  };
+
+  // Patch patient rows from server-sent deltas instead of re-fetching the dashboard
+  useEffect(() => {
+    const events = new EventSource(`${config.API_BASE_URL}/api/doctor/events`, { withCredentials: true });
+
+    events.addEventListener('patient_summary', (event) => {
+      const delta = JSON.parse(event.data);
+      fetchAttention();
+      setPatients(current => {
+        if (!current.some(patient => patient.patient_id === delta.patient_id)) {
+          fetchDashboardData();
+          return current;
+        }
+        return current.map(patient => patient.patient_id === delta.patient_id ? {
+          ...patient,
+          total_logs: delta.total_logs,
+          last_log_date: delta.last_log_date,
+          latest_severity: delta.latest_severity,
+          conditions: delta.conditions
+        } : patient);
+      });
+    });
+    events.addEventListener('resync', fetchDashboardData);
+
+    return () => events.close();
   }, []);
 
-  const fetchDashboardData = async () => {
+  const fetchDashboardData = async (after = null) => {
+    const { searchTerm, selectedCondition, sortBy } = filtersRef.current;
+    const params = new URLSearchParams({ limit: PAGE_SIZE, sort: sortBy });
+    if (searchTerm.trim()) params.set('q', searchTerm.trim());
+    if (selectedCondition !== 'all') params.set('conditions', selectedCondition);
+    if (after) params.set('after', after);
+
     try {
-      const response = await fetch(`${config.API_BASE_URL}/api/doctor/dashboard`, {
+      const response = await fetch(`${config.API_BASE_URL}/api/doctor/dashboard?${params}`, {
         method: 'GET',
         credentials: 'include',
       });
@@ -31,7 +92,9 @@ function DoctorDashboard() {
       }
 
       const data = await response.json();
-      setPatients(data.patients);
+      setPatients(current => after ? [...current, ...data.patients] : data.patients);
+      setTotalPatients(data.total_patients);
+      setNextCursor(data.page.next_cursor);
     } catch (error) {
       setError('Failed to load dashboard data');
       console.error('Dashboard error:', error);
@@ -44,6 +107,22 @@ function DoctorDashboard() {
     navigate(`/doctor/patient/${patientId}`);
   };
 
+  // Flags stay raised until acknowledged (or they decay on the server)
+  const handleAcknowledge = async (event, patientId) => {
+    event.stopPropagation();
+    try {
+      const response = await fetch(`${config.API_BASE_URL}/api/doctor/patient/${patientId}/attention/acknowledge`, {
+        method: 'POST',
+        credentials: 'include',
+      });
+      if (response.ok) {
+        setAttention(current => current.filter(patient => patient.patient_id !== patientId));
+      }
+    } catch (error) {
+      console.error('Acknowledge error:', error);
+    }
+  };
+
   const handleLogout = async () => {
     try {
       await fetch('http://localhost:5000/api/logout', {
@@ -56,17 +135,6 @@ function DoctorDashboard() {
     }
   };
 
-  // Filter patients based on search and condition
-  const filteredPatients = patients.filter(patient => {
-    const matchesSearch = patient.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         patient.username.toLowerCase().includes(searchTerm.toLowerCase());
-    
-    const matchesCondition = selectedCondition === 'all' || 
-                           patient.conditions[selectedCondition] === true;
-    
-    return matchesSearch && matchesCondition;
-  });
-
   const getConditionIcons = (conditions) => {
     const icons = [];
     if (conditions.rhinitis) icons.push('👃');
@@ -112,7 +180,7 @@ function DoctorDashboard() {
           <h1>Patient Overview</h1>
           <div className="dashboard-stats">
             <div className="stat-card">
-              <div className="stat-number">{patients.length}</div>
+              <div className="stat-number">{totalPatients}</div>
               <div className="stat-label">Total Patients</div>
             </div>
             <div className="stat-card">
@@ -132,6 +200,26 @@ function DoctorDashboard() {
 
         {error && <div className="error">{error}</div>}
 
+        {attention.length > 0 && (
+          <div className="ai-section warning">
+            <h3>⚠️ Needs Attention</h3>
+            {attention.map((patient) => (
+              <div
+                key={patient.patient_id}
+                className="concern-item risk"
+                style={{ cursor: 'pointer' }}
+                onClick={() => handlePatientClick(patient.patient_id)}
+              >
+                <span>{patient.name}</span>
+                <span>{patient.metric} {patient.anomaly_score.toFixed(1)}σ above baseline</span>
+                <button className="nav-button" onClick={(event) => handleAcknowledge(event, patient.patient_id)}>
+                  Acknowledge
+                </button>
+              </div>
+            ))}
+          </div>
+        )}
+
         <div className="dashboard-filters">
           <div className="search-container">
             <input
@@ -154,10 +242,22 @@ function DoctorDashboard() {
               <option value="tinnitus">Tinnitus</option>
             </select>
           </div>
+          <div className="filter-container">
+            <select
+              value={sortBy}
+              onChange={(e) => setSortBy(e.target.value)}
+              className="filter-select"
+            >
+              <option value="patient_id">Sort: Patient ID</option>
+              <option value="last_log_date">Sort: Last Activity</option>
+              <option value="latest_severity">Sort: Latest Severity</option>
+              <option value="total_logs">Sort: Total Logs</option>
+            </select>
+          </div>
         </div>
 
         <div className="patients-grid">
-          {filteredPatients.length === 0 ? (
+          {patients.length === 0 ? (
             <div className="no-patients">
               <p>No patients found matching your criteria</p>
               <button onClick={() => navigate('/doctor/add-patient')}>
@@ -165,7 +265,7 @@ function DoctorDashboard() {
               </button>
             </div>
           ) : (
-            filteredPatients.map((patient) => {
+            patients.map((patient) => {
               const activity = getActivityStatus(patient.last_log_date);
               return (
                 <div
@@ -242,6 +342,14 @@ function DoctorDashboard() {
             })
           )}
         </div>
+
+        {nextCursor && (
+          <div style={{ textAlign: 'center', marginTop: '20px' }}>
+            <button onClick={() => fetchDashboardData(nextCursor)}>
+              Load more ({patients.length} of {totalPatients})
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
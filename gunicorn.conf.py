@@ -0,0 +1,21 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is built once in the master (preload_app) and workers are forked
+from it, so imported modules, models and config are shared copy-on-write
+instead of being rebuilt per worker. Database connections, thread pools
+and listener threads are all created lazily or reset after fork.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything the preloaded app allocated into the permanent generation,
+    # so the cyclic GC never writes to (and un-shares) those pages in workers
+    gc.freeze()
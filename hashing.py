@@ -0,0 +1,203 @@
+"""Password hashing offloaded to a bounded process pool.
+
+PBKDF2/scrypt hashing is deliberately slow CPU work. Running it inline in
+a request handler holds the GIL for the whole computation, so a burst of
+logins stalls every thread of the worker. PasswordHasher hands the work
+to a small process pool, caps how many hashes may be queued and keeps
+counters that the metrics endpoints can report. HTTP imports hash through
+the same pool (hash_many); hash_passwords() hashes CLI imports on a
+dedicated, short-lived pool.
+
+Hashing processes are never forked from the web worker: a gunicorn worker
+has threads (and fork hooks) that a forked child would inherit, so pools
+start their processes from a clean forkserver (spawn where that is not
+available).
+"""
+import atexit
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full or a hash did not finish in time"""
+
+
+def hash_method_of(password_hash):
+    """The method prefix of a Werkzeug hash, e.g. 'pbkdf2:sha256:600000'"""
+    return password_hash.split('$', 1)[0] if password_hash else None
+
+
+def hash_chunk(passwords, method):
+    return [generate_password_hash(password, method) for password in passwords]
+
+
+def pool_context():
+    """Multiprocessing context for hashing pools: forkserver, or spawn where it is unavailable"""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def hash_passwords(passwords, method, workers):
+    """Hash a batch of passwords on a dedicated pool of ``workers`` processes (0 hashes inline)"""
+    if not workers or len(passwords) < 2:
+        return hash_chunk(passwords, method)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as executor:
+        # Several passwords per task keep the pickling overhead small next to the hashing
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(executor.map(generate_password_hash, passwords, itertools.repeat(method), chunksize=chunksize))
+
+
+class PasswordHasher:
+    """Hash and verify passwords in a process pool with a bounded queue.
+
+    ``workers=0`` keeps the previous inline behaviour. The pool is created
+    lazily and re-created after a fork, so it is safe to build the hasher
+    before gunicorn forks its workers.
+    """
+
+    def __init__(self, method='pbkdf2:sha256', workers=2, max_pending=64, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._full_method = None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        atexit.register(self.shutdown)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                # A pool inherited through fork has no live workers in this process
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken pool (a worker died); the next call starts a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, func, *args):
+        """(executor, future) for a task; a pool found broken is replaced once"""
+        executor = self._get_executor()
+        try:
+            return executor, executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._discard(executor)
+            executor = self._get_executor()
+            return executor, executor.submit(func, *args)
+
+    def _release(self, started):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+            self.total_wait_seconds += time.perf_counter() - started
+
+    def _start(self, func, *args):
+        """Take a queue slot and submit; returns (executor, future)"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusyError('Password hashing queue is full')
+            self._pending += 1
+            self.submitted += 1
+
+        started = time.perf_counter()
+        try:
+            executor, future = self._submit(func, *args)
+        except Exception:
+            self._release(started)
+            raise
+        # A running hash cannot be cancelled, so its slot is freed when it finishes, not when we stop waiting
+        future.add_done_callback(lambda _: self._release(started))
+        return executor, future
+
+    def _wait(self, executor, future, timeout):
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingBusyError('Password hashing timed out')
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise HashingBusyError('Password hashing pool failed')
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        return self._wait(*self._start(func, *args), self.timeout)
+
+    def hash_many(self, passwords, chunk_size=8):
+        """Hash a batch on the shared pool in small chunks.
+
+        At most ``workers`` chunks are queued at a time, so logins waiting
+        on the same pool are served between chunks instead of after the
+        whole batch.
+        """
+        if not self.workers:
+            return hash_chunk(passwords, self.method)
+        hashes = []
+        in_flight = deque()
+        for start in range(0, len(passwords), chunk_size):
+            if len(in_flight) >= self.workers:
+                hashes += self._wait(*in_flight.popleft(), self.timeout * chunk_size)
+            in_flight.append(self._start(hash_chunk, passwords[start:start + chunk_size], self.method))
+        while in_flight:
+            hashes += self._wait(*in_flight.popleft(), self.timeout * chunk_size)
+        return hashes
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    @property
+    def full_method(self):
+        """Configured method with Werkzeug's defaults filled in, e.g. 'pbkdf2:sha256:600000'"""
+        if self._full_method is None:
+            self._full_method = hash_method_of(generate_password_hash('', self.method))
+        return self._full_method
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different method or cost"""
+        return hash_method_of(password_hash) != self.full_method
+
+    def stats(self):
+        method = self.full_method
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'method': method,
+                'queue_depth': self._pending,
+                'max_pending': self.max_pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self.total_wait_seconds / self.completed * 1000, 2) if self.completed else 0.0
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        # Outside the lock: cancelled futures release their slots through _release
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
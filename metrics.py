@@ -0,0 +1,174 @@
+"""Per-request performance instrumentation and Prometheus exposition.
+
+RequestMetrics times every request, counts the SQL statements it runs and
+the time spent in them (via SQLAlchemy cursor events), and keeps
+histograms per endpoint. Requests over the configured latency or
+statement budget are logged as one JSON line on the
+``symptom_tracker.perf`` logger.
+
+Metrics are kept per worker process.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+perf_logger = logging.getLogger('symptom_tracker.perf')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        series['counts'][bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self._series.items()):
+            label_text = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series["sum"]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {series["count"]}')
+        return lines
+
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+
+
+def render_gauges(name, help_text, values, metric_type='gauge'):
+    """Exposition lines for a flat {suffix: value} mapping, e.g. pool stats"""
+    lines = []
+    for suffix, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        metric = f'{name}_{suffix}'
+        lines.append(f'# HELP {metric} {help_text} ({suffix})')
+        lines.append(f'# TYPE {metric} {metric_type}')
+        lines.append(f'{metric} {value}')
+    return lines
+
+
+class RequestMetrics:
+    """Flask/SQLAlchemy hooks that feed the request histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_total = {}
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Wall time per request',
+            ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.db_duration = Histogram(
+            'http_request_db_duration_seconds', 'Time spent executing SQL per request',
+            ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.statements = Histogram(
+            'http_request_sql_statements', 'SQL statements executed per request',
+            ('endpoint', 'method'), STATEMENT_BUCKETS)
+        self.config = None
+
+    def init_app(self, app, engine):
+        self.config = app.config
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        self.instrument_engine(engine)
+
+    def instrument_engine(self, engine):
+        """Count an engine's statements and time towards the current request"""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _before_request(self):
+        g.perf_started = time.perf_counter()
+        g.perf_db_seconds = 0.0
+        g.perf_statements = 0
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('perf_query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['perf_query_start'].pop()
+        if has_request_context() and 'perf_started' in g:
+            g.perf_db_seconds += time.perf_counter() - started
+            g.perf_statements += 1
+
+    @staticmethod
+    def _handle_error(context):
+        if context.connection is not None and context.connection.info.get('perf_query_start'):
+            context.connection.info['perf_query_start'].pop()
+
+    def _after_request(self, response):
+        if 'perf_started' not in g:
+            return response
+        duration = time.perf_counter() - g.perf_started
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (endpoint, request.method)
+
+        with self._lock:
+            key = labels + (str(response.status_code),)
+            self.requests_total[key] = self.requests_total.get(key, 0) + 1
+            self.request_duration.observe(labels, duration)
+            self.db_duration.observe(labels, g.perf_db_seconds)
+            self.statements.observe(labels, g.perf_statements)
+
+        if self.config.get('SERVER_TIMING_HEADER'):
+            response.headers['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, db;dur={g.perf_db_seconds * 1000:.1f};desc="{g.perf_statements} queries"'
+            )
+
+        latency_budget = self.config.get('SLOW_REQUEST_MS')
+        statement_budget = self.config.get('SLOW_REQUEST_STATEMENTS')
+        over_latency = latency_budget and duration * 1000 > latency_budget
+        over_statements = statement_budget and g.perf_statements > statement_budget
+        if over_latency or over_statements:
+            perf_logger.warning(json.dumps({
+                'event': 'request_over_budget',
+                'endpoint': endpoint,
+                'path': request.path,
+                'method': request.method,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'db_ms': round(g.perf_db_seconds * 1000, 2),
+                'statements': g.perf_statements,
+                'latency_budget_ms': latency_budget,
+                'statement_budget': statement_budget
+            }))
+        return response
+
+    def render(self, extra_lines=()):
+        """Prometheus text exposition of every collected metric"""
+        with self._lock:
+            lines = ['# HELP http_requests_total Requests handled', '# TYPE http_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests_total.items()):
+                label_text = _format_labels(('endpoint', 'method', 'status'), (endpoint, method, status))
+                lines.append(f'http_requests_total{{{label_text}}} {count}')
+            lines += self.request_duration.render()
+            lines += self.db_duration.render()
+            lines += self.statements.render()
+        lines += list(extra_lines)
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,127 @@
+"""Baseline schema
+
+Captures the tables that create_all() used to build before migrations
+were introduced. Tables and columns that already exist are left alone so
+databases created by earlier releases can be upgraded in place.
+
+Revision ID: 0001_baseline_schema
+Revises:
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+SCORE_COLUMNS = [
+    'rhinitis_runny_nose', 'rhinitis_congestion', 'rhinitis_sneezing',
+    'rhinitis_itchiness', 'rhinitis_loss_smell',
+    'vertigo_severity', 'vertigo_frequency', 'vertigo_type', 'vertigo_associated',
+    'tinnitus_loudness', 'tinnitus_type', 'tinnitus_continuity', 'tinnitus_impact'
+]
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'doctors' not in existing:
+        op.create_table(
+            'doctors',
+            sa.Column('doctor_id', sa.Integer(), primary_key=True),
+            sa.Column('username', sa.String(100), nullable=False, unique=True),
+            sa.Column('password', sa.String(255), nullable=False),
+            sa.Column('first_name', sa.String(100), nullable=False),
+            sa.Column('last_name', sa.String(100), nullable=False),
+            sa.Column('is_active', sa.Boolean()),
+            sa.Column('created_at', sa.DateTime()),
+        )
+
+    if 'patients' not in existing:
+        op.create_table(
+            'patients',
+            sa.Column('patient_id', sa.Integer(), primary_key=True),
+            sa.Column('username', sa.String(100), nullable=False, unique=True),
+            sa.Column('password', sa.String(255), nullable=False),
+            sa.Column('first_name', sa.String(100)),
+            sa.Column('last_name', sa.String(100)),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+    if 'patient_conditions' not in existing:
+        op.create_table(
+            'patient_conditions',
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), primary_key=True),
+            sa.Column('has_rhinitis', sa.Boolean()),
+            sa.Column('has_vertigo', sa.Boolean()),
+            sa.Column('has_tinnitus', sa.Boolean()),
+        )
+
+    if 'symptom_logs' not in existing:
+        op.create_table(
+            'symptom_logs',
+            sa.Column('log_id', sa.Integer(), primary_key=True),
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), nullable=False),
+            sa.Column('log_timestamp', sa.DateTime()),
+            *[sa.Column(name, sa.Integer()) for name in SCORE_COLUMNS],
+            sa.Column('created_at', sa.DateTime()),
+        )
+
+    if 'symptom_log_idempotency' not in existing:
+        op.create_table(
+            'symptom_log_idempotency',
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), primary_key=True),
+            sa.Column('idempotency_key', sa.String(100), primary_key=True),
+            sa.Column('log_id', sa.Integer(), sa.ForeignKey('symptom_logs.log_id'), nullable=False),
+            sa.Column('created_at', sa.DateTime()),
+        )
+
+    if 'patient_summary' not in existing:
+        op.create_table(
+            'patient_summary',
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), primary_key=True),
+            sa.Column('total_logs', sa.Integer(), nullable=False),
+            sa.Column('last_log_at', sa.DateTime(), index=True),
+            sa.Column('last_overall_severity', sa.Float()),
+            sa.Column('has_rhinitis', sa.Boolean()),
+            sa.Column('has_vertigo', sa.Boolean()),
+            sa.Column('has_tinnitus', sa.Boolean()),
+            sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+    else:
+        columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('patient_summary')}
+        if 'data_version' not in columns:
+            op.add_column('patient_summary', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+    if 'symptom_rollups' not in existing:
+        metric_columns = []
+        for metric in ('rhinitis', 'vertigo', 'tinnitus', 'overall'):
+            metric_columns += [
+                sa.Column(f'{metric}_sum', sa.Float()),
+                sa.Column(f'{metric}_count', sa.Integer()),
+                sa.Column(f'{metric}_min', sa.Float()),
+                sa.Column(f'{metric}_max', sa.Float()),
+            ]
+        op.create_table(
+            'symptom_rollups',
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), primary_key=True),
+            sa.Column('period', sa.String(10), primary_key=True),
+            sa.Column('period_start', sa.Date(), primary_key=True),
+            sa.Column('log_count', sa.Integer(), nullable=False),
+            sa.Column('first_log_at', sa.DateTime()),
+            sa.Column('last_log_at', sa.DateTime()),
+            *metric_columns,
+        )
+
+
+def downgrade():
+    for table in ('symptom_rollups', 'patient_summary', 'symptom_log_idempotency',
+                  'symptom_logs', 'patient_conditions', 'patients', 'doctors'):
+        op.drop_table(table)
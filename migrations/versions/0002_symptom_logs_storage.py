@@ -0,0 +1,73 @@
+"""Compact symptom_logs storage and indexes
+
+- composite (patient_id, created_at, log_id) index for the per-patient
+  ordered reads and keyset pagination every doctor endpoint does
+- SMALLINT score columns (all scores are 0-5)
+- BRIN index on created_at for cross-patient date-range scans on
+  PostgreSQL (a plain index elsewhere)
+
+Declarative partitioning was not used: it would require the partition key
+in the primary key, which breaks the log_id foreign key from
+symptom_log_idempotency. BRIN gives the time-range pruning for a fraction
+of the index size on this append-mostly table.
+
+Revision ID: 0002_symptom_logs_storage
+Revises: 0001_baseline_schema
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_symptom_logs_storage'
+down_revision = '0001_baseline_schema'
+branch_labels = None
+depends_on = None
+
+SCORE_COLUMNS = [
+    'rhinitis_runny_nose', 'rhinitis_congestion', 'rhinitis_sneezing',
+    'rhinitis_itchiness', 'rhinitis_loss_smell',
+    'vertigo_severity', 'vertigo_frequency', 'vertigo_type', 'vertigo_associated',
+    'tinnitus_loudness', 'tinnitus_type', 'tinnitus_continuity', 'tinnitus_impact'
+]
+
+
+def _existing_indexes():
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('symptom_logs')}
+
+
+def upgrade():
+    bind = op.get_bind()
+    indexes = _existing_indexes()
+
+    if 'ix_symptom_logs_patient_created' not in indexes:
+        op.create_index('ix_symptom_logs_patient_created', 'symptom_logs',
+                        ['patient_id', 'created_at', 'log_id'])
+
+    if 'ix_symptom_logs_created_brin' not in indexes:
+        op.create_index('ix_symptom_logs_created_brin', 'symptom_logs', ['created_at'],
+                        postgresql_using='brin')
+
+    if bind.dialect.name == 'postgresql':
+        # One table rewrite for all thirteen columns
+        op.execute('ALTER TABLE symptom_logs ' + ', '.join(
+            f'ALTER COLUMN {name} TYPE SMALLINT' for name in SCORE_COLUMNS))
+    else:
+        with op.batch_alter_table('symptom_logs') as batch_op:
+            for name in SCORE_COLUMNS:
+                batch_op.alter_column(name, existing_type=sa.Integer(), type_=sa.SmallInteger())
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('ALTER TABLE symptom_logs ' + ', '.join(
+            f'ALTER COLUMN {name} TYPE INTEGER' for name in SCORE_COLUMNS))
+    else:
+        with op.batch_alter_table('symptom_logs') as batch_op:
+            for name in SCORE_COLUMNS:
+                batch_op.alter_column(name, existing_type=sa.SmallInteger(), type_=sa.Integer())
+    op.drop_index('ix_symptom_logs_created_brin', table_name='symptom_logs')
+    op.drop_index('ix_symptom_logs_patient_created', table_name='symptom_logs')
@@ -0,0 +1,38 @@
+"""Background AI analysis jobs
+
+Revision ID: 0003_analysis_jobs
+Revises: 0002_symptom_logs_storage
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_analysis_jobs'
+down_revision = '0002_symptom_logs_storage'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'analysis_jobs',
+        sa.Column('job_id', sa.String(32), primary_key=True),
+        sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), nullable=False),
+        sa.Column('data_version', sa.String(64), nullable=False),
+        sa.Column('backend', sa.String(20), nullable=False),
+        sa.Column('status', sa.String(10), nullable=False),
+        sa.Column('result', sa.Text()),
+        sa.Column('error', sa.Text()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('finished_at', sa.DateTime()),
+    )
+    op.create_index('ux_analysis_jobs_key', 'analysis_jobs', ['patient_id', 'data_version', 'backend'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_analysis_jobs_key', table_name='analysis_jobs')
+    op.drop_table('analysis_jobs')
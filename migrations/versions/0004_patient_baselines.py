@@ -0,0 +1,57 @@
+"""Running baselines and flags for ingest-time anomaly detection
+
+Revision ID: 0004_patient_baselines
+Revises: 0003_analysis_jobs
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_patient_baselines'
+down_revision = '0003_analysis_jobs'
+branch_labels = None
+depends_on = None
+
+METRICS = ['rhinitis', 'vertigo', 'tinnitus', 'overall']
+
+
+def upgrade():
+    metric_columns = []
+    for metric in METRICS:
+        metric_columns += [
+            sa.Column(f'{metric}_count', sa.Integer()),
+            sa.Column(f'{metric}_mean', sa.Float()),
+            sa.Column(f'{metric}_m2', sa.Float()),
+            sa.Column(f'{metric}_ewma', sa.Float()),
+        ]
+    op.create_table(
+        'patient_baselines',
+        sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), primary_key=True),
+        sa.Column('anomaly_score', sa.Float(), nullable=False),
+        sa.Column('anomaly_metric', sa.String(10)),
+        sa.Column('last_log_id', sa.Integer()),
+        sa.Column('flagged_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        *metric_columns
+    )
+    op.create_index('ix_patient_baselines_anomaly_score', 'patient_baselines', ['anomaly_score'])
+
+    op.create_table(
+        'symptom_log_flags',
+        sa.Column('log_id', sa.Integer(), sa.ForeignKey('symptom_logs.log_id'), primary_key=True),
+        sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), nullable=False),
+        sa.Column('metric', sa.String(10), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    op.create_index('ix_symptom_log_flags_patient_id', 'symptom_log_flags', ['patient_id'])
+
+
+def downgrade():
+    op.drop_index('ix_symptom_log_flags_patient_id', table_name='symptom_log_flags')
+    op.drop_table('symptom_log_flags')
+    op.drop_index('ix_patient_baselines_anomaly_score', table_name='patient_baselines')
+    op.drop_table('patient_baselines')
@@ -0,0 +1,46 @@
+"""Indexes for dashboard filtering, sorting and search
+
+- (sort column, patient_id) composites on patient_summary for keyset
+  pagination by total logs, last log date and latest severity; the
+  single-column last_log_at index is a prefix of the new one
+- pg_trgm GIN index over lower('first last username') so substring
+  search on PostgreSQL does not scan patients
+
+Revision ID: 0005_dashboard_indexes
+Revises: 0004_patient_baselines
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_dashboard_indexes'
+down_revision = '0004_patient_baselines'
+branch_labels = None
+depends_on = None
+
+SEARCH_TEXT = "lower(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || username)"
+
+
+def upgrade():
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('patient_summary')}
+    if 'ix_patient_summary_last_log_at' in existing:
+        op.drop_index('ix_patient_summary_last_log_at', table_name='patient_summary')
+    op.create_index('ix_patient_summary_total_logs', 'patient_summary', ['total_logs', 'patient_id'])
+    op.create_index('ix_patient_summary_last_log', 'patient_summary', ['last_log_at', 'patient_id'])
+    op.create_index('ix_patient_summary_severity', 'patient_summary', ['last_overall_severity', 'patient_id'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute(f'CREATE INDEX ix_patients_search_trgm ON patients USING gin ({SEARCH_TEXT} gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_patients_search_trgm')
+    op.drop_index('ix_patient_summary_severity', table_name='patient_summary')
+    op.drop_index('ix_patient_summary_last_log', table_name='patient_summary')
+    op.drop_index('ix_patient_summary_total_logs', table_name='patient_summary')
+    op.create_index('ix_patient_summary_last_log_at', 'patient_summary', ['last_log_at'])
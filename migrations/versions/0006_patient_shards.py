@@ -0,0 +1,37 @@
+"""Patient shard directory
+
+patient_shards maps every patient id (and username) to the database that
+holds the patient's rows. It is only read when DATABASE_SHARD_URLS is
+set; init-db backfills it from the patients already on the primary.
+
+Revision ID: 0006_patient_shards
+Revises: 0005_dashboard_indexes
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_patient_shards'
+down_revision = '0005_dashboard_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'patient_shards',
+        sa.Column('patient_id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String(100), nullable=False, unique=True),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('moving', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+    op.create_index('ix_patient_shards_shard', 'patient_shards', ['shard'])
+
+
+def downgrade():
+    op.drop_index('ix_patient_shards_shard', table_name='patient_shards')
+    op.drop_table('patient_shards')
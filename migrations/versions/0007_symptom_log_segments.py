@@ -0,0 +1,40 @@
+"""Cold tier for archived symptom logs
+
+symptom_log_segments holds logs moved out of symptom_logs by
+`flask archive-logs`: one compressed, append-only segment per patient and
+calendar month, indexed by the time range it covers.
+
+Revision ID: 0007_symptom_log_segments
+Revises: 0006_patient_shards
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_symptom_log_segments'
+down_revision = '0006_patient_shards'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'symptom_log_segments',
+        sa.Column('segment_id', sa.Integer(), primary_key=True),
+        sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patients.patient_id'), nullable=False),
+        sa.Column('first_created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_created_at', sa.DateTime(), nullable=False),
+        sa.Column('log_count', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    op.create_index('ix_symptom_log_segments_range', 'symptom_log_segments',
+                    ['patient_id', 'first_created_at', 'last_created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_symptom_log_segments_range', table_name='symptom_log_segments')
+    op.drop_table('symptom_log_segments')
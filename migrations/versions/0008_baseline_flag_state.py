@@ -0,0 +1,48 @@
+"""Sticky attention flags on patient baselines
+
+- last_log_at: (created_at, log_id) of the newest folded log, so logs
+  that arrive out of order can be recognised and kept off the EWMA
+- flag_score/flag_metric: worst deviation since the patient was last
+  flagged; the flag stays raised until a doctor acknowledges it
+  (acknowledged_at) or it decays
+
+Revision ID: 0008_baseline_flag_state
+Revises: 0007_symptom_log_segments
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_baseline_flag_state'
+down_revision = '0007_symptom_log_segments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('patient_baselines') as batch_op:
+        batch_op.add_column(sa.Column('last_log_at', sa.DateTime()))
+        batch_op.add_column(sa.Column('flag_score', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('flag_metric', sa.String(10)))
+        batch_op.add_column(sa.Column('acknowledged_at', sa.DateTime()))
+
+    op.execute(
+        'UPDATE patient_baselines SET last_log_at = ('
+        'SELECT created_at FROM symptom_logs WHERE symptom_logs.log_id = patient_baselines.last_log_id)'
+    )
+    # A flag raised before this revision is carried over with the score it had then
+    op.execute(
+        'UPDATE patient_baselines SET flag_score = anomaly_score, flag_metric = anomaly_metric '
+        'WHERE flagged_at IS NOT NULL'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('patient_baselines') as batch_op:
+        batch_op.drop_column('acknowledged_at')
+        batch_op.drop_column('flag_metric')
+        batch_op.drop_column('flag_score')
+        batch_op.drop_column('last_log_at')
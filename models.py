@@ -0,0 +1,286 @@
+"""SQLAlchemy models for patients, doctors, symptom logs and their derived tables."""
+from datetime import datetime
+
+from flask_login import UserMixin
+from sqlalchemy import (Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, SmallInteger, String, Text,
+                        false, func, literal_column)
+from sqlalchemy.orm import relationship
+
+from extensions import db
+
+# SIMPLIFIED Doctor Model - Only basic fields
+class Doctor(db.Model, UserMixin):
+    __tablename__ = 'doctors'
+
+    doctor_id = Column(Integer, primary_key=True)
+    username = Column(String(100), unique=True, nullable=False)
+    password = Column(String(255), nullable=False)
+    first_name = Column(String(100), nullable=False)
+    last_name = Column(String(100), nullable=False)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Doctor {self.username}>'
+
+    def get_id(self):
+        return f"doctor_{self.doctor_id}"
+
+    @property
+    def user_type(self):
+        return 'doctor'
+
+# SIMPLIFIED Patient Model - Only basic fields
+def patient_search_text(first_name, last_name, username):
+    """Lower-cased 'first last username' used by dashboard search and its trigram index"""
+    return func.lower(
+        func.coalesce(first_name, literal_column("''")) + literal_column("' '")
+        + func.coalesce(last_name, literal_column("''")) + literal_column("' '") + username
+    )
+
+class Patient(db.Model, UserMixin):
+    __tablename__ = 'patients'
+
+    patient_id = Column(Integer, primary_key=True)
+    username = Column(String(100), unique=True, nullable=False)
+    password = Column(String(255), nullable=False)
+    first_name = Column(String(100))
+    last_name = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Substring search (LIKE '%term%') on PostgreSQL via pg_trgm; SQLite scans
+        Index('ix_patients_search_trgm', patient_search_text(first_name, last_name, username).label('search_text'),
+              postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
+
+    # Simplified relationships - only what actually exists
+    logs = relationship('SymptomLog', back_populates='patient')
+    conditions = relationship('PatientConditions', back_populates='patient', uselist=False)
+
+    def __repr__(self):
+        return f'<Patient {self.username}>'
+
+    def get_id(self):
+        return f"patient_{self.patient_id}"
+
+    @property
+    def user_type(self):
+        return 'patient'
+
+# Patient Conditions - Simple
+class PatientConditions(db.Model):
+    __tablename__ = 'patient_conditions'
+
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), primary_key=True)
+    has_rhinitis = Column(Boolean, default=False)
+    has_vertigo = Column(Boolean, default=False)
+    has_tinnitus = Column(Boolean, default=False)
+
+    patient = relationship('Patient', back_populates='conditions')
+
+# Symptom Logs - Simple
+class SymptomLog(db.Model):
+    __tablename__ = 'symptom_logs'
+    __table_args__ = (
+        # Every doctor read filters by patient and orders by created_at (keyset on log_id)
+        Index('ix_symptom_logs_patient_created', 'patient_id', 'created_at', 'log_id'),
+        Index('ix_symptom_logs_created_brin', 'created_at', postgresql_using='brin'),
+    )
+
+    log_id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), nullable=False)
+    log_timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    # Rhinitis symptoms
+    rhinitis_runny_nose = Column(SmallInteger)
+    rhinitis_congestion = Column(SmallInteger)
+    rhinitis_sneezing = Column(SmallInteger)
+    rhinitis_itchiness = Column(SmallInteger)
+    rhinitis_loss_smell = Column(SmallInteger)
+    
+    # Vertigo symptoms
+    vertigo_severity = Column(SmallInteger)
+    vertigo_frequency = Column(SmallInteger)
+    vertigo_type = Column(SmallInteger)
+    vertigo_associated = Column(SmallInteger)
+    
+    # Tinnitus symptoms
+    tinnitus_loudness = Column(SmallInteger)
+    tinnitus_type = Column(SmallInteger)
+    tinnitus_continuity = Column(SmallInteger)
+    tinnitus_impact = Column(SmallInteger)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    patient = relationship('Patient', back_populates='logs')
+
+
+LOG_FIELDS = [
+    'rhinitis_runny_nose', 'rhinitis_congestion', 'rhinitis_sneezing',
+    'rhinitis_itchiness', 'rhinitis_loss_smell',
+    'vertigo_severity', 'vertigo_frequency', 'vertigo_type', 'vertigo_associated',
+    'tinnitus_loudness', 'tinnitus_type', 'tinnitus_continuity', 'tinnitus_impact'
+]
+
+# Symptom Log Segments - Cold tier: compressed, append-only batches of archived logs
+class SymptomLogSegment(db.Model):
+    __tablename__ = 'symptom_log_segments'
+    __table_args__ = (
+        # Time-range index: readers fetch only the segments overlapping their window
+        Index('ix_symptom_log_segments_range', 'patient_id', 'first_created_at', 'last_created_at'),
+    )
+
+    segment_id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), nullable=False)
+    first_created_at = Column(DateTime, nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    log_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON columns, see archive.py
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Idempotency keys for replayed offline symptom logs
+class SymptomLogIdempotency(db.Model):
+    __tablename__ = 'symptom_log_idempotency'
+
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), primary_key=True)
+    idempotency_key = Column(String(100), primary_key=True)
+    log_id = Column(Integer, ForeignKey('symptom_logs.log_id'), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Patient Summary - Denormalized projection for the doctor dashboard
+class PatientSummary(db.Model):
+    __tablename__ = 'patient_summary'
+
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), primary_key=True)
+    total_logs = Column(Integer, nullable=False, default=0)
+    last_log_at = Column(DateTime)
+    last_overall_severity = Column(Float)
+    has_rhinitis = Column(Boolean, default=False)
+    has_vertigo = Column(Boolean, default=False)
+    has_tinnitus = Column(Boolean, default=False)
+    data_version = Column(Integer, nullable=False, default=0, server_default='0')  # Bumped on every change to the patient's logs/conditions
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Keyset orderings for the dashboard sorts (patient_id breaks ties)
+    __table_args__ = (
+        Index('ix_patient_summary_total_logs', 'total_logs', 'patient_id'),
+        Index('ix_patient_summary_last_log', 'last_log_at', 'patient_id'),
+        Index('ix_patient_summary_severity', 'last_overall_severity', 'patient_id'),
+    )
+
+# Symptom Rollups - Per-day and per-week aggregates for analytics charts
+ROLLUP_METRICS = ['rhinitis', 'vertigo', 'tinnitus', 'overall']
+
+class SymptomRollup(db.Model):
+    __tablename__ = 'symptom_rollups'
+
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), primary_key=True)
+    period = Column(String(10), primary_key=True)  # 'day' or 'week'
+    period_start = Column(Date, primary_key=True)
+    log_count = Column(Integer, nullable=False, default=0)
+    first_log_at = Column(DateTime)
+    last_log_at = Column(DateTime)
+
+    rhinitis_sum = Column(Float, default=0)
+    rhinitis_count = Column(Integer, default=0)
+    rhinitis_min = Column(Float)
+    rhinitis_max = Column(Float)
+
+    vertigo_sum = Column(Float, default=0)
+    vertigo_count = Column(Integer, default=0)
+    vertigo_min = Column(Float)
+    vertigo_max = Column(Float)
+
+    tinnitus_sum = Column(Float, default=0)
+    tinnitus_count = Column(Integer, default=0)
+    tinnitus_min = Column(Float)
+    tinnitus_max = Column(Float)
+
+    overall_sum = Column(Float, default=0)
+    overall_count = Column(Integer, default=0)
+    overall_min = Column(Float)
+    overall_max = Column(Float)
+
+# Patient Baselines - Running per-metric statistics for anomaly detection
+class PatientBaseline(db.Model):
+    __tablename__ = 'patient_baselines'
+
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), primary_key=True)
+    anomaly_score = Column(Float, nullable=False, default=0, index=True)  # Latest log's worst deviation
+    anomaly_metric = Column(String(10))
+    last_log_id = Column(Integer)
+    last_log_at = Column(DateTime)  # With last_log_id, the newest log folded in
+    flagged_at = Column(DateTime)  # Newest log that raised the flag
+    flag_score = Column(Float, nullable=False, default=0, server_default='0')  # Worst score since the flag was raised
+    flag_metric = Column(String(10))
+    acknowledged_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Welford count/mean/M2 and EWMA per metric
+    rhinitis_count = Column(Integer, default=0)
+    rhinitis_mean = Column(Float, default=0)
+    rhinitis_m2 = Column(Float, default=0)
+    rhinitis_ewma = Column(Float)
+
+    vertigo_count = Column(Integer, default=0)
+    vertigo_mean = Column(Float, default=0)
+    vertigo_m2 = Column(Float, default=0)
+    vertigo_ewma = Column(Float)
+
+    tinnitus_count = Column(Integer, default=0)
+    tinnitus_mean = Column(Float, default=0)
+    tinnitus_m2 = Column(Float, default=0)
+    tinnitus_ewma = Column(Float)
+
+    overall_count = Column(Integer, default=0)
+    overall_mean = Column(Float, default=0)
+    overall_m2 = Column(Float, default=0)
+    overall_ewma = Column(Float)
+
+# Symptom Log Flags - Logs that departed from the patient's baseline when written
+class SymptomLogFlag(db.Model):
+    __tablename__ = 'symptom_log_flags'
+
+    log_id = Column(Integer, ForeignKey('symptom_logs.log_id'), primary_key=True)
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), nullable=False, index=True)
+    metric = Column(String(10), nullable=False)
+    score = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# AI Analysis Jobs - One narrative per (patient, data version, backend)
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+    __table_args__ = (
+        Index('ux_analysis_jobs_key', 'patient_id', 'data_version', 'backend', unique=True),
+    )
+
+    job_id = Column(String(32), primary_key=True)
+    patient_id = Column(Integer, ForeignKey('patients.patient_id'), nullable=False)
+    data_version = Column(String(64), nullable=False)
+    backend = Column(String(20), nullable=False)
+    status = Column(String(10), nullable=False, default='queued')  # queued, running, succeeded, failed
+    result = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+# Patient Shards - Directory of which database holds each patient (primary only)
+class PatientShard(db.Model):
+    __tablename__ = 'patient_shards'
+
+    patient_id = Column(Integer, primary_key=True)  # Allocates patient ids when sharding is enabled
+    username = Column(String(100), unique=True, nullable=False)
+    shard = Column(Integer, nullable=False, index=True)
+    moving = Column(Boolean, nullable=False, default=False, server_default=false())  # Writes wait while rows are copied
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Tables that live on the patient's shard (see sharding.py); the rest stay on the primary
+SHARDED_MODELS = [
+    Patient, PatientConditions, SymptomLog, SymptomLogSegment, SymptomLogIdempotency, SymptomLogFlag,
+    PatientSummary, SymptomRollup, PatientBaseline, AnalysisJob
+]
+for model in SHARDED_MODELS:
+    model.__table__.info['sharded'] = True
@@ -0,0 +1,247 @@
+"""Opt-in sampling profiler for production requests.
+
+With PROFILE_REQUESTS on, a request is profiled when PROFILE_SAMPLE_RATE
+picks it (only among PROFILE_ENDPOINTS when that is set), or when a
+signed-in doctor sends ``X-Profile-Request: 1``. While the request runs, a
+sampler thread records the request thread's stack every
+PROFILE_INTERVAL_MS, and the SQL statements the request executes are
+recorded with their timings.
+
+Each profile is written to PROFILE_DIRECTORY in two files:
+
+- ``<id>.collapsed``: collapsed stacks (``frame;frame;frame count``),
+  which flamegraph.pl, speedscope and similar tools read directly;
+- ``<id>.json``: the request details and the SQL.
+
+The directory is a ring buffer that keeps only the newest
+PROFILE_MAX_FILES profiles. The profile id is returned in the
+X-Profile-Id response header.
+
+With the switch off no request hooks or engine listeners are installed,
+so normal requests do no profiling work at all.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+PROFILE_ID_PATTERN = re.compile(r'^[0-9A-Za-z-]+$')
+MAX_PROFILE_STATEMENTS = 1000
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse_stack(frame):
+    """Root-first ``a;b;c`` form of a frame's call stack"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+
+class RequestProfiler:
+    """Flask/SQLAlchemy hooks that profile selected requests into a bounded directory"""
+
+    def __init__(self, directory, max_files=50, sample_rate=0.0, endpoints=(), interval_ms=5, enabled=False):
+        self.directory = directory
+        self.max_files = max_files
+        self.sample_rate = sample_rate
+        self.endpoints = set(endpoints)
+        self.interval = interval_ms / 1000
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.profiled = 0
+
+    def init_app(self, app, engine):
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        self.instrument_engine(engine)
+
+    def instrument_engine(self, engine):
+        """Record an engine's statements into the current request's profile"""
+        if not self.enabled:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _wanted(self):
+        """Why this request should be profiled, or None"""
+        if request.headers.get(PROFILE_HEADER) == '1':
+            # Only doctors may ask; anyone else's header is ignored
+            if current_user.is_authenticated and getattr(current_user, 'user_type', None) == 'doctor':
+                return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            endpoint = request.endpoint or ''
+            if not self.endpoints or endpoint in self.endpoints or endpoint.rsplit('.', 1)[-1] in self.endpoints:
+                return 'sampled'
+        return None
+
+    def _before_request(self):
+        reason = self._wanted()
+        if reason is None:
+            return
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        g.profile = {
+            'id': f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}",
+            'reason': reason,
+            'started_at': datetime.utcnow().isoformat(),
+            'started': time.perf_counter(),
+            'sampler': sampler,
+            'sql': [],
+            'status': None
+        }
+        sampler.start()
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profile_query_start'].pop()
+        if has_request_context() and g.get('profile') is not None and len(g.profile['sql']) < MAX_PROFILE_STATEMENTS:
+            g.profile['sql'].append({
+                'statement': statement,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                'executemany': executemany
+            })
+
+    @staticmethod
+    def _handle_error(context):
+        if context.connection is not None and context.connection.info.get('profile_query_start'):
+            context.connection.info['profile_query_start'].pop()
+
+    def _after_request(self, response):
+        profile = g.get('profile')
+        if profile is not None:
+            profile['status'] = response.status_code
+            response.headers[PROFILE_ID_HEADER] = profile['id']
+        return response
+
+    def _teardown_request(self, exc):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        profile['sampler'].stop()
+        try:
+            self.save(profile)
+        except OSError:
+            pass  # A full or read-only disk must not fail the request
+
+    def save(self, profile):
+        """Write a finished profile and drop the oldest beyond max_files"""
+        os.makedirs(self.directory, exist_ok=True)
+        stacks = profile['sampler'].stacks
+        with open(os.path.join(self.directory, f"{profile['id']}.collapsed"), 'w') as destination:
+            destination.writelines(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        metadata = {
+            'id': profile['id'],
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': profile['status'],
+            'reason': profile['reason'],
+            'started_at': profile['started_at'],
+            'duration_ms': round((time.perf_counter() - profile['started']) * 1000, 2),
+            'interval_ms': self.interval * 1000,
+            'samples': sum(stacks.values()),
+            'db_ms': round(sum(query['duration_ms'] for query in profile['sql']), 2),
+            'statements': len(profile['sql']),
+            'sql': profile['sql']
+        }
+        with open(os.path.join(self.directory, f"{profile['id']}.json"), 'w') as destination:
+            json.dump(metadata, destination)
+        with self._lock:
+            self.profiled += 1
+        self._prune()
+
+    def _prune(self):
+        # Ids start with a timestamp, so name order is age order
+        for profile_id in self._profile_ids()[:-self.max_files or None]:
+            for extension in ('json', 'collapsed'):
+                try:
+                    os.remove(os.path.join(self.directory, f'{profile_id}.{extension}'))
+                except FileNotFoundError:
+                    pass  # Another worker pruned it first
+
+    def _profile_ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+    def list_profiles(self):
+        """Metadata of the stored profiles (without their SQL), newest first"""
+        profiles = []
+        for profile_id in reversed(self._profile_ids()):
+            metadata = self.load(profile_id)
+            if metadata is not None:
+                metadata.pop('sql', None)
+                profiles.append(metadata)
+        return profiles
+
+    def path(self, profile_id, extension):
+        """File of a stored profile, or None for unknown or malformed ids"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.{extension}')
+        return path if os.path.exists(path) else None
+
+    def load(self, profile_id):
+        path = self.path(profile_id, 'json')
+        if path is None:
+            return None
+        try:
+            with open(path) as source:
+                return json.load(source)
+        except (OSError, ValueError):
+            return None  # Pruned or still being written by another worker
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'profiled': self.profiled, 'stored': len(self._profile_ids())}
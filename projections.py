@@ -0,0 +1,428 @@
+"""Derived tables kept in step with symptom logs: patient summaries, rollups and baselines.
+
+Also hosts the session hooks that announce dashboard changes after commit
+and keep a writer's reads on the primary database for a while.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app, has_request_context, session
+from sqlalchemy import and_, event, or_
+from sqlalchemy.exc import IntegrityError
+
+from analysis import deviation_score, ewma_update, welford_update
+from archive import archived_log_count, archived_logs, iter_patient_logs, log_key
+from extensions import db, event_broker, replica_router
+from models import (Patient, PatientBaseline, PatientConditions, PatientSummary, ROLLUP_METRICS, SymptomLog,
+                    SymptomLogFlag, SymptomRollup)
+
+LOGS_STREAM_BATCH_SIZE = 500
+ROLLUP_INSERT_ATTEMPTS = 3
+
+def calculate_log_severity(log, conditions):
+    """Per-condition averages and overall severity of a log for the patient's active conditions"""
+    rhinitis_values = []
+    if conditions and conditions.has_rhinitis:
+        rhinitis_values = [v for v in [
+            log.rhinitis_runny_nose, log.rhinitis_congestion,
+            log.rhinitis_sneezing, log.rhinitis_itchiness,
+            log.rhinitis_loss_smell
+        ] if v is not None]
+
+    tinnitus_values = []
+    if conditions and conditions.has_tinnitus:
+        tinnitus_values = [v for v in [
+            log.tinnitus_loudness, log.tinnitus_impact
+        ] if v is not None]
+
+    all_values = []
+    if conditions:
+        if conditions.has_rhinitis:
+            all_values.extend(rhinitis_values)
+        if conditions.has_vertigo and log.vertigo_severity:
+            all_values.append(log.vertigo_severity)
+        if conditions.has_tinnitus:
+            all_values.extend(tinnitus_values)
+
+    return {
+        'rhinitis_avg': round(sum(rhinitis_values) / len(rhinitis_values), 2) if rhinitis_values else None,
+        'vertigo_severity': log.vertigo_severity if conditions and conditions.has_vertigo else None,
+        'tinnitus_avg': round(sum(tinnitus_values) / len(tinnitus_values), 2) if tinnitus_values else None,
+        'overall_severity': round(sum(all_values) / len(all_values), 2) if all_values else 0
+    }
+
+def rebuild_patient_summary(patient_id):
+    """Recompute a patient's summary row from both log tiers and PatientConditions (no commit)"""
+    summary = db.session.get(PatientSummary, patient_id)
+    if not summary:
+        summary = PatientSummary(patient_id=patient_id, data_version=1)
+        db.session.add(summary)
+    else:
+        summary.data_version = PatientSummary.data_version + 1
+
+    conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+    latest_log = SymptomLog.query.filter_by(
+        patient_id=patient_id
+    ).order_by(SymptomLog.created_at.desc(), SymptomLog.log_id.desc()).first()
+    # Archived logs are older than the hot ones unless the patient has no hot logs left
+    archived = archived_logs(patient_id, newer_than=log_key(latest_log) if latest_log else None, newest_first=True, limit=1)
+    latest_log = archived[0] if archived else latest_log
+
+    summary.total_logs = SymptomLog.query.filter_by(patient_id=patient_id).count() + archived_log_count(patient_id)
+    summary.last_log_at = latest_log.created_at if latest_log else None
+    summary.last_overall_severity = calculate_log_severity(latest_log, conditions)['overall_severity'] if latest_log else None
+    summary.has_rhinitis = bool(conditions and conditions.has_rhinitis)
+    summary.has_vertigo = bool(conditions and conditions.has_vertigo)
+    summary.has_tinnitus = bool(conditions and conditions.has_tinnitus)
+    queue_dashboard_event(summary)
+    return summary
+
+def record_logs_in_summary(patient_id, logs, conditions):
+    """Fold newly flushed SymptomLogs of one patient into their summary row (no commit)"""
+    summary = db.session.get(PatientSummary, patient_id)
+    if not summary:
+        # First log since the summary table was introduced - count from scratch
+        return rebuild_patient_summary(patient_id)
+
+    summary.total_logs = PatientSummary.total_logs + len(logs)
+    summary.data_version = PatientSummary.data_version + 1
+    latest_log = max(logs, key=lambda log: (log.created_at, log.log_id))
+    if summary.last_log_at is None or latest_log.created_at >= summary.last_log_at:
+        summary.last_log_at = latest_log.created_at
+        summary.last_overall_severity = calculate_log_severity(latest_log, conditions)['overall_severity']
+    queue_dashboard_event(summary)
+    return summary
+
+# Dashboard deltas, announced once the change that produced them commits
+def queue_dashboard_event(summary):
+    db.session.info.setdefault('dashboard_events', {})[summary.patient_id] = summary
+
+def queue_event(payload):
+    """Announce a ready-made event payload when the current transaction commits"""
+    db.session.info.setdefault('queued_events', []).append(payload)
+
+def summary_event(summary):
+    """Compact delta matching a /api/doctor/dashboard patient row"""
+    return {
+        'type': 'patient_summary',
+        'patient_id': summary.patient_id,
+        'total_logs': summary.total_logs,
+        'last_log_date': summary.last_log_at.isoformat() if summary.last_log_at else None,
+        'latest_severity': summary.last_overall_severity,
+        'conditions': {
+            'rhinitis': bool(summary.has_rhinitis),
+            'vertigo': bool(summary.has_vertigo),
+            'tinnitus': bool(summary.has_tinnitus)
+        },
+        'data_version': summary.data_version
+    }
+
+@event.listens_for(db.session, 'before_commit')
+def _prepare_dashboard_events(session):
+    summaries = session.info.pop('dashboard_events', None) or {}
+    events = session.info.pop('queued_events', None) or []
+    if not (summaries or events) or not event_broker.wants_events:
+        return
+    if summaries:
+        # Flush first so SQL-expression updates (total_logs + n) are read back as numbers
+        session.flush()
+        events = [summary_event(summary) for summary in summaries.values()] + events
+    event_broker.send_in_transaction(session, events)
+    session.info['dashboard_events_ready'] = events
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_dashboard_events(session):
+    events = session.info.pop('dashboard_events_ready', None)
+    if events and not event_broker.transactional:
+        event_broker.publish(events)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_dashboard_events(session):
+    session.info.pop('dashboard_events', None)
+    session.info.pop('queued_events', None)
+    session.info.pop('dashboard_events_ready', None)
+    session.info.pop('wrote', None)
+
+# Sticky-after-write: once a user changes data, their reads skip the replicas for a while
+def stick_to_primary():
+    if replica_router.enabled and has_request_context():
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+
+@event.listens_for(db.session, 'after_flush')
+def _note_flush(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _note_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _mark_writer_sticky(session):
+    if session.info.pop('wrote', False):
+        stick_to_primary()
+
+def rollup_period_start(period, moment):
+    """First day of the day/week/month bucket containing ``moment``"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+def _severity_metrics(severity):
+    return {
+        'rhinitis': severity['rhinitis_avg'],
+        'vertigo': severity['vertigo_severity'],
+        'tinnitus': severity['tinnitus_avg'],
+        'overall': severity['overall_severity']
+    }
+
+def _fold_into_rollup(rollup, log, metrics):
+    rollup.log_count = (rollup.log_count or 0) + 1
+    if rollup.first_log_at is None or log.created_at < rollup.first_log_at:
+        rollup.first_log_at = log.created_at
+    if rollup.last_log_at is None or log.created_at > rollup.last_log_at:
+        rollup.last_log_at = log.created_at
+    for metric, value in metrics.items():
+        if value is None:
+            continue
+        setattr(rollup, f'{metric}_sum', (getattr(rollup, f'{metric}_sum') or 0) + value)
+        setattr(rollup, f'{metric}_count', (getattr(rollup, f'{metric}_count') or 0) + 1)
+        current_min = getattr(rollup, f'{metric}_min')
+        current_max = getattr(rollup, f'{metric}_max')
+        setattr(rollup, f'{metric}_min', value if current_min is None else min(current_min, value))
+        setattr(rollup, f'{metric}_max', value if current_max is None else max(current_max, value))
+
+def _locked_rollups(patient_id, keys):
+    day_starts = [start for period, start in keys if period == 'day']
+    week_starts = [start for period, start in keys if period == 'week']
+    existing = SymptomRollup.query.filter(
+        SymptomRollup.patient_id == patient_id,
+        or_(
+            and_(SymptomRollup.period == 'day', SymptomRollup.period_start.in_(day_starts)),
+            and_(SymptomRollup.period == 'week', SymptomRollup.period_start.in_(week_starts))
+        )
+    ).with_for_update().all()
+    return {(rollup.period, rollup.period_start): rollup for rollup in existing}
+
+def record_logs_in_rollups(patient_id, logs, conditions):
+    """Fold newly flushed SymptomLogs of one patient into their day and week rollups (no commit)"""
+    keys = {(period, rollup_period_start(period, log.created_at)) for log in logs for period in ('day', 'week')}
+    rollups = _locked_rollups(patient_id, keys)
+    missing = keys - rollups.keys()
+    for attempt in range(1, ROLLUP_INSERT_ATTEMPTS + 1):
+        if not missing:
+            break
+        # FOR UPDATE cannot lock rows that do not exist yet, so two first writes for the
+        # same day can race; the loser's savepoint rolls back and it retries with the
+        # winner's rows, which are committed (and lockable) by the time its INSERT fails
+        created = {key: SymptomRollup(patient_id=patient_id, period=key[0], period_start=key[1]) for key in missing}
+        try:
+            with db.session.begin_nested():
+                db.session.add_all(created.values())
+        except IntegrityError:
+            rollups = _locked_rollups(patient_id, keys)
+            if attempt == ROLLUP_INSERT_ATTEMPTS or not missing & rollups.keys():
+                raise  # Not the race: none of the conflicting rows exist, so retrying cannot help
+            missing = keys - rollups.keys()
+            continue
+        rollups.update(created)
+        missing = set()
+
+    for log in logs:
+        metrics = _severity_metrics(calculate_log_severity(log, conditions))
+        for period in ('day', 'week'):
+            _fold_into_rollup(rollups[(period, rollup_period_start(period, log.created_at))], log, metrics)
+
+def rebuild_patient_rollups(patient_id):
+    """Recompute a patient's rollups from their full history (no commit)"""
+    SymptomRollup.query.filter_by(patient_id=patient_id).delete(synchronize_session=False)
+    conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+    rollups = {}
+    for log in iter_patient_logs(patient_id, LOGS_STREAM_BATCH_SIZE):
+        metrics = _severity_metrics(calculate_log_severity(log, conditions))
+        for period in ('day', 'week'):
+            key = (period, rollup_period_start(period, log.created_at))
+            if key not in rollups:
+                rollups[key] = SymptomRollup(patient_id=patient_id, period=key[0], period_start=key[1])
+            _fold_into_rollup(rollups[key], log, metrics)
+    db.session.add_all(rollups.values())
+    return len(rollups)
+
+def rebuild_all_patient_rollups():
+    """Recompute the rollups of every patient on the current shard"""
+    patient_ids = [row.patient_id for row in db.session.query(Patient.patient_id).all()]
+    for patient_id in patient_ids:
+        rebuild_patient_rollups(patient_id)
+    db.session.commit()
+    return len(patient_ids)
+
+def _fold_into_baseline(baseline, metrics, in_order=True):
+    """Score one log against the running baseline, then update it in O(1).
+
+    Returns (score, metric) for the metric deviating most: either the log
+    itself or the EWMA drifting above the long-run mean (a building flare).
+    A log older than the newest one (``in_order`` false) is scored as a
+    spike only and left out of the EWMA, which follows the latest logs.
+    """
+    worst_score, worst_metric = 0.0, None
+    for metric, value in metrics.items():
+        if value is None:
+            continue
+        count = getattr(baseline, f'{metric}_count') or 0
+        mean = getattr(baseline, f'{metric}_mean') or 0.0
+        m2 = getattr(baseline, f'{metric}_m2') or 0.0
+
+        score = deviation_score(value, count, mean, m2, current_app.config['ANOMALY_MIN_LOGS']) or 0.0
+        if in_order:
+            ewma = ewma_update(getattr(baseline, f'{metric}_ewma'), value, current_app.config['ANOMALY_EWMA_ALPHA'])
+            drift = deviation_score(ewma, count, mean, m2, current_app.config['ANOMALY_MIN_LOGS'])
+            score = max(score, drift or 0.0)
+            setattr(baseline, f'{metric}_ewma', ewma)
+        if score > worst_score:
+            worst_score, worst_metric = score, metric
+
+        count, mean, m2 = welford_update(count, mean, m2, value)
+        setattr(baseline, f'{metric}_count', count)
+        setattr(baseline, f'{metric}_mean', mean)
+        setattr(baseline, f'{metric}_m2', m2)
+    return round(worst_score, 2), worst_metric
+
+def flag_decay_cutoff():
+    """Flags raised by logs older than this no longer hold a patient on the attention list"""
+    return datetime.utcnow() - timedelta(days=current_app.config['ANOMALY_FLAG_DECAY_DAYS'])
+
+def _raise_flag(baseline, log, score, metric):
+    """Record an outlier log on the baseline's sticky flag and return its SymptomLogFlag"""
+    if log.created_at >= flag_decay_cutoff():
+        active = baseline.flag_score and baseline.flagged_at and baseline.flagged_at >= flag_decay_cutoff()
+        if not active or score >= baseline.flag_score:
+            baseline.flag_score, baseline.flag_metric = score, metric
+        if not active or log.created_at > baseline.flagged_at:
+            baseline.flagged_at = log.created_at
+    return SymptomLogFlag(log_id=log.log_id, patient_id=baseline.patient_id, metric=metric, score=score)
+
+def _advance_baseline(baseline, log, score, metric):
+    """The log is the newest one: its score is the patient's current anomaly score"""
+    baseline.anomaly_score = score
+    baseline.anomaly_metric = metric
+    baseline.last_log_id = log.log_id
+    baseline.last_log_at = log.created_at
+
+def record_logs_in_baseline(patient_id, logs, conditions):
+    """Score newly flushed logs, flag outliers and advance the baseline (no commit).
+
+    Logs that sort before the newest log already folded in (a backdated
+    batch) are scored against the current statistics and added to them
+    without moving the baseline's newest log; the history is never re-read.
+    """
+    baseline = db.session.get(PatientBaseline, patient_id, with_for_update=True)
+    if baseline is None:
+        baseline = PatientBaseline(patient_id=patient_id, anomaly_score=0, flag_score=0)
+        db.session.add(baseline)
+
+    newest = (baseline.last_log_at, baseline.last_log_id) if baseline.last_log_at is not None else None
+    flags = []
+    threshold = current_app.config['ANOMALY_THRESHOLD']
+    for log in sorted(logs, key=log_key):
+        in_order = newest is None or log_key(log) > newest
+        score, metric = _fold_into_baseline(baseline, _severity_metrics(calculate_log_severity(log, conditions)), in_order)
+        if in_order:
+            _advance_baseline(baseline, log, score, metric)
+        if score >= threshold:
+            flags.append(_raise_flag(baseline, log, score, metric))
+    db.session.add_all(flags)
+    return flags
+
+def replay_patient_baseline(patient_id, baseline, conditions):
+    """Reset the running statistics and fold in the patient's whole history (no commit).
+
+    The sticky flag and its acknowledgement carry over.
+    """
+    for metric in ROLLUP_METRICS:
+        setattr(baseline, f'{metric}_count', 0)
+        setattr(baseline, f'{metric}_mean', 0.0)
+        setattr(baseline, f'{metric}_m2', 0.0)
+        setattr(baseline, f'{metric}_ewma', None)
+    baseline.anomaly_score, baseline.anomaly_metric = 0, None
+    baseline.last_log_id = baseline.last_log_at = None
+
+    for log in iter_patient_logs(patient_id, LOGS_STREAM_BATCH_SIZE):
+        score, metric = _fold_into_baseline(baseline, _severity_metrics(calculate_log_severity(log, conditions)))
+        _advance_baseline(baseline, log, score, metric)
+
+def rebuild_patient_baseline(patient_id):
+    """Replay a patient's history into a fresh baseline, e.g. after a condition change (no commit)"""
+    baseline = db.session.get(PatientBaseline, patient_id, with_for_update=True)
+    if baseline is None:
+        baseline = PatientBaseline(patient_id=patient_id, anomaly_score=0, flag_score=0)
+        db.session.add(baseline)
+    conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+    replay_patient_baseline(patient_id, baseline, conditions)
+    return baseline
+
+def rebuild_all_patient_baselines():
+    """Recompute the anomaly baseline of every patient on the current shard"""
+    patient_ids = [row.patient_id for row in db.session.query(Patient.patient_id).all()]
+    for patient_id in patient_ids:
+        rebuild_patient_baseline(patient_id)
+    db.session.commit()
+    return len(patient_ids)
+
+def merge_rollups(rollups, period):
+    """Combine day rollups into coarser buckets (e.g. months), keeping order"""
+    merged = OrderedDict()
+    for rollup in rollups:
+        key = rollup_period_start(period, rollup.period_start)
+        if key not in merged:
+            merged[key] = SymptomRollup(
+                patient_id=rollup.patient_id, period=period, period_start=key, log_count=0,
+                **{f'{metric}_{part}': 0 for metric in ROLLUP_METRICS for part in ('sum', 'count')}
+            )
+        target = merged[key]
+        target.log_count += rollup.log_count
+        target.first_log_at = rollup.first_log_at if target.first_log_at is None else min(target.first_log_at, rollup.first_log_at)
+        target.last_log_at = rollup.last_log_at if target.last_log_at is None else max(target.last_log_at, rollup.last_log_at)
+        for metric in ROLLUP_METRICS:
+            if not getattr(rollup, f'{metric}_count'):
+                continue
+            setattr(target, f'{metric}_sum', getattr(target, f'{metric}_sum') + getattr(rollup, f'{metric}_sum'))
+            setattr(target, f'{metric}_count', getattr(target, f'{metric}_count') + getattr(rollup, f'{metric}_count'))
+            for part, pick in (('min', min), ('max', max)):
+                current = getattr(target, f'{metric}_{part}')
+                value = getattr(rollup, f'{metric}_{part}')
+                setattr(target, f'{metric}_{part}', value if current is None else pick(current, value))
+    return list(merged.values())
+
+def serialize_rollup(rollup):
+    """Chart point for a rollup bucket, keeping the raw chart_data keys"""
+    stats = {}
+    for metric in ROLLUP_METRICS:
+        count = getattr(rollup, f'{metric}_count') or 0
+        stats[metric] = {
+            'mean': round(getattr(rollup, f'{metric}_sum') / count, 2) if count else None,
+            'min': getattr(rollup, f'{metric}_min'),
+            'max': getattr(rollup, f'{metric}_max'),
+            'count': count
+        }
+    return {
+        'date': rollup.period_start.isoformat(),
+        'timestamp': datetime.combine(rollup.period_start, datetime.min.time()).isoformat(),
+        'rhinitis_avg': stats['rhinitis']['mean'],
+        'vertigo_severity': stats['vertigo']['mean'],
+        'tinnitus_avg': stats['tinnitus']['mean'],
+        'overall_severity': stats['overall']['mean'] if stats['overall']['mean'] is not None else 0,
+        'log_count': rollup.log_count,
+        'stats': stats
+    }
+
+def rebuild_all_patient_summaries():
+    """Repair drift by recomputing the summary row of every patient on the current shard"""
+    patient_ids = [row.patient_id for row in db.session.query(Patient.patient_id).all()]
+    for patient_id in patient_ids:
+        rebuild_patient_summary(patient_id)
+    db.session.commit()
+    return len(patient_ids)
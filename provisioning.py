@@ -0,0 +1,198 @@
+"""Bulk patient provisioning (``flask import-patients`` and POST /api/doctor/patients/import).
+
+Rows come from CSV (with a header) or NDJSON. Each row carries a
+username, a password, an optional first and last name, and the initial
+conditions (has_rhinitis, has_vertigo, has_tinnitus). The import works
+in batches:
+
+- the batch's usernames are checked with one set-based query;
+- the passwords are hashed by the caller's hash_batch function: HTTP
+  imports use the app's shared, bounded password pool and the CLI a
+  dedicated pool of PROVISION_HASH_WORKERS processes;
+- patients, conditions and summary rows are written with batched
+  INSERTs and committed together.
+
+Every row ends up created, skipped or failed, and the report lists each
+skipped and failed row with its line number. Usernames that already
+exist are skipped rather than failed. Re-running the same file after an
+interruption therefore resumes after the last committed batch.
+"""
+import csv
+import json
+from collections import defaultdict
+from contextlib import nullcontext
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db, shard_router
+from models import Patient, PatientConditions, PatientShard, PatientSummary
+
+PROVISION_FORMATS = ['csv', 'ndjson']
+CONDITION_FIELDS = ['has_rhinitis', 'has_vertigo', 'has_tinnitus']
+NAME_FIELDS = ['username', 'first_name', 'last_name']
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+def read_records(stream, import_format):
+    """(line number, record, error) for every row of a CSV or NDJSON text stream"""
+    if import_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None, 'invalid JSON'
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'each line must be a JSON object'
+            continue
+        yield number, record, None
+
+
+def parse_flag(value):
+    if isinstance(value, bool):
+        return value
+    text = '' if value is None else str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f'{value!r} is not a yes/no value')
+
+
+def clean_record(record):
+    """(patient fields, conditions) of one input record; raises ValueError with a row-level message"""
+    patient = {field: str(record.get(field) or '').strip() or None for field in NAME_FIELDS}
+    patient['password'] = str(record.get('password') or '') or None
+    if not patient['username'] or not patient['password']:
+        raise ValueError('username and password are required')
+    for field in NAME_FIELDS:
+        if patient[field] and len(patient[field]) > 100:
+            raise ValueError(f'{field} is longer than 100 characters')
+    try:
+        conditions = {field: parse_flag(record.get(field)) for field in CONDITION_FIELDS}
+    except ValueError as e:
+        raise ValueError(f'conditions: {e}')
+    return patient, conditions
+
+
+def existing_usernames(usernames):
+    """Usernames already taken, and directory entries an interrupted import left without a patient"""
+    if not shard_router.enabled:
+        return {row.username for row in db.session.query(Patient.username).filter(Patient.username.in_(usernames))}, {}
+
+    entries = PatientShard.query.filter(PatientShard.username.in_(usernames)).all()
+    by_shard = defaultdict(list)
+    for entry in entries:
+        by_shard[entry.shard].append(entry.username)
+    taken = set()
+    for shard, names in by_shard.items():
+        with shard_router.using(shard):
+            taken.update(row.username for row in db.session.query(Patient.username).filter(Patient.username.in_(names)))
+    return taken, {entry.username: entry for entry in entries if entry.username not in taken}
+
+
+def insert_patients(rows, hashes, orphans):
+    """Add the batch's patients with their conditions and summary rows (no commit)"""
+    if shard_router.enabled:
+        entries = [orphans.get(patient['username']) or PatientShard(username=patient['username'], shard=0) for _, patient, _ in rows]
+        fresh = [entry for entry in entries if entry.patient_id is None]
+        db.session.add_all(fresh)
+        db.session.flush()  # One multi-row INSERT ... RETURNING allocates the ids
+        for entry in fresh:
+            entry.shard = shard_router.place(entry.patient_id)
+        db.session.flush()
+        placements = [(entry.patient_id, entry.shard) for entry in entries]
+    else:
+        placements = [(None, 0)] * len(rows)
+
+    by_shard = defaultdict(list)
+    for (patient_id, shard), (_, patient, conditions), password_hash in zip(placements, rows, hashes):
+        by_shard[shard].append((patient_id, patient, conditions, password_hash))
+    for shard, members in by_shard.items():
+        with shard_router.using(shard) if shard_router.enabled else nullcontext():
+            patients = [
+                Patient(patient_id=patient_id, password=password_hash, **{field: patient[field] for field in NAME_FIELDS})
+                for patient_id, patient, _, password_hash in members
+            ]
+            db.session.add_all(patients)
+            db.session.flush()
+            db.session.add_all([
+                PatientConditions(patient_id=record.patient_id, **conditions)
+                for record, (_, _, conditions, _) in zip(patients, members)
+            ])
+            # New patients have no logs; their summary row is what lists them on the dashboard
+            db.session.add_all([
+                PatientSummary(patient_id=record.patient_id, total_logs=0, data_version=1, **conditions)
+                for record, (_, _, conditions, _) in zip(patients, members)
+            ])
+            db.session.flush()
+
+
+def provision_batch(rows, report, hash_batch):
+    """Create one batch of validated (line, patient, conditions) rows and record the outcome"""
+    taken, orphans = existing_usernames([patient['username'] for _, patient, _ in rows])
+    for number, patient, _ in rows:
+        if patient['username'] in taken:
+            report['skipped'].append({'row': number, 'username': patient['username'], 'reason': 'username already exists'})
+    rows = [row for row in rows if row[1]['username'] not in taken]
+    if not rows:
+        return
+
+    hashes = hash_batch([patient['password'] for _, patient, _ in rows])
+    try:
+        insert_patients(rows, hashes, orphans)
+        db.session.commit()
+    except IntegrityError:
+        # Typically a username registered while the batch was hashed; a re-run skips it and resumes
+        db.session.rollback()
+        report['errors'] += [
+            {'row': number, 'username': patient['username'], 'error': 'batch rejected by the database; re-run the import to resume'}
+            for number, patient, _ in rows
+        ]
+        return
+    finally:
+        db.session.expunge_all()
+    report['created'] += len(rows)
+
+
+def provision_patients(records, hash_batch, batch_size=None, progress=None):
+    """Import (line, record, error) tuples from read_records(); returns the per-row report.
+
+    ``hash_batch`` turns a list of passwords into their hashes.
+    """
+    batch_size = batch_size or current_app.config['PROVISION_BATCH_SIZE']
+    report = {'rows': 0, 'created': 0, 'skipped': [], 'errors': []}
+    seen = set()
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return report
+        rows = []
+        for number, record, error in batch:
+            report['rows'] += 1
+            username = (record or {}).get('username')
+            try:
+                if error:
+                    raise ValueError(error)
+                patient, conditions = clean_record(record)
+                if patient['username'] in seen:
+                    raise ValueError('username appears earlier in this import')
+            except ValueError as e:
+                report['errors'].append({'row': number, 'username': username, 'error': str(e)})
+                continue
+            seen.add(patient['username'])
+            rows.append((number, patient, conditions))
+        if rows:
+            provision_batch(rows, report, hash_batch)
+        if progress:
+            progress(report)
@@ -0,0 +1,130 @@
+"""Moving patients between shards (``flask move-patient`` / ``flask rebalance-shards``).
+
+A move freezes the patient's writes in the directory, waits until every
+process has seen that (SHARD_DIRECTORY_TTL), copies the rows to the target
+shard in one transaction, points the directory at the target, waits once
+more for readers still using the old location, and finally deletes the
+source rows. Reads keep working throughout; writes get a 503 with
+Retry-After while the patient is frozen.
+
+Symptom log ids are only unique within a shard, so copied logs get new
+ids on the target and every reference to them (idempotency keys, flags,
+the baseline's last log) is rewritten. Archive segments get new ids too;
+the logs inside them keep their old ids, which only order a patient's
+logs within one timestamp. The summary's data version is bumped so cached
+responses and ETags that carry the old ids expire.
+"""
+import time
+
+from sqlalchemy import delete, func, insert, select
+
+from extensions import db, shard_router
+from models import PatientBaseline, PatientShard, PatientSummary, SHARDED_MODELS, SymptomLog, SymptomLogSegment
+
+MOVE_BATCH_SIZE = 1000
+
+
+def delete_patient_rows(connection, patient_id):
+    """Remove a patient's rows from one shard, children first"""
+    for model in reversed(SHARDED_MODELS):
+        table = model.__table__
+        connection.execute(delete(table).where(table.c.patient_id == patient_id))
+
+
+def copy_patient_rows(patient_id, source_engine, target_engine):
+    """Copy every sharded row of a patient; returns the number of rows copied"""
+    copied = 0
+    log_ids = {}
+    with source_engine.connect() as source, target_engine.begin() as target:
+        # Leftovers from an interrupted move would collide with the copy
+        delete_patient_rows(target, patient_id)
+        for model in SHARDED_MODELS:
+            table = model.__table__
+            statement = select(table).where(table.c.patient_id == patient_id)
+            if model is SymptomLog:
+                statement = statement.order_by(table.c.log_id)
+            result = source.execution_options(stream_results=True, yield_per=MOVE_BATCH_SIZE).execute(statement)
+            for partition in result.partitions():
+                rows = [dict(row._mapping) for row in partition]
+                if model is SymptomLog:
+                    old_ids = [row.pop('log_id') for row in rows]
+                    new_ids = target.execute(
+                        insert(table).returning(table.c.log_id, sort_by_parameter_order=True), rows
+                    ).scalars().all()
+                    log_ids.update(zip(old_ids, new_ids))
+                else:
+                    for row in rows:
+                        if model is SymptomLogSegment:
+                            row.pop('segment_id')
+                        if 'log_id' in row:
+                            row['log_id'] = log_ids[row['log_id']]
+                        if model is PatientBaseline and row['last_log_id'] is not None:
+                            row['last_log_id'] = log_ids.get(row['last_log_id'])
+                        if model is PatientSummary:
+                            row['data_version'] = (row['data_version'] or 0) + 1
+                    target.execute(insert(table), rows)
+                copied += len(rows)
+    return copied
+
+
+def move_patient(patient_id, target, wait=None):
+    """Move a patient to shard ``target``; returns the number of rows copied"""
+    wait = shard_router.directory_ttl if wait is None else wait
+    entry = db.session.get(PatientShard, patient_id)
+    if entry is None:
+        raise ValueError(f'Patient {patient_id} is not in the shard directory')
+    if not 0 <= target < len(shard_router.shards):
+        raise ValueError(f'Shard {target} does not exist')
+    source = entry.shard
+    if source == target:
+        return 0
+
+    entry.moving = True
+    db.session.commit()
+    time.sleep(wait)  # Every process now refuses writes for this patient
+    try:
+        copied = copy_patient_rows(patient_id, shard_router.shards[source].engine, shard_router.shards[target].engine)
+    except Exception:
+        entry.moving = False
+        db.session.commit()
+        raise
+
+    entry.shard = target
+    entry.moving = False
+    db.session.commit()
+    shard_router.forget(patient_id)
+    time.sleep(wait)  # Readers with the old location cached are done with the source
+    with shard_router.shards[source].engine.begin() as connection:
+        delete_patient_rows(connection, patient_id)
+    return copied
+
+
+def shard_patient_counts():
+    """Patients per shard according to the directory"""
+    counts = dict(db.session.query(PatientShard.shard, func.count(PatientShard.patient_id)).group_by(PatientShard.shard).all())
+    return [counts.get(shard.index, 0) for shard in shard_router.shards]
+
+
+def plan_rebalance(limit=None):
+    """(patient_id, source, target) moves that even out patient counts with as few moves as possible"""
+    counts = shard_patient_counts()
+    total, shards = sum(counts), len(counts)
+    wanted = [total // shards + (1 if index < total % shards else 0) for index in range(shards)]
+    # Fill the emptiest shards first
+    deficits = [index for index in sorted(range(shards), key=lambda index: counts[index]) if counts[index] < wanted[index]]
+    moves = []
+    for source in range(shards):
+        surplus = counts[source] - wanted[source]
+        if surplus <= 0:
+            continue
+        # Newest patients move first; they have the least history to copy
+        patient_ids = [row.patient_id for row in db.session.query(PatientShard.patient_id).filter(
+            PatientShard.shard == source
+        ).order_by(PatientShard.patient_id.desc()).limit(surplus).all()]
+        for patient_id in patient_ids:
+            target = deficits[0]
+            moves.append((patient_id, source, target))
+            counts[target] += 1
+            if counts[target] >= wanted[target]:
+                deficits.pop(0)
+    return moves[:limit] if limit else moves
@@ -0,0 +1,182 @@
+"""Routing of read-only requests to database read replicas.
+
+Views opt in with a decorator; ReplicaRouter then picks a healthy
+replica for the request and RoutingSession sends that request's reads
+to it. Flushes always go to the primary, and so do requests from a user
+who wrote recently (sticky-after-write), so nobody reads around their
+own change. A replica that cannot be reached, or that reports more
+replication lag than allowed, is skipped until its next health check.
+Health checks run on a background thread, never on the request path, and
+a request whose replica fails mid-query is answered from the primary.
+Patient tables on a separate shard (sharding.py) bypass replicas.
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+
+from sharding import shard_bind
+
+logger = logging.getLogger('symptom_tracker.replicas')
+
+# Seconds the replica is behind; 0 on a primary or a standby that has replayed everything it received
+POSTGRES_LAG_SQL = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that uses ``g.shard_engine`` for patient tables and reads from ``g.read_engine``"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = shard_bind(mapper, clause)
+            if engine is not None:
+                return engine
+        # Flushes and bulk INSERT/UPDATE/DELETE statements always go to the primary
+        if (bind is None and not self._flushing and not getattr(clause, 'is_dml', False)
+                and has_app_context()):
+            engine = g.get('read_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag_seconds = None
+        self.checked_at = None
+        self.error = None
+
+
+class ReplicaRouter:
+    """Chooses a replica engine per request, or None to stay on the primary"""
+
+    def __init__(self, urls=(), engine_options=None, max_lag_seconds=5, health_interval=5):
+        self.max_lag_seconds = max_lag_seconds
+        self.health_interval = health_interval
+        self.replicas = []
+        for index, url in enumerate(urls):
+            engine = create_engine(url, **(engine_options(url) if engine_options else {}))
+            replica = Replica(f'replica{index}', engine)
+            event.listen(engine, 'handle_error', self._on_error(replica))
+            self.replicas.append(replica)
+        self._next = 0
+        self._lock = threading.Lock()
+        self._monitor_pid = None
+        self.routed = 0
+        self.sticky = 0
+        self.fallbacks = 0
+        self.retried = 0
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def _on_error(self, replica):
+        def handle_error(context):
+            if has_app_context() and g.get('read_engine') is replica.engine:
+                g.replica_failed = True  # replica_reads answers the request from the primary
+            if context.is_disconnect or context.connection is None:
+                # Connection-level failure: stop routing here until the next health check passes
+                replica.healthy = False
+                replica.error = str(context.original_exception)
+                replica.checked_at = time.monotonic()
+        return handle_error
+
+    def _check(self, replica):
+        try:
+            with replica.engine.connect() as connection:
+                if connection.dialect.name == 'postgresql':
+                    lag = float(connection.execute(POSTGRES_LAG_SQL).scalar() or 0)
+                else:
+                    connection.execute(text('SELECT 1'))
+                    lag = 0.0  # No portable lag measure; reachable is good enough
+            replica.lag_seconds = round(lag, 3)
+            replica.healthy = lag <= self.max_lag_seconds
+            replica.error = None if replica.healthy else f'lag {lag:.1f}s'
+        except Exception as e:
+            replica.healthy = False
+            replica.lag_seconds = None
+            replica.error = str(e)
+            logger.warning('Replica %s failed its health check: %s', replica.name, e)
+        replica.checked_at = time.monotonic()
+
+    def check(self):
+        """Probe every replica now"""
+        for replica in self.replicas:
+            self._check(replica)
+
+    def _monitor(self, pid):
+        while self._monitor_pid == pid:
+            self.check()
+            time.sleep(max(self.health_interval, 0.5))
+
+    def _ensure_monitor(self):
+        """Start this process's health-check thread (threads do not survive a fork)"""
+        pid = os.getpid()
+        if self._monitor_pid == pid:
+            return
+        with self._lock:
+            if self._monitor_pid != pid:
+                self._monitor_pid = pid
+                threading.Thread(target=self._monitor, args=(pid,), name='replica-health', daemon=True).start()
+
+    def choose(self, sticky=False):
+        """Next healthy replica engine, round-robin; None means use the primary"""
+        if not self.replicas:
+            return None
+        self._ensure_monitor()
+        if sticky:
+            with self._lock:
+                self.sticky += 1
+            return None
+        # Start one further along each time, falling through to the next healthy replica
+        with self._lock:
+            start = self._next
+            self._next = (start + 1) % len(self.replicas)
+        candidates = self.replicas[start:] + self.replicas[:start]
+        for replica in candidates:
+            if replica.healthy:
+                with self._lock:
+                    self.routed += 1
+                return replica.engine
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+    def record_retry(self):
+        with self._lock:
+            self.retried += 1
+
+    def dispose(self, close=True):
+        self._monitor_pid = None  # The next choose() starts a health-check thread in this process
+        for replica in self.replicas:
+            replica.engine.dispose(close=close)
+
+    def describe(self):
+        return [{
+            'name': replica.name,
+            'healthy': replica.healthy,
+            'lag_seconds': replica.lag_seconds,
+            'error': replica.error
+        } for replica in self.replicas]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'replicas': len(self.replicas),
+                'healthy': sum(1 for replica in self.replicas if replica.healthy),
+                'routed': self.routed,
+                'sticky': self.sticky,
+                'fallbacks': self.fallbacks,
+                'retried_on_primary': self.retried
+            }
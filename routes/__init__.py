@@ -0,0 +1,7 @@
+"""HTTP routes and CLI commands, one blueprint per area of the API."""
+from routes import analytics, auth, dashboard, logs, patient, system
+
+
+def register_blueprints(app):
+    for module in (auth, patient, dashboard, analytics, logs, system):
+        app.register_blueprint(module.bp)
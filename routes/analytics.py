@@ -0,0 +1,468 @@
+"""Per-patient analytics, AI analysis jobs and cohort analytics for doctors."""
+import heapq
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import login_required
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from ai_jobs import AnalysisQueueFullError
+from archive import archived_logs, with_archived_logs
+from analysis import (SERIES_FIELDS, COHORT_PERCENTILES, build_severity_series, analyze_series,
+                      grouped_means, percentile_bands, percentile_rank)
+from extensions import analysis_backend, analysis_cache, analysis_jobs, cohort_cache, db, finished_job_cache, shard_router
+from models import AnalysisJob, Patient, PatientConditions, ROLLUP_METRICS, SymptomLog, SymptomRollup
+from projections import calculate_log_severity, merge_rollups, queue_event, rollup_period_start, serialize_rollup
+from routes.common import parse_date_arg, patient_data_version, patient_shard, replica_reads, versioned_response
+from serialization import parse_fields, to_columnar
+from users import get_current_user_type, get_patient
+
+bp = Blueprint('analytics', __name__)
+
+# SIMPLIFIED Patient Analytics (no relationship checks)
+ANALYTICS_BUCKETS = ['raw', 'day', 'week', 'month']
+CHART_FIELDS = ['date', 'timestamp', 'rhinitis_avg', 'vertigo_severity', 'tinnitus_avg', 'overall_severity']
+ROLLUP_CHART_FIELDS = CHART_FIELDS + ['log_count', 'stats']
+
+@bp.route('/api/doctor/patient/<int:patient_id>/analytics', methods=['GET'])
+@login_required
+@replica_reads
+@patient_shard
+@versioned_response(patient_data_version)
+def patient_analytics(patient_id):
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+        
+        patient = Patient.query.get(patient_id)
+        if not patient:
+            return jsonify({'message': 'Patient not found'}), 404
+            
+        bucket = request.args.get('bucket', 'raw')
+        if bucket not in ANALYTICS_BUCKETS:
+            return jsonify({'message': f"bucket must be one of {', '.join(ANALYTICS_BUCKETS)}"}), 400
+        try:
+            date_from = parse_date_arg(request.args.get('from'))
+            date_to = parse_date_arg(request.args.get('to'))
+        except ValueError:
+            return jsonify({'message': 'from/to must be ISO dates (YYYY-MM-DD)'}), 400
+        response_format = request.args.get('format', 'rows')
+        if response_format not in ('rows', 'columnar'):
+            return jsonify({'message': 'format must be one of rows, columnar'}), 400
+        try:
+            fields = parse_fields(request.args.get('fields'), CHART_FIELDS if bucket == 'raw' else ROLLUP_CHART_FIELDS)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+            
+        conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+        
+        if bucket == 'raw':
+            start = datetime.combine(date_from, datetime.min.time()) if date_from else None
+            end = datetime.combine(date_to + timedelta(days=1), datetime.min.time()) if date_to else None
+            query = SymptomLog.query.filter_by(patient_id=patient_id)
+            if start:
+                query = query.filter(SymptomLog.created_at >= start)
+            if end:
+                query = query.filter(SymptomLog.created_at < end)
+            logs = with_archived_logs(
+                query.order_by(SymptomLog.created_at.asc(), SymptomLog.log_id.asc()).all(), patient_id,
+                newer_than=(start, -1) if start else None, older_than=(end, -1) if end else None
+            )
+            
+            chart_data = []
+            for log in logs:
+                severity = calculate_log_severity(log, conditions)
+                chart_data.append({
+                    'date': log.created_at.strftime('%Y-%m-%d'),
+                    'timestamp': log.created_at.isoformat(),
+                    **severity
+                })
+            total_logs = len(logs)
+            first_log_at = logs[0].created_at if logs else None
+            last_log_at = logs[-1].created_at if logs else None
+        else:
+            # Months are assembled from day rollups; day and week are stored directly
+            stored_period = 'day' if bucket == 'month' else bucket
+            query = SymptomRollup.query.filter_by(patient_id=patient_id, period=stored_period)
+            if date_from:
+                query = query.filter(SymptomRollup.period_start >= rollup_period_start(stored_period, date_from))
+            if date_to:
+                query = query.filter(SymptomRollup.period_start <= date_to)
+            rollups = query.order_by(SymptomRollup.period_start.asc()).all()
+            if bucket == 'month':
+                rollups = merge_rollups(rollups, 'month')
+
+            chart_data = [serialize_rollup(rollup) for rollup in rollups]
+            total_logs = sum(rollup.log_count for rollup in rollups)
+            first_log_at = rollups[0].first_log_at if rollups else None
+            last_log_at = rollups[-1].last_log_at if rollups else None
+
+        if response_format == 'columnar':
+            chart_data = to_columnar(chart_data, fields or (CHART_FIELDS if bucket == 'raw' else ROLLUP_CHART_FIELDS))
+        elif fields:
+            chart_data = [{field: point[field] for field in fields} for point in chart_data]
+        
+        response_data = {
+            'patient': {
+                'id': patient.patient_id,
+                'name': f"{patient.first_name or ''} {patient.last_name or ''}".strip() or patient.username,
+                'username': patient.username,
+                'conditions': {
+                    'rhinitis': conditions.has_rhinitis if conditions else False,
+                    'vertigo': conditions.has_vertigo if conditions else False,
+                    'tinnitus': conditions.has_tinnitus if conditions else False
+                }
+            },
+            'chart_data': chart_data,
+            'bucket': bucket,
+            'total_logs': total_logs,
+            'date_range': {
+                'start': first_log_at.isoformat() if first_log_at else None,
+                'end': last_log_at.isoformat() if last_log_at else None
+            }
+        }
+        if response_format == 'columnar':
+            response_data['format'] = 'columnar'
+        return jsonify(response_data), 200
+        
+    except Exception as e:
+        return jsonify({'message': 'Analytics error', 'error': str(e)}), 500
+
+# Server-side AI Analysis, memoized per patient until a new log arrives
+def get_patient_analysis(patient_id, conditions):
+    """Analysis report for a patient, recomputed only when their latest log changes"""
+    latest_log_id = db.session.query(func.max(SymptomLog.log_id)).filter(
+        SymptomLog.patient_id == patient_id
+    ).scalar()
+    version = (latest_log_id, tuple(sorted(conditions.items())))
+
+    cached = analysis_cache.get(patient_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    columns = [getattr(SymptomLog, field) for field in SERIES_FIELDS]
+    rows = db.session.query(SymptomLog.created_at, SymptomLog.log_id, *columns).filter(
+        SymptomLog.patient_id == patient_id
+    ).order_by(SymptomLog.created_at.asc(), SymptomLog.log_id.asc()).all()
+    archived = [
+        (log.created_at, log.log_id, *[getattr(log, field) for field in SERIES_FIELDS])
+        for log in archived_logs(patient_id)
+    ]
+    if archived:
+        rows = heapq.merge(archived, rows, key=lambda row: (row[0], row[1]))
+    rows = [tuple(row[2:]) for row in rows]
+    analysis = analyze_series(build_severity_series(rows, conditions), conditions)
+
+    analysis_cache.set(patient_id, (version, analysis))
+    return analysis
+
+@bp.route('/api/doctor/patient/<int:patient_id>/analysis', methods=['GET'])
+@login_required
+@patient_shard
+def patient_analysis(patient_id):
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        patient = db.session.get(Patient, patient_id)
+        if not patient:
+            return jsonify({'message': 'Patient not found'}), 404
+
+        conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+        condition_flags = {
+            'rhinitis': conditions.has_rhinitis if conditions else False,
+            'vertigo': conditions.has_vertigo if conditions else False,
+            'tinnitus': conditions.has_tinnitus if conditions else False
+        }
+
+        return jsonify({
+            'patient': {
+                'id': patient.patient_id,
+                'name': f"{patient.first_name or ''} {patient.last_name or ''}".strip() or patient.username,
+                'username': patient.username,
+                'conditions': condition_flags
+            },
+            'analysis': get_patient_analysis(patient_id, condition_flags)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Analysis error', 'error': str(e)}), 500
+
+# Background AI narratives on top of the numeric analysis
+def serialize_analysis_job(job):
+    return {
+        'job_id': job.job_id,
+        'patient_id': job.patient_id,
+        'status': job.status,
+        'backend': job.backend,
+        'data_version': job.data_version,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error
+    }
+
+def analysis_job_context(patient_id):
+    """What the language model sees: condition flags and the cached numeric analysis"""
+    conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+    condition_flags = {
+        'rhinitis': conditions.has_rhinitis if conditions else False,
+        'vertigo': conditions.has_vertigo if conditions else False,
+        'tinnitus': conditions.has_tinnitus if conditions else False
+    }
+    analysis = dict(get_patient_analysis(patient_id, condition_flags))
+    analysis.pop('analysis_date', None)  # Keep the context deterministic for a given version
+    return {'conditions': condition_flags, 'analysis': analysis}
+
+def run_analysis_job(app, job_id, patient_id):
+    """Worker entry point: claim a queued job, call the backend and store the outcome"""
+    with app.app_context():
+        if shard_router.enabled:
+            location = shard_router.locate(patient_id)
+            if location is None:
+                return
+            shard_router.use(location.shard)
+        # The conditional update makes sure only one worker process runs a job
+        claimed = AnalysisJob.query.filter_by(job_id=job_id, status='queued').update(
+            {'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+        if not claimed:
+            return
+
+        job = db.session.get(AnalysisJob, job_id)
+        try:
+            result = analysis_backend.analyze(analysis_job_context(job.patient_id))
+            job.status = 'succeeded'
+            job.result = json.dumps(result)
+        except Exception as e:
+            db.session.rollback()
+            print(f"AI analysis job {job_id} failed: {str(e)}")
+            job = db.session.get(AnalysisJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        queue_event({'type': 'analysis_job', 'job_id': job.job_id, 'patient_id': job.patient_id, 'status': job.status})
+        db.session.commit()
+
+def submit_analysis_job(patient_id):
+    """Find or create the job for the patient's current data version and make sure it runs"""
+    version = patient_data_version(patient_id)
+    key = {'patient_id': patient_id, 'data_version': version, 'backend': analysis_backend.name}
+    job = AnalysisJob.query.filter_by(**key).first()
+    if job is None:
+        job = AnalysisJob(job_id=uuid.uuid4().hex, status='queued', **key)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created the same job first
+            db.session.rollback()
+            job = AnalysisJob.query.filter_by(**key).first()
+    else:
+        stale_before = datetime.utcnow() - timedelta(seconds=2 * current_app.config['AI_ANALYSIS_TIMEOUT'])
+        if job.status == 'failed' or (job.status == 'running' and job.started_at and job.started_at < stale_before):
+            job.status = 'queued'
+            job.error = None
+            db.session.commit()
+
+    if job.status == 'queued':
+        analysis_jobs.submit(job.job_id, run_analysis_job, current_app._get_current_object(), job.job_id, patient_id)
+        db.session.refresh(job)
+    return job
+
+@bp.route('/api/doctor/patient/<int:patient_id>/analysis/jobs', methods=['POST'])
+@login_required
+@patient_shard
+def create_analysis_job(patient_id):
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        if not db.session.get(Patient, patient_id):
+            return jsonify({'message': 'Patient not found'}), 404
+
+        job = submit_analysis_job(patient_id)
+        status_code = 200 if job.status == 'succeeded' else 202
+        return jsonify(serialize_analysis_job(job)), status_code, {
+            'Location': f'/api/doctor/analysis/jobs/{job.job_id}'
+        }
+
+    except AnalysisQueueFullError:
+        db.session.rollback()
+        return jsonify({'message': 'Analysis queue is full, please retry'}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Analysis job error', 'error': str(e)}), 500
+
+def find_analysis_job(job_id):
+    job = db.session.get(AnalysisJob, job_id)
+    return serialize_analysis_job(job) if job else None
+
+@bp.route('/api/doctor/analysis/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_analysis_job(job_id):
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        job_data = finished_job_cache.get(job_id)
+        if job_data is None:
+            # Jobs live on their patient's shard; ask every shard
+            found = [data for data in shard_router.gather(find_analysis_job, job_id) if data is not None]
+            if not found:
+                return jsonify({'message': 'Job not found'}), 404
+            job_data = found[0]
+            if job_data['status'] == 'succeeded':
+                finished_job_cache.set(job_id, job_data)
+        return jsonify(job_data), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Analysis job error', 'error': str(e)}), 500
+
+# Cohort analytics across all patients, refreshed on an interval
+COHORT_ANALYTICS_BUCKETS = ['day', 'week']
+def cohort_prevalence_counts():
+    """(patients, rhinitis, vertigo, tinnitus, none) counts in one grouped query"""
+    flags = [PatientConditions.has_rhinitis, PatientConditions.has_vertigo, PatientConditions.has_tinnitus]
+    return tuple(db.session.query(
+        func.count(Patient.patient_id),
+        *[func.coalesce(func.sum(case((flag.is_(True), 1), else_=0)), 0) for flag in flags],
+        func.coalesce(func.sum(case((or_(*[flag.is_(True) for flag in flags]), 0), else_=1)), 0)
+    ).outerjoin(PatientConditions, PatientConditions.patient_id == Patient.patient_id).one())
+
+def cohort_prevalence(row):
+    """Condition prevalence from (summed) cohort_prevalence_counts()"""
+    total = row[0]
+    counts = dict(zip(['rhinitis', 'vertigo', 'tinnitus', 'none'], row[1:]))
+    return {
+        'total_patients': total,
+        'conditions': {
+            name: {'patients': int(count), 'percent': round(count / total * 100, 1) if total else 0.0}
+            for name, count in counts.items()
+        }
+    }
+
+def cohort_shard_data(bucket, date_from=None, date_to=None):
+    """One shard's (period, patient) rollup rows and prevalence counts"""
+    columns = [SymptomRollup.period_start, SymptomRollup.patient_id]
+    for metric in ROLLUP_METRICS:
+        columns += [getattr(SymptomRollup, f'{metric}_sum'), getattr(SymptomRollup, f'{metric}_count')]
+    query = db.session.query(*columns).filter(SymptomRollup.period == bucket)
+    if date_from:
+        query = query.filter(SymptomRollup.period_start >= rollup_period_start(bucket, date_from))
+    if date_to:
+        query = query.filter(SymptomRollup.period_start <= date_to)
+    return [tuple(row) for row in query.all()], cohort_prevalence_counts()
+
+def compute_cohort_analytics(bucket, date_from=None, date_to=None):
+    """Percentile bands and per-patient means from the stored rollups.
+
+    One query per shard pulls the (period, patient) rollup rows as column
+    arrays; everything else is vectorized NumPy, so the cost does not grow
+    with the number of raw logs.
+    """
+    shards = shard_router.gather(cohort_shard_data, bucket, date_from, date_to)
+    rows = [row for shard_rows, _ in shards for row in shard_rows]
+    prevalence = [sum(column) for column in zip(*[counts for _, counts in shards])]
+
+    periods = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    patient_ids = np.array([row[1] for row in rows], dtype=np.int64)
+    values = np.array([row[2:] for row in rows], dtype=float).reshape(len(rows), 2 * len(ROLLUP_METRICS))
+
+    percentiles, patient_means = {}, {}
+    for index, metric in enumerate(ROLLUP_METRICS):
+        sums = np.nan_to_num(values[:, 2 * index])
+        counts = np.nan_to_num(values[:, 2 * index + 1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+        percentiles[metric] = [
+            {
+                'period_start': str(period),
+                'patients': patients,
+                **{f'p{p}': round(float(value), 2) for p, value in zip(COHORT_PERCENTILES, bands)}
+            }
+            for period, patients, bands in percentile_bands(periods, means)
+        ]
+        ids, window_means = grouped_means(patient_ids, sums, counts)
+        order = np.argsort(window_means)
+        patient_means[metric] = (ids, window_means, window_means[order])
+
+    return {
+        'computed_at': datetime.utcnow().isoformat(),
+        'prevalence': cohort_prevalence(prevalence),
+        'percentiles': percentiles,
+        'patient_means': patient_means
+    }
+
+def get_cohort_analytics(bucket, date_from=None, date_to=None):
+    key = (bucket, date_from, date_to)
+    cohort = cohort_cache.get(key)
+    if cohort is None:
+        cohort = compute_cohort_analytics(bucket, date_from, date_to)
+        cohort_cache.set(key, cohort)
+    return cohort
+
+def cohort_patient_rank(cohort, patient_id):
+    """Where a patient's mean severity over the window sits within the cohort"""
+    ranks = {}
+    for metric, (ids, means, sorted_means) in cohort['patient_means'].items():
+        position = np.searchsorted(ids, patient_id)
+        if position >= len(ids) or ids[position] != patient_id:
+            ranks[metric] = None
+            continue
+        ranks[metric] = {
+            'mean': round(float(means[position]), 2),
+            'percentile_rank': round(percentile_rank(sorted_means, means[position]), 1),
+            'cohort_median': round(float(np.median(sorted_means)), 2),
+            'cohort_size': int(len(sorted_means))
+        }
+    return ranks
+
+@bp.route('/api/doctor/cohort/analytics', methods=['GET'])
+@login_required
+@replica_reads
+def cohort_analytics():
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        bucket = request.args.get('bucket', 'week')
+        if bucket not in COHORT_ANALYTICS_BUCKETS:
+            return jsonify({'message': f"bucket must be one of {', '.join(COHORT_ANALYTICS_BUCKETS)}"}), 400
+        try:
+            date_from = parse_date_arg(request.args.get('from'))
+            date_to = parse_date_arg(request.args.get('to'))
+        except ValueError:
+            return jsonify({'message': 'from/to must be ISO dates (YYYY-MM-DD)'}), 400
+        patient_id = request.args.get('patient_id', type=int)
+        if patient_id is not None and not get_patient(patient_id):
+            return jsonify({'message': 'Patient not found'}), 404
+
+        cohort = get_cohort_analytics(bucket, date_from, date_to)
+        response_data = {
+            'bucket': bucket,
+            'date_range': {
+                'start': date_from.isoformat() if date_from else None,
+                'end': date_to.isoformat() if date_to else None
+            },
+            'computed_at': cohort['computed_at'],
+            'refresh_interval': current_app.config['COHORT_ANALYTICS_REFRESH'],
+            'prevalence': cohort['prevalence'],
+            'percentiles': cohort['percentiles']
+        }
+        if patient_id is not None:
+            response_data['patient_rank'] = {
+                'patient_id': patient_id,
+                'metrics': cohort_patient_rank(cohort, patient_id)
+            }
+        return jsonify(response_data), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Cohort analytics error', 'error': str(e)}), 500
@@ -0,0 +1,132 @@
+"""Decorators and helpers shared by the doctor read endpoints."""
+import hashlib
+import time
+from datetime import date, datetime
+from functools import wraps
+
+from flask import Response, current_app, g, jsonify, make_response, request, session
+from sqlalchemy import func
+
+from extensions import db, replica_router, response_cache, shard_router
+from models import Patient, PatientSummary
+from users import get_current_patient_id, get_current_user_type
+
+def replica_reads(view):
+    """Run a read-only view against a read replica, unless the user wrote recently.
+
+    If the replica fails while the view runs (views usually turn database
+    errors into a 500 themselves), the view runs again on the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not replica_router.enabled:
+            return view(*args, **kwargs)
+        g.read_engine = replica_router.choose(sticky=session.get('primary_until', 0) > time.time())
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            if not g.get('replica_failed'):
+                raise
+        if not g.pop('replica_failed', False):
+            return response
+        db.session.rollback()
+        g.read_engine = None
+        replica_router.record_retry()
+        return view(*args, **kwargs)
+    return wrapper
+
+def patient_shard(view):
+    """Route a patient-scoped view to the patient's shard.
+
+    Doctor views name the patient in the URL (``patient_id``); patient
+    views use the logged-in patient. Writes are refused with a 503 while
+    the patient is being moved to another shard.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if shard_router.enabled:
+            if 'patient_id' in kwargs:
+                patient_id = kwargs['patient_id'] if get_current_user_type() == 'doctor' else None
+            else:
+                patient_id = get_current_patient_id()
+            if patient_id is not None:
+                location = shard_router.locate(patient_id)
+                if location is None:
+                    return jsonify({'message': 'Patient not found'}), 404
+                if location.moving and request.method != 'GET':
+                    return jsonify({'message': 'Patient data is being moved, please retry'}), 503, {'Retry-After': '5'}
+                shard_router.use(location.shard)
+        return view(*args, **kwargs)
+    return wrapper
+
+# Conditional GET support for doctor read endpoints
+def shard_dashboard_version():
+    return tuple(db.session.query(
+        db.session.query(func.count(Patient.patient_id)).scalar_subquery(),
+        db.session.query(func.max(Patient.updated_at)).scalar_subquery(),
+        db.session.query(func.coalesce(func.sum(PatientSummary.data_version), 0)).scalar_subquery()
+    ).one())
+
+def dashboard_data_version():
+    """Changes whenever any patient is added/edited or logs/conditions change"""
+    rows = shard_router.gather(shard_dashboard_version)
+    updated = [row[1] for row in rows if row[1]]
+    latest = max(updated) if updated else None
+    return f"{sum(row[0] for row in rows)}.{latest.timestamp() if latest else 0}.{sum(row[2] for row in rows)}"
+
+def patient_data_version(patient_id):
+    """Changes whenever the patient's profile, logs or conditions change; None if unknown"""
+    row = db.session.query(Patient.updated_at, PatientSummary.data_version).outerjoin(
+        PatientSummary, PatientSummary.patient_id == Patient.patient_id
+    ).filter(Patient.patient_id == patient_id).first()
+    if row is None:
+        return None
+    return f"{row[0].timestamp() if row[0] else 0}.{row[1] or 0}"
+
+def versioned_response(version_func):
+    """Serve ETag/304 and cached bodies for a doctor GET endpoint.
+
+    ``version_func`` receives the view's URL arguments and returns a data
+    version string (or None to fall through to the view, e.g. for 404s).
+    Bodies are cached per (path + query string, version), so an unchanged
+    patient costs one version lookup and no re-serialization.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if get_current_user_type() != 'doctor' or request.args.get('format') == 'ndjson':
+                return view(*args, **kwargs)
+
+            version = version_func(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            cache_key = (request.full_path, version)
+            etag = hashlib.sha1(f"{cache_key[0]}|{version}".encode()).hexdigest()[:32]
+            # Weak validators: the same version may be served gzip, brotli or identity encoded
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                body = response_cache.get(cache_key)
+                if body is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    if len(body) <= current_app.config['RESPONSE_CACHE_MAX_BODY']:
+                        response_cache.set(cache_key, body)
+                else:
+                    response = Response(body, mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def parse_date_arg(value):
+    """Parse an optional YYYY-MM-DD (or full ISO timestamp) query parameter"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).date() if 'T' in value else date.fromisoformat(value)
+
@@ -0,0 +1,332 @@
+"""Doctor dashboard, needs-attention list and live dashboard events."""
+import base64
+import json
+import queue
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_login import login_required
+from sqlalchemy import and_, case, or_, tuple_
+
+from extensions import db, event_broker, shard_router
+from models import Patient, PatientBaseline, PatientSummary, patient_search_text
+from projections import flag_decay_cutoff
+from routes.common import dashboard_data_version, parse_date_arg, patient_shard, replica_reads, versioned_response
+from users import get_current_user_type
+
+bp = Blueprint('dashboard', __name__)
+
+# Dashboard filters, sorts and keyset pages - all served by patient_summary indexes
+MAX_DASHBOARD_PAGE_SIZE = 500
+DASHBOARD_SORTS = {
+    'patient_id': None,
+    'total_logs': PatientSummary.total_logs,
+    'last_log_date': PatientSummary.last_log_at,
+    'latest_severity': PatientSummary.last_overall_severity
+}
+NULLABLE_DASHBOARD_SORTS = {'last_log_date', 'latest_severity'}  # NULL until the first log
+DASHBOARD_CONDITIONS = {
+    'rhinitis': PatientSummary.has_rhinitis,
+    'vertigo': PatientSummary.has_vertigo,
+    'tinnitus': PatientSummary.has_tinnitus
+}
+
+def parse_dashboard_args(args):
+    """Validated dashboard query parameters; raises ValueError with a user-facing message"""
+    sort = args.get('sort', 'patient_id')
+    if sort not in DASHBOARD_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(DASHBOARD_SORTS)}")
+    order = args.get('order', 'asc' if sort == 'patient_id' else 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    limit = args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be a positive integer')
+
+    conditions = [name.strip() for name in args.get('conditions', '').split(',') if name.strip()]
+    if any(name not in DASHBOARD_CONDITIONS for name in conditions):
+        raise ValueError(f"conditions must be drawn from {', '.join(DASHBOARD_CONDITIONS)}")
+    try:
+        last_log_from = parse_date_arg(args.get('last_log_from'))
+        last_log_to = parse_date_arg(args.get('last_log_to'))
+    except ValueError:
+        raise ValueError('last_log_from/last_log_to must be ISO dates (YYYY-MM-DD)')
+    try:
+        min_severity = float(args['min_severity']) if args.get('min_severity') else None
+    except ValueError:
+        raise ValueError('min_severity must be a number')
+
+    return {
+        'q': args.get('q', '').strip().lower(),
+        'conditions': conditions,
+        'last_log_from': last_log_from,
+        'last_log_to': last_log_to,
+        'min_severity': min_severity,
+        'sort': sort,
+        'order': order,
+        'limit': min(limit, MAX_DASHBOARD_PAGE_SIZE) if limit else None,
+        'after': decode_dashboard_cursor(args['after']) if args.get('after') else None
+    }
+
+def encode_dashboard_cursor(sort, patient, summary):
+    """Opaque keyset cursor: [segment, sort value, patient_id], segment 1 being the NULL tail"""
+    if sort == 'patient_id':
+        value = None
+    else:
+        value = getattr(summary, DASHBOARD_SORTS[sort].key)
+        value = value.isoformat() if isinstance(value, datetime) else value
+    raw = json.dumps([0 if value is not None or sort == 'patient_id' else 1, value, patient.patient_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_dashboard_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        segment, value, patient_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(segment), value, int(patient_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def dashboard_base_query(filters):
+    query = db.session.query(Patient, PatientSummary).join(
+        PatientSummary, PatientSummary.patient_id == Patient.patient_id
+    )
+    for name in filters['conditions']:
+        query = query.filter(DASHBOARD_CONDITIONS[name].is_(True))
+    if filters['q']:
+        term = filters['q'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(patient_search_text(
+            Patient.first_name, Patient.last_name, Patient.username
+        ).like(f'%{term}%', escape='\\'))
+    if filters['last_log_from']:
+        query = query.filter(PatientSummary.last_log_at >= datetime.combine(filters['last_log_from'], datetime.min.time()))
+    if filters['last_log_to']:
+        query = query.filter(PatientSummary.last_log_at < datetime.combine(filters['last_log_to'] + timedelta(days=1), datetime.min.time()))
+    if filters['min_severity'] is not None:
+        query = query.filter(PatientSummary.last_overall_severity >= filters['min_severity'])
+    return query
+
+def dashboard_rows(filters):
+    """(rows, has_more) for one page, or every matching row when no limit is given.
+
+    Nullable sorts are read in two keyset segments - rows with a value,
+    then the patients without logs by id - so each segment is a plain
+    range scan on its (column, patient_id) index on every database.
+    """
+    sort, descending, limit = filters['sort'], filters['order'] == 'desc', filters['limit']
+    after = filters['after']
+    column = DASHBOARD_SORTS[sort]
+
+    def ordered(query, keys):
+        return query.order_by(*[key.desc() if descending else key.asc() for key in keys])
+
+    def past(keys, values):
+        return tuple_(*keys) < tuple_(*values) if descending else tuple_(*keys) > tuple_(*values)
+
+    base = dashboard_base_query(filters)
+    wanted = limit + 1 if limit else None
+    rows = []
+
+    if column is None:
+        query = base.filter(past([Patient.patient_id], [after[2]])) if after else base
+        query = ordered(query, [Patient.patient_id])
+        rows = (query.limit(wanted) if wanted else query).all()
+    else:
+        if after is None or after[0] == 0:
+            query = base.filter(column.isnot(None))
+            if after:
+                value = datetime.fromisoformat(after[1]) if sort == 'last_log_date' else after[1]
+                query = query.filter(past([column, Patient.patient_id], [value, after[2]]))
+            query = ordered(query, [column, Patient.patient_id])
+            rows = (query.limit(wanted) if wanted else query).all()
+        if sort in NULLABLE_DASHBOARD_SORTS and (wanted is None or len(rows) < wanted):
+            query = base.filter(column.is_(None))
+            if after and after[0] == 1:
+                query = query.filter(past([Patient.patient_id], [after[2]]))
+            query = ordered(query, [Patient.patient_id])
+            rows += (query.limit(wanted - len(rows)) if wanted else query).all()
+
+    has_more = bool(limit) and len(rows) > limit
+    return rows[:limit] if limit else rows, has_more
+
+def dashboard_shard_page(filters):
+    """One shard's (rows, has_more, matching patients) for the requested page"""
+    rows, has_more = dashboard_rows(filters)
+    total = dashboard_base_query(filters).order_by(None).count() if filters['limit'] else len(rows)
+    return rows, has_more, total
+
+def merge_dashboard_pages(filters, pages):
+    """Interleave per-shard pages in dashboard order and cut the combined page.
+
+    Each shard returned its first ``limit`` rows past the cursor, so the
+    combined first ``limit`` are among them; there are more whenever any
+    shard had more or the union is longer than a page.
+    """
+    if len(pages) == 1:
+        return pages[0]
+    sort, descending, limit = filters['sort'], filters['order'] == 'desc', filters['limit']
+    rows = sorted((row for shard_rows, _, _ in pages for row in shard_rows),
+                  key=lambda row: row[0].patient_id, reverse=descending)
+    if DASHBOARD_SORTS[sort] is not None:
+        key = DASHBOARD_SORTS[sort].key
+        # Stable sort keeps patient_id order among ties; patients without a value come last
+        rows = sorted((row for row in rows if getattr(row[1], key) is not None),
+                      key=lambda row: getattr(row[1], key), reverse=descending) + \
+            [row for row in rows if getattr(row[1], key) is None]
+    has_more = any(more for _, more, _ in pages) or (bool(limit) and len(rows) > limit)
+    return rows[:limit] if limit else rows, has_more, sum(total for _, _, total in pages)
+
+# SIMPLIFIED Doctor Dashboard - Shows ALL patients (no relationships)
+@bp.route('/api/doctor/dashboard', methods=['GET'])
+@login_required
+@replica_reads
+@versioned_response(dashboard_data_version)
+def doctor_dashboard():
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        try:
+            filters = parse_dashboard_args(request.args)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        # Patients (single doctor sees all) with their summary, filtered and ordered in SQL on every shard
+        rows, has_more, total = merge_dashboard_pages(filters, shard_router.gather(dashboard_shard_page, filters))
+        
+        patients_data = []
+        for patient, summary in rows:
+            patients_data.append({
+                'patient_id': patient.patient_id,
+                'name': f"{patient.first_name or ''} {patient.last_name or ''}".strip() or patient.username,
+                'username': patient.username,
+                'total_logs': summary.total_logs,
+                'last_log_date': summary.last_log_at.isoformat() if summary.last_log_at else None,
+                'latest_severity': summary.last_overall_severity,
+                'conditions': {
+                    'rhinitis': summary.has_rhinitis,
+                    'vertigo': summary.has_vertigo,
+                    'tinnitus': summary.has_tinnitus
+                },
+                'assigned_date': patient.created_at.isoformat()  # Use patient creation date
+            })
+        
+        response_data = {
+            'patients': patients_data,
+            'total_patients': len(patients_data)
+        }
+        if filters['limit']:
+            response_data['total_patients'] = total
+            response_data['page'] = {
+                'limit': filters['limit'],
+                'has_more': has_more,
+                'next_cursor': encode_dashboard_cursor(filters['sort'], *rows[-1]) if has_more else None
+            }
+        return jsonify(response_data), 200
+        
+    except Exception as e:
+        return jsonify({'message': 'Dashboard error', 'error': str(e)}), 500
+
+# Needs-attention list, read straight from the baseline state table. A patient stays
+# listed while their flag is raised (until acknowledged or decayed) or their latest log
+# deviates by min_score, unless a doctor acknowledged the patient after that log
+MAX_ATTENTION_LIMIT = 100
+
+def attention_rows(min_score, limit, flagged_since):
+    flag_raised = and_(PatientBaseline.flag_score >= min_score, PatientBaseline.flagged_at >= flagged_since)
+    latest_deviates = and_(PatientBaseline.anomaly_score >= min_score, or_(
+        PatientBaseline.acknowledged_at.is_(None), PatientBaseline.last_log_at > PatientBaseline.acknowledged_at
+    ))
+    flag_leads = and_(flag_raised, PatientBaseline.flag_score >= PatientBaseline.anomaly_score)
+    score = case((flag_leads, PatientBaseline.flag_score), else_=PatientBaseline.anomaly_score).label('score')
+    metric = case((flag_leads, PatientBaseline.flag_metric), else_=PatientBaseline.anomaly_metric).label('metric')
+    return db.session.query(PatientBaseline, Patient, score, metric).join(
+        Patient, Patient.patient_id == PatientBaseline.patient_id
+    ).filter(or_(flag_raised, latest_deviates)).order_by(
+        score.desc(), PatientBaseline.patient_id
+    ).limit(limit).all()
+
+@bp.route('/api/doctor/attention', methods=['GET'])
+@login_required
+@replica_reads
+def doctor_attention():
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        limit = min(request.args.get('limit', 20, type=int), MAX_ATTENTION_LIMIT)
+        min_score = request.args.get('min_score', current_app.config['ANOMALY_THRESHOLD'], type=float)
+        shards = shard_router.gather(attention_rows, min_score, limit, flag_decay_cutoff())
+        rows = [row for shard_rows in shards for row in shard_rows]
+        if shard_router.enabled:
+            rows = sorted(rows, key=lambda row: (-row.score, row[0].patient_id))[:limit]
+
+        return jsonify({
+            'patients': [{
+                'patient_id': patient.patient_id,
+                'name': f"{patient.first_name or ''} {patient.last_name or ''}".strip() or patient.username,
+                'username': patient.username,
+                'anomaly_score': score,
+                'metric': metric,
+                'latest_score': baseline.anomaly_score,
+                'last_log_id': baseline.last_log_id,
+                'flagged_at': baseline.flagged_at.isoformat() if baseline.flagged_at else None
+            } for baseline, patient, score, metric in rows],
+            'threshold': min_score
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Attention list error', 'error': str(e)}), 500
+
+@bp.route('/api/doctor/patient/<int:patient_id>/attention/acknowledge', methods=['POST'])
+@login_required
+@patient_shard
+def acknowledge_attention(patient_id):
+    """Clear a patient's raised flag; the next outlier raises it again"""
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        baseline = db.session.get(PatientBaseline, patient_id, with_for_update=True)
+        if baseline is None:
+            return jsonify({'message': 'Patient not found'}), 404
+        baseline.flag_score = 0
+        baseline.flag_metric = None
+        baseline.acknowledged_at = datetime.utcnow()
+        db.session.commit()
+        return jsonify({'message': 'Acknowledged', 'acknowledged_at': baseline.acknowledged_at.isoformat()}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Acknowledge error', 'error': str(e)}), 500
+
+# Live dashboard deltas over Server-Sent Events
+@bp.route('/api/doctor/events', methods=['GET'])
+@login_required
+def doctor_events():
+    if get_current_user_type() != 'doctor':
+        return jsonify({'message': 'Access denied'}), 403
+
+    broker = event_broker._get_current_object()  # The stream outlives the app context
+    subscriber = broker.subscribe()
+    keepalive = current_app.config['EVENTS_KEEPALIVE_SECONDS']
+    # The stream can stay open for hours; do not pin a pooled connection to it
+    db.session.remove()
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    payload = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    # Comment lines keep proxies from timing out and reveal closed clients
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
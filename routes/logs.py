@@ -0,0 +1,368 @@
+"""Doctor access to raw symptom logs: paged reads and bulk research exports."""
+import base64
+import heapq
+import itertools
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from flask_login import login_required
+from sqlalchemy import tuple_
+
+from archive import decode_segment, iter_archived_logs, log_key, with_archived_logs
+from export import EXPORT_FORMATS, encode_rows, gzip_chunks
+from extensions import db, shard_router
+from models import LOG_FIELDS, Patient, PatientConditions, PatientSummary, SymptomLog, SymptomLogSegment
+from projections import LOGS_STREAM_BATCH_SIZE
+from routes.common import parse_date_arg, patient_data_version, patient_shard, replica_reads, versioned_response
+from serialization import parse_fields
+from users import get_current_user_type
+
+bp = Blueprint('logs', __name__, cli_group=None)
+
+# SIMPLIFIED Patient Logs
+MAX_LOGS_PAGE_SIZE = 500
+
+LOG_RESPONSE_FIELDS = ['log_id', 'log_timestamp'] + LOG_FIELDS
+RESPONSE_FORMATS = ['rows', 'columnar', 'ndjson']
+
+def serialize_log(log, fields=LOG_RESPONSE_FIELDS):
+    """Row-oriented JSON shape of a SymptomLog used by the logs endpoints"""
+    log_data = {}
+    for field in fields:
+        value = getattr(log, field)
+        log_data[field] = value.isoformat() if field == 'log_timestamp' else value
+    return log_data
+
+def serialize_logs_columnar(logs, fields=LOG_RESPONSE_FIELDS):
+    """format=columnar shape: one array per field, in log order"""
+    columns = {}
+    for field in fields:
+        if field == 'log_timestamp':
+            columns[field] = [log.log_timestamp.isoformat() for log in logs]
+        else:
+            columns[field] = [getattr(log, field) for log in logs]
+    return columns
+
+def encode_log_cursor(log):
+    """Opaque keyset cursor for a log's (created_at, log_id) position"""
+    raw = f"{log.created_at.isoformat()}|{log.log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_log_cursor(cursor):
+    """Inverse of encode_log_cursor; raises ValueError on malformed cursors"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, log_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(log_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def patient_logs_query(patient_id, after=None, before=None):
+    """Newest-first log query, optionally bounded by keyset cursors.
+
+    ``after`` selects logs older than the cursor position (the next page),
+    ``before`` selects logs newer than it (the previous page).
+    """
+    query = SymptomLog.query.filter(SymptomLog.patient_id == patient_id)
+    if after:
+        created_at, log_id = decode_log_cursor(after)
+        query = query.filter(tuple_(SymptomLog.created_at, SymptomLog.log_id) < (created_at, log_id))
+    if before:
+        created_at, log_id = decode_log_cursor(before)
+        query = query.filter(tuple_(SymptomLog.created_at, SymptomLog.log_id) > (created_at, log_id))
+    return query
+
+def stream_patient_logs(patient_id, after=None, before=None, fields=LOG_RESPONSE_FIELDS):
+    """Yield NDJSON lines for a patient's logs (both tiers) using a server-side cursor"""
+    query = patient_logs_query(patient_id, after, before).order_by(
+        SymptomLog.created_at.desc(), SymptomLog.log_id.desc()
+    ).yield_per(LOGS_STREAM_BATCH_SIZE)
+    archived = iter_archived_logs(
+        patient_id, newer_than=decode_log_cursor(before) if before else None,
+        older_than=decode_log_cursor(after) if after else None, newest_first=True
+    )
+    for log in heapq.merge(query, archived, key=log_key, reverse=True):
+        yield current_app.json.dumps(serialize_log(log, fields)) + '\n'
+        if log in db.session:
+            db.session.expunge(log)
+
+@bp.route('/api/doctor/patient/<int:patient_id>/logs', methods=['GET'])
+@login_required
+@replica_reads
+@patient_shard
+@versioned_response(patient_data_version)
+def patient_logs(patient_id):
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+        
+        patient = Patient.query.get(patient_id)
+        if not patient:
+            return jsonify({'message': 'Patient not found'}), 404
+
+        after = request.args.get('after')
+        before = request.args.get('before')
+        limit = request.args.get('limit', type=int)
+        if after and before:
+            return jsonify({'message': 'Use either after or before, not both'}), 400
+        if limit is not None and limit < 1:
+            return jsonify({'message': 'limit must be a positive integer'}), 400
+
+        response_format = request.args.get('format', 'rows')
+        if response_format not in RESPONSE_FORMATS:
+            return jsonify({'message': f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
+
+        try:
+            if after:
+                decode_log_cursor(after)
+            if before:
+                decode_log_cursor(before)
+            fields = parse_fields(request.args.get('fields'), LOG_RESPONSE_FIELDS) or LOG_RESPONSE_FIELDS
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        if response_format == 'ndjson':
+            return Response(
+                stream_with_context(stream_patient_logs(patient_id, after, before, fields)),
+                mimetype='application/x-ndjson'
+            )
+            
+        conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+        paginated = limit is not None or after or before
+
+        query = patient_logs_query(patient_id, after, before)
+        if before:
+            # Walk towards newer logs, then restore newest-first order
+            query = query.order_by(SymptomLog.created_at.asc(), SymptomLog.log_id.asc())
+        else:
+            query = query.order_by(SymptomLog.created_at.desc(), SymptomLog.log_id.desc())
+
+        bounds = {
+            'newer_than': decode_log_cursor(before) if before else None,
+            'older_than': decode_log_cursor(after) if after else None,
+            'newest_first': not before
+        }
+        has_more = False
+        if paginated:
+            limit = min(limit or MAX_LOGS_PAGE_SIZE, MAX_LOGS_PAGE_SIZE)
+            logs = with_archived_logs(query.limit(limit + 1).all(), patient_id, limit=limit + 1, **bounds)
+            has_more = len(logs) > limit
+            logs = logs[:limit]
+            if before:
+                logs.reverse()
+        else:
+            logs = with_archived_logs(query.all(), patient_id, **bounds)
+
+        if response_format == 'columnar':
+            logs_data = serialize_logs_columnar(logs, fields)
+        else:
+            logs_data = [serialize_log(log, fields) for log in logs]
+
+        summary = db.session.get(PatientSummary, patient_id) if paginated else None
+        response_data = {
+            'patient': {
+                'id': patient.patient_id,
+                'name': f"{patient.first_name or ''} {patient.last_name or ''}".strip() or patient.username,
+                'username': patient.username,
+                'conditions': {
+                    'rhinitis': conditions.has_rhinitis if conditions else False,
+                    'vertigo': conditions.has_vertigo if conditions else False,
+                    'tinnitus': conditions.has_tinnitus if conditions else False
+                }
+            },
+            'logs': logs_data,
+            'total_logs': summary.total_logs if paginated and summary else len(logs)
+        }
+        if response_format == 'columnar':
+            response_data['format'] = 'columnar'
+        if paginated:
+            response_data['page'] = {
+                'limit': limit,
+                'has_more': has_more,
+                'next_cursor': encode_log_cursor(logs[-1]) if logs and (has_more or before) else None,
+                'prev_cursor': encode_log_cursor(logs[0]) if logs and (after or (before and has_more)) else None
+            }
+        return jsonify(response_data), 200
+        
+    except Exception as e:
+        return jsonify({'message': 'Logs error', 'error': str(e)}), 500
+
+# Research cohort export
+EXPORT_BATCH_SIZE = 2000
+EXPORT_COLUMNS = ['log_id', 'patient_id', 'log_timestamp', 'created_at'] + LOG_FIELDS
+EXPORT_CONDITIONS = {
+    'rhinitis': PatientConditions.has_rhinitis,
+    'vertigo': PatientConditions.has_vertigo,
+    'tinnitus': PatientConditions.has_tinnitus
+}
+
+def parse_export_filters(patient_ids=None, date_from=None, date_to=None, conditions=None):
+    """Validate export filters given as raw strings; raises ValueError with a user-facing message"""
+    filters = {'patient_ids': None, 'from': None, 'to': None, 'conditions': []}
+    if patient_ids:
+        try:
+            filters['patient_ids'] = sorted({int(value) for value in patient_ids.split(',') if value.strip()})
+        except ValueError:
+            raise ValueError('patient_ids must be a comma-separated list of integers')
+    try:
+        filters['from'] = parse_date_arg(date_from)
+        filters['to'] = parse_date_arg(date_to)
+    except ValueError:
+        raise ValueError('from/to must be ISO dates (YYYY-MM-DD)')
+    if conditions:
+        filters['conditions'] = [name.strip() for name in conditions.split(',') if name.strip()]
+        unknown = [name for name in filters['conditions'] if name not in EXPORT_CONDITIONS]
+        if unknown:
+            raise ValueError(f"conditions must be drawn from {', '.join(EXPORT_CONDITIONS)}")
+    return filters
+
+ExportRow = namedtuple('ExportRow', EXPORT_COLUMNS)
+
+def export_range(filters):
+    """[start, end) datetimes of the export's from/to days (None when open)"""
+    start = datetime.combine(filters['from'], datetime.min.time()) if filters['from'] else None
+    end = datetime.combine(filters['to'] + timedelta(days=1), datetime.min.time()) if filters['to'] else None
+    return start, end
+
+def export_patients_filter(statement, model, filters):
+    if filters['conditions']:
+        # Patients must have every requested condition
+        statement = statement.join(PatientConditions, PatientConditions.patient_id == model.patient_id)
+        for name in filters['conditions']:
+            statement = statement.where(EXPORT_CONDITIONS[name].is_(True))
+    if filters['patient_ids'] is not None:
+        statement = statement.where(model.patient_id.in_(filters['patient_ids']))
+    return statement
+
+def export_logs_statement(filters):
+    """Logs matching the export filters, ordered along ix_symptom_logs_patient_created"""
+    statement = export_patients_filter(db.select(*[getattr(SymptomLog, column) for column in EXPORT_COLUMNS]), SymptomLog, filters)
+    start, end = export_range(filters)
+    if start:
+        statement = statement.where(SymptomLog.created_at >= start)
+    if end:
+        statement = statement.where(SymptomLog.created_at < end)
+    return statement.order_by(SymptomLog.patient_id, SymptomLog.created_at, SymptomLog.log_id)
+
+def export_segments_statement(filters):
+    """Archive segments that may hold logs matching the export filters, by patient"""
+    statement = export_patients_filter(db.select(
+        SymptomLogSegment.patient_id, SymptomLogSegment.log_count, SymptomLogSegment.payload
+    ), SymptomLogSegment, filters)
+    start, end = export_range(filters)
+    if start:
+        statement = statement.where(SymptomLogSegment.last_created_at >= start)
+    if end:
+        statement = statement.where(SymptomLogSegment.first_created_at < end)
+    return statement.order_by(SymptomLogSegment.patient_id, SymptomLogSegment.first_created_at)
+
+def archived_export_rows(segments, filters):
+    """Export rows of the archived logs in streamed ``segments``, one patient decoded at a time"""
+    start, end = export_range(filters)
+    for _, group in itertools.groupby(segments, key=lambda segment: segment.patient_id):
+        logs = sorted((log for segment in group for log in decode_segment(segment)), key=log_key)
+        for log in logs:
+            if (start is None or log.created_at >= start) and (end is None or log.created_at < end):
+                yield ExportRow(*[getattr(log, column) for column in EXPORT_COLUMNS])
+
+def export_row_key(row):
+    return (row.patient_id, row.created_at, row.log_id)
+
+def merged_partitions(results):
+    """EXPORT_BATCH_SIZE partitions interleaving per-shard results by patient_id.
+
+    A patient's logs are all on one shard and already in order there, so
+    merging on patient_id alone keeps the single-database export order.
+    """
+    rows = heapq.merge(*results, key=lambda row: row.patient_id)
+    while True:
+        partition = list(itertools.islice(rows, EXPORT_BATCH_SIZE))
+        if not partition:
+            return
+        yield partition
+
+def generate_export(filters, export_format, compress=True):
+    """Yield the encoded (and optionally gzipped) export in bounded chunks.
+
+    Rows are fetched EXPORT_BATCH_SIZE at a time through a server-side
+    cursor on each shard, so memory use stays flat regardless of the
+    cohort size; archived logs are decompressed one patient at a time.
+    """
+    statement = export_logs_statement(filters).execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    segments_statement = export_segments_statement(filters).execution_options(stream_results=True, yield_per=16)
+    results, shards = [], []
+    for _ in shard_router.each():
+        rows = db.session.execute(statement)
+        segments = db.session.execute(segments_statement)
+        results += [rows, segments]
+        first_segment = segments.fetchone()
+        if first_segment is not None:
+            archived = archived_export_rows(itertools.chain([first_segment], segments), filters)
+            rows = heapq.merge(rows, archived, key=export_row_key)
+        shards.append(rows)
+    try:
+        # Without sharding or an archive the cursor's own partitions go straight to the encoder
+        partitions = shards[0].partitions() if len(shards) == 1 and shards[0] is results[0] else merged_partitions(shards)
+        chunks = encode_rows(export_format, EXPORT_COLUMNS, partitions)
+        yield from (gzip_chunks(chunks) if compress else chunks)
+    finally:
+        for result in results:
+            result.close()
+
+@bp.route('/api/doctor/export', methods=['GET'])
+@login_required
+@replica_reads
+def export_logs():
+    try:
+        if get_current_user_type() != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'message': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+        compress = request.args.get('compress', 'gzip') != 'none'
+        try:
+            filters = parse_export_filters(
+                request.args.get('patient_ids'), request.args.get('from'),
+                request.args.get('to'), request.args.get('conditions')
+            )
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"symptom_logs_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{extension}"
+        if compress:
+            mimetype, filename = 'application/gzip', filename + '.gz'
+        return Response(
+            stream_with_context(generate_export(filters, export_format, compress)),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Cache-Control': 'no-store',
+                'X-Accel-Buffering': 'no'  # let nginx pass chunks straight through
+            }
+        )
+
+    except Exception as e:
+        return jsonify({'message': 'Export error', 'error': str(e)}), 500
+
+@bp.cli.command('export-logs')
+@click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, allow_dash=True), default='-',
+              help='Destination file; "-" writes to stdout')
+@click.option('--patient-ids', help='Comma-separated patient ids')
+@click.option('--from', 'date_from', help='First day to include (YYYY-MM-DD)')
+@click.option('--to', 'date_to', help='Last day to include (YYYY-MM-DD)')
+@click.option('--conditions', help='Only patients with all of these conditions, e.g. rhinitis,tinnitus')
+@click.option('--gzip/--no-gzip', 'compress', default=True)
+def export_logs_command(export_format, output, patient_ids, date_from, date_to, conditions, compress):
+    """Stream symptom logs for a research cohort as CSV or NDJSON"""
+    try:
+        filters = parse_export_filters(patient_ids, date_from, date_to, conditions)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    with click.open_file(output, 'wb') as destination:
+        for chunk in generate_export(filters, export_format, compress):
+            destination.write(chunk)
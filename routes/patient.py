@@ -0,0 +1,265 @@
+"""Patient endpoints: conditions and symptom logging."""
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, jsonify, request
+from flask_login import login_required
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import LOG_FIELDS, PatientConditions, SymptomLog, SymptomLogIdempotency
+from projections import (rebuild_patient_baseline, rebuild_patient_rollups, rebuild_patient_summary,
+                         record_logs_in_baseline, record_logs_in_rollups, record_logs_in_summary)
+from routes.common import patient_shard
+from users import get_current_patient_id
+
+bp = Blueprint('patient', __name__)
+
+@bp.route('/api/conditions', methods=['GET'])
+@login_required
+@patient_shard
+def get_conditions():
+    try:
+        patient_id = get_current_patient_id()
+        if patient_id is None:
+            return jsonify({'message': 'Not logged in'}), 401
+        
+        conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+
+        if conditions:
+            return jsonify({
+                'has_rhinitis': conditions.has_rhinitis,
+                'has_vertigo': conditions.has_vertigo,
+                'has_tinnitus': conditions.has_tinnitus
+            }), 200
+        else:
+            return jsonify({
+                'has_rhinitis': False,
+                'has_vertigo': False,
+                'has_tinnitus': False
+            }), 200
+    except Exception as e:
+        print(f"Get conditions error: {str(e)}")
+        return jsonify({'message': 'Internal server error', 'error': str(e)}), 500
+
+@bp.route('/api/conditions', methods=['POST'])
+@login_required
+@patient_shard
+def update_conditions():
+    try:
+        patient_id = get_current_patient_id()
+        if patient_id is None:
+            return jsonify({'message': 'Authentication required'}), 401
+            
+        data = request.get_json()
+        if not data:
+            return jsonify({'message': 'No data provided'}), 400
+            
+        has_rhinitis = data.get('has_rhinitis', False)
+        has_vertigo = data.get('has_vertigo', False)
+        has_tinnitus = data.get('has_tinnitus', False)
+
+        conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+        
+        if conditions:
+            conditions.has_rhinitis = has_rhinitis
+            conditions.has_vertigo = has_vertigo
+            conditions.has_tinnitus = has_tinnitus
+            db.session.flush()
+            rebuild_patient_summary(patient_id)
+            rebuild_patient_rollups(patient_id)
+            rebuild_patient_baseline(patient_id)
+            db.session.commit()
+            return jsonify({'message': 'Conditions updated successfully'}), 200
+        else:
+            patient_conditions = PatientConditions(
+                patient_id=patient_id,
+                has_rhinitis=has_rhinitis,
+                has_vertigo=has_vertigo,
+                has_tinnitus=has_tinnitus
+            )
+            db.session.add(patient_conditions)
+            db.session.flush()
+            rebuild_patient_summary(patient_id)
+            rebuild_patient_rollups(patient_id)
+            rebuild_patient_baseline(patient_id)
+            db.session.commit()
+            return jsonify({'message': 'Conditions saved successfully'}), 201
+            
+    except Exception as e:
+        db.session.rollback()
+        print("Update conditions exception:", str(e))
+        return jsonify({'message': 'Database error', 'error': str(e)}), 500
+
+@bp.route('/api/symptoms', methods=['POST'])
+@login_required
+@patient_shard
+def log_symptoms():
+    try:
+        patient_id = get_current_patient_id()
+        if patient_id is None:
+            return jsonify({'message': 'Authentication required'}), 401
+
+        data = request.get_json()
+        if not data:
+            return jsonify({'message': 'No symptom data provided'}), 400
+
+        new_log = SymptomLog(
+            patient_id=patient_id,
+            log_timestamp=datetime.utcnow(),
+            rhinitis_runny_nose=data.get('rhinitis_runny_nose'),
+            rhinitis_congestion=data.get('rhinitis_congestion'),
+            rhinitis_sneezing=data.get('rhinitis_sneezing'),
+            rhinitis_itchiness=data.get('rhinitis_itchiness'),
+            rhinitis_loss_smell=data.get('rhinitis_loss_smell'),
+            vertigo_severity=data.get('vertigo_severity'),
+            vertigo_frequency=data.get('vertigo_frequency'),
+            vertigo_type=data.get('vertigo_type'),
+            vertigo_associated=data.get('vertigo_associated'),
+            tinnitus_loudness=data.get('tinnitus_loudness'),
+            tinnitus_type=data.get('tinnitus_type'),
+            tinnitus_continuity=data.get('tinnitus_continuity'),
+            tinnitus_impact=data.get('tinnitus_impact')
+        )
+
+        db.session.add(new_log)
+        db.session.flush()
+        conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+        record_logs_in_summary(patient_id, [new_log], conditions)
+        record_logs_in_rollups(patient_id, [new_log], conditions)
+        flags = record_logs_in_baseline(patient_id, [new_log], conditions)
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Symptoms logged successfully',
+            'log_id': new_log.log_id,
+            'flagged': bool(flags)
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Log symptoms error: {str(e)}")
+        return jsonify({'message': 'Database error', 'error': str(e)}), 500
+    
+MAX_SYMPTOM_BATCH_SIZE = 500
+MAX_CLIENT_CLOCK_SKEW = timedelta(minutes=5)
+
+def parse_client_timestamp(value):
+    """Parse a client-supplied ISO timestamp into naive UTC"""
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def validate_symptom_entry(entry):
+    """Return (scores, timestamp, idempotency_key) for a batch entry, or raise ValueError"""
+    if not isinstance(entry, dict):
+        raise ValueError('Entry must be an object')
+
+    idempotency_key = entry.get('idempotency_key')
+    if idempotency_key is not None and (not isinstance(idempotency_key, str) or not 0 < len(idempotency_key) <= 100):
+        raise ValueError('idempotency_key must be a non-empty string of at most 100 characters')
+
+    timestamp = datetime.utcnow()
+    if entry.get('log_timestamp'):
+        try:
+            timestamp = parse_client_timestamp(entry['log_timestamp'])
+        except (TypeError, ValueError):
+            raise ValueError('log_timestamp must be an ISO 8601 timestamp')
+        if timestamp > datetime.utcnow() + MAX_CLIENT_CLOCK_SKEW:
+            raise ValueError('log_timestamp is in the future')
+
+    scores = {}
+    for field in LOG_FIELDS:
+        value = entry.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 5):
+            raise ValueError(f'{field} must be an integer between 0 and 5')
+        scores[field] = value
+    return scores, timestamp, idempotency_key
+
+@bp.route('/api/symptoms/batch', methods=['POST'])
+@login_required
+@patient_shard
+def log_symptoms_batch():
+    try:
+        patient_id = get_current_patient_id()
+        if patient_id is None:
+            return jsonify({'message': 'Authentication required'}), 401
+
+        data = request.get_json()
+        entries = data.get('entries') if isinstance(data, dict) else None
+        if not entries or not isinstance(entries, list):
+            return jsonify({'message': 'No symptom entries provided'}), 400
+        if len(entries) > MAX_SYMPTOM_BATCH_SIZE:
+            return jsonify({'message': f'At most {MAX_SYMPTOM_BATCH_SIZE} entries per batch'}), 413
+
+        results = [None] * len(entries)
+        pending = []
+        for index, entry in enumerate(entries):
+            try:
+                pending.append((index,) + validate_symptom_entry(entry))
+            except ValueError as e:
+                results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+        # Resolve replays against earlier batches in one query
+        keys = {key for _, _, _, key in pending if key}
+        known_keys = {}
+        if keys:
+            known_keys = dict(db.session.query(
+                SymptomLogIdempotency.idempotency_key, SymptomLogIdempotency.log_id
+            ).filter(
+                SymptomLogIdempotency.patient_id == patient_id,
+                SymptomLogIdempotency.idempotency_key.in_(keys)
+            ).all())
+
+        new_logs = []
+        batch_keys = {}
+        for index, scores, timestamp, key in pending:
+            if key in known_keys:
+                results[index] = {'index': index, 'idempotency_key': key, 'status': 'duplicate', 'log_id': known_keys[key]}
+                continue
+            if key in batch_keys:
+                # Same key repeated inside this batch - resolved after insert
+                results[index] = {'index': index, 'idempotency_key': key, 'status': 'duplicate'}
+                continue
+            log = SymptomLog(patient_id=patient_id, log_timestamp=timestamp, created_at=timestamp, **scores)
+            new_logs.append((index, key, log))
+            if key:
+                batch_keys[key] = log
+
+        if new_logs:
+            # One multi-row INSERT for the logs, then one for their keys
+            db.session.add_all([log for _, _, log in new_logs])
+            db.session.flush()
+            db.session.add_all([
+                SymptomLogIdempotency(patient_id=patient_id, idempotency_key=key, log_id=log.log_id)
+                for _, key, log in new_logs if key
+            ])
+            conditions = PatientConditions.query.filter_by(patient_id=patient_id).first()
+            logs = [log for _, _, log in new_logs]
+            record_logs_in_summary(patient_id, logs, conditions)
+            record_logs_in_rollups(patient_id, logs, conditions)
+            flagged_ids = {flag.log_id for flag in record_logs_in_baseline(patient_id, logs, conditions)}
+
+            for index, key, log in new_logs:
+                results[index] = {'index': index, 'idempotency_key': key, 'status': 'created', 'log_id': log.log_id,
+                                  'flagged': log.log_id in flagged_ids}
+            for result in results:
+                if result['status'] == 'duplicate' and 'log_id' not in result:
+                    result['log_id'] = batch_keys[result['idempotency_key']].log_id
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Batch processed',
+            'created': len(new_logs),
+            'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+            'errors': sum(1 for result in results if result['status'] == 'error'),
+            'results': results
+        }), 200
+
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'A concurrent request used the same idempotency keys, please retry'}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Log symptoms batch error: {str(e)}")
+        return jsonify({'message': 'Database error', 'error': str(e)}), 500
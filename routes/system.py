@@ -0,0 +1,174 @@
+"""Operational endpoints and maintenance commands."""
+import hmac
+
+import click
+from flask import Blueprint, Response, current_app, jsonify, request, send_file
+from flask_login import login_required
+
+from archive import archive_cutoff, archive_logs
+from dbpool import pool_stats
+from extensions import (analysis_cache, analysis_jobs, db, event_broker, init_migrate, password_hasher, principal_cache,
+                        replica_router, request_metrics, request_profiler, response_cache, shard_router)
+from metrics import render_gauges
+from projections import rebuild_all_patient_baselines, rebuild_all_patient_rollups, rebuild_all_patient_summaries
+from rebalance import move_patient, plan_rebalance, shard_patient_counts
+from schema import init_database, upgrade_database
+from users import get_current_user_type
+
+bp = Blueprint('system', __name__, cli_group=None)
+
+@bp.route('/api/doctor/system/stats', methods=['GET'])
+@login_required
+def system_stats():
+    if get_current_user_type() != 'doctor':
+        return jsonify({'message': 'Access denied'}), 403
+    return jsonify({
+        'password_hashing': password_hasher.stats(),
+        'principal_cache': principal_cache.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'db_pool': pool_stats.snapshot(db.engine.pool),
+        'events': event_broker.stats(),
+        'analysis_jobs': analysis_jobs.stats(),
+        'read_replicas': dict(replica_router.stats(), members=replica_router.describe()),
+        'shards': dict(shard_router.stats(), members=shard_router.describe()),
+        'profiler': request_profiler.stats()
+    }), 200
+
+@bp.route('/api/doctor/system/profiles', methods=['GET'])
+@login_required
+def list_profiles():
+    if get_current_user_type() != 'doctor':
+        return jsonify({'message': 'Access denied'}), 403
+    return jsonify({'enabled': request_profiler.enabled, 'profiles': request_profiler.list_profiles()}), 200
+
+@bp.route('/api/doctor/system/profiles/<profile_id>', methods=['GET'])
+@login_required
+def download_profile(profile_id):
+    """Collapsed stacks for flamegraph tools, or format=json for the request details and SQL"""
+    if get_current_user_type() != 'doctor':
+        return jsonify({'message': 'Access denied'}), 403
+    if request.args.get('format') == 'json':
+        metadata = request_profiler.load(profile_id)
+        if metadata is None:
+            return jsonify({'message': 'Profile not found'}), 404
+        return jsonify(metadata), 200
+    path = request_profiler.path(profile_id, 'collapsed')
+    if path is None:
+        return jsonify({'message': 'Profile not found'}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=f'{profile_id}.collapsed')
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text format; scrapers send METRICS_TOKEN as a bearer token, doctors can use their session"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())):
+        user_type = get_current_user_type()
+        if user_type is None:
+            return jsonify({'message': 'Unauthorized'}), 401
+        if user_type != 'doctor':
+            return jsonify({'message': 'Access denied'}), 403
+
+    extra_lines = []
+    extra_lines += render_gauges('password_hash', 'Password hashing pool', password_hasher.stats())
+    extra_lines += render_gauges('db_pool', 'Database connection pool', pool_stats.snapshot(db.engine.pool))
+    extra_lines += render_gauges('principal_cache', 'Authenticated principal cache', principal_cache.stats())
+    extra_lines += render_gauges('analysis_cache', 'AI analysis cache', analysis_cache.stats())
+    extra_lines += render_gauges('response_cache', 'Versioned response cache', response_cache.stats())
+    extra_lines += render_gauges('dashboard_events', 'Dashboard SSE fan-out', event_broker.stats())
+    extra_lines += render_gauges('analysis_jobs', 'AI analysis job runner', analysis_jobs.stats())
+    extra_lines += render_gauges('read_replicas', 'Read replica routing', replica_router.stats())
+    extra_lines += render_gauges('shards', 'Patient shard routing', shard_router.stats())
+    extra_lines += render_gauges('profiler', 'Request profiler', request_profiler.stats())
+    return Response(request_metrics.render(extra_lines), mimetype='text/plain; version=0.0.4')
+
+class MigrateCommands(click.Group):
+    """`flask db ...` from Flask-Migrate, imported only when a migration command is used"""
+
+    def _commands(self):
+        init_migrate(current_app)
+        from flask_migrate.cli import db as migrate_commands
+        return migrate_commands
+
+    def list_commands(self, ctx):
+        return self._commands().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._commands().get_command(ctx, name)
+
+bp.cli.add_command(MigrateCommands('db', help='Perform database migrations.'))
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Apply migrations, create the default doctor and backfill derived tables (run once per deploy)"""
+    init_database()
+    print("Database initialized successfully")
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Rebuild the symptom_rollups table from symptom logs"""
+    upgrade_database()
+    count = sum(rebuild_all_patient_rollups() for _ in shard_router.each())
+    print(f"Rebuilt rollups for {count} patients")
+
+@bp.cli.command('rebuild-baselines')
+def rebuild_baselines_command():
+    """Rebuild the patient_baselines table from symptom logs"""
+    upgrade_database()
+    count = sum(rebuild_all_patient_baselines() for _ in shard_router.each())
+    print(f"Rebuilt baselines for {count} patients")
+
+@bp.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    """Rebuild the patient_summary table from symptom logs"""
+    upgrade_database()
+    count = sum(rebuild_all_patient_summaries() for _ in shard_router.each())
+    print(f"Rebuilt summaries for {count} patients")
+
+@bp.cli.command('archive-logs')
+@click.option('--older-than-days', type=int, help='Archive horizon; defaults to ARCHIVE_AFTER_DAYS')
+def archive_logs_command(older_than_days):
+    """Move old symptom logs to the compressed cold tier (safe to re-run, e.g. nightly)"""
+    upgrade_database()
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if older_than_days is None else older_than_days
+    cutoff = archive_cutoff(days)
+    patients = logs = 0
+    for _ in shard_router.each():
+        shard_patients, shard_logs = archive_logs(cutoff)
+        patients += shard_patients
+        logs += shard_logs
+    print(f"Archived {logs} logs created before {cutoff.date()} for {patients} patients")
+
+def require_shards():
+    if not shard_router.enabled:
+        raise click.ClickException('Sharding is not enabled; set DATABASE_SHARD_URLS')
+
+@bp.cli.command('move-patient')
+@click.argument('patient_id', type=int)
+@click.argument('shard', type=int)
+def move_patient_command(patient_id, shard):
+    """Move one patient's data to another shard"""
+    require_shards()
+    try:
+        copied = move_patient(patient_id, shard)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"Moved patient {patient_id} to shard {shard} ({copied} rows)")
+
+@bp.cli.command('rebalance-shards')
+@click.option('--dry-run', is_flag=True, help='Only print the planned moves')
+@click.option('--limit', type=int, help='Move at most this many patients')
+def rebalance_shards_command(dry_run, limit):
+    """Even out patient counts across shards, e.g. after adding one"""
+    require_shards()
+    print(f"Patients per shard: {shard_patient_counts()}")
+    moves = plan_rebalance(limit)
+    for patient_id, source, target in moves:
+        if dry_run:
+            print(f"Would move patient {patient_id}: shard {source} -> {target}")
+        else:
+            copied = move_patient(patient_id, target)
+            print(f"Moved patient {patient_id}: shard {source} -> {target} ({copied} rows)")
+    if not dry_run:
+        print(f"Patients per shard: {shard_patient_counts()}")
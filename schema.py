@@ -0,0 +1,87 @@
+"""One-shot database setup, run by ``flask --app app init-db`` before workers start."""
+from flask import current_app
+from sqlalchemy import text
+
+from extensions import MIGRATIONS_DIRECTORY, db, init_migrate, password_hasher, shard_router
+from models import Doctor, Patient, PatientBaseline, PatientShard, PatientSummary, SymptomLog, SymptomRollup
+from projections import rebuild_all_patient_baselines, rebuild_all_patient_rollups, rebuild_patient_summary
+
+
+def upgrade_database(revision='head'):
+    """Apply migrations up to ``revision`` on the primary and every shard (app context required)"""
+    from flask_migrate import upgrade
+
+    init_migrate(current_app)
+    upgrade(directory=MIGRATIONS_DIRECTORY, revision=revision)
+    for shard in shard_router.shards[1:]:
+        url = shard.engine.url.render_as_string(hide_password=False)
+        upgrade(directory=MIGRATIONS_DIRECTORY, revision=revision, x_arg=[f'url={url}'])
+
+
+def init_database():
+    """Apply migrations, create the default doctor and backfill derived tables (app context required)"""
+    # Schema changes are managed by the migrations/ directory (flask db upgrade)
+    upgrade_database()
+
+    # Create default doctor if it doesn't exist
+    initialize_default_doctor()
+
+    if shard_router.enabled:
+        backfill_patient_shards()
+    for _ in shard_router.each():
+        backfill_derived_tables()
+
+
+def backfill_derived_tables():
+    """Build projections for patients on the current shard that do not have them yet"""
+    # Backfill the dashboard projection for patients that do not have a row yet
+    missing = [row.patient_id for row in db.session.query(Patient.patient_id).outerjoin(
+        PatientSummary, PatientSummary.patient_id == Patient.patient_id
+    ).filter(PatientSummary.patient_id.is_(None)).all()]
+    if missing:
+        for patient_id in missing:
+            rebuild_patient_summary(patient_id)
+        db.session.commit()
+        print(f"Patient summaries built for {len(missing)} patients")
+    if not SymptomRollup.query.first() and SymptomLog.query.first():
+        count = rebuild_all_patient_rollups()
+        print(f"Symptom rollups built for {count} patients")
+    if not PatientBaseline.query.first() and SymptomLog.query.first():
+        count = rebuild_all_patient_baselines()
+        print(f"Anomaly baselines built for {count} patients")
+
+
+def backfill_patient_shards():
+    """Add patients created before sharding was enabled (all on the primary) to the shard directory"""
+    with shard_router.using(0):
+        missing = db.session.query(Patient.patient_id, Patient.username).outerjoin(
+            PatientShard, PatientShard.patient_id == Patient.patient_id
+        ).filter(PatientShard.patient_id.is_(None)).all()
+    if not missing:
+        return
+    db.session.add_all([PatientShard(patient_id=row.patient_id, username=row.username, shard=0) for row in missing])
+    db.session.flush()
+    if db.engine.dialect.name == 'postgresql':
+        # Explicit ids do not advance the serial; new patients must be numbered after them
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('patient_shards', 'patient_id'), MAX(patient_id)) FROM patient_shards"
+        ))
+    db.session.commit()
+    print(f"Shard directory backfilled with {len(missing)} patients")
+
+
+def initialize_default_doctor():
+    """Create default doctor if it doesn't exist"""
+    existing_doctor = Doctor.query.filter_by(username='doctor').first()
+    if not existing_doctor:
+        hashed_password = password_hasher.hash('admin123')
+        default_doctor = Doctor(
+            username='doctor',
+            password=hashed_password,
+            first_name='Dr.',
+            last_name='Admin',
+            is_active=True
+        )
+        db.session.add(default_doctor)
+        db.session.commit()
+        print("Default doctor created")
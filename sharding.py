@@ -0,0 +1,194 @@
+"""Horizontal sharding of patient data across several databases.
+
+A patient and every row that belongs to them (conditions, logs, summary,
+rollups, baselines, flags, analysis jobs) live together on one shard.
+Doctors and the ``patient_shards`` directory stay on the primary, which is
+also shard 0, so without DATABASE_SHARD_URLS there is a single shard and
+nothing changes.
+
+The directory maps patient_id to a shard and allocates patient ids, so
+they stay unique across shards. New patients are placed by
+``patient_id % number of shards``, but the directory is authoritative, so
+rebalance.py can move patients one at a time. Patient-scoped views pick
+the request's shard with a decorator and RoutingSession sends the sharded
+tables there; doctor views that cover every patient call
+ShardRouter.gather(), which runs a function on all shards in parallel and
+returns the per-shard results for the view to merge.
+
+Several local SQLite files are enough to try it:
+
+    DATABASE_URL=sqlite:////tmp/shard0.db \\
+    DATABASE_SHARD_URLS=sqlite:////tmp/shard1.db,sqlite:////tmp/shard2.db \\
+    flask --app app init-db
+"""
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import create_engine, text
+from sqlalchemy.sql.util import find_tables
+
+from cache import LRUCache
+
+LOCATE_SQL = text('SELECT shard, moving FROM patient_shards WHERE patient_id = :patient_id')
+LOCATE_USERNAME_SQL = text('SELECT patient_id, shard FROM patient_shards WHERE username = :username')
+
+ShardLocation = namedtuple('ShardLocation', 'shard moving')
+
+
+class ShardNotSelectedError(RuntimeError):
+    """A patient table was queried before the request picked a shard"""
+
+
+def is_sharded(mapper=None, clause=None):
+    """Whether a statement reads or writes a table that lives on the patient's shard"""
+    if mapper is not None:
+        return bool(mapper.local_table.info.get('sharded'))
+    if clause is not None:
+        return any(table.info.get('sharded') for table in find_tables(clause, include_crud=True))
+    return False
+
+
+def shard_bind(mapper=None, clause=None):
+    """The engine for a sharded statement, or None to use the default routing"""
+    if not has_app_context() or not is_sharded(mapper, clause):
+        return None
+    engine = g.get('shard_engine')
+    if engine is None and current_app.extensions['symptom_tracker']['shard_router'].enabled:
+        raise ShardNotSelectedError('Patient data queried without selecting a shard')
+    return engine
+
+
+class Shard:
+    def __init__(self, index, engine):
+        self.index = index
+        self.name = f'shard{index}'
+        self.engine = engine
+
+
+class ShardRouter:
+    """Locates patients through the directory and runs work on one or all shards"""
+
+    def __init__(self, primary_engine, urls=(), engine_options=None, directory_ttl=5, workers=8):
+        self.shards = [Shard(0, primary_engine)]
+        for index, url in enumerate(urls, start=1):
+            self.shards.append(Shard(index, create_engine(url, **(engine_options(url) if engine_options else {}))))
+        self.directory_ttl = directory_ttl
+        self.workers = workers
+        self._directory = LRUCache(maxsize=65536, ttl=directory_ttl) if directory_ttl else None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.gathers = 0
+
+    @property
+    def enabled(self):
+        return len(self.shards) > 1
+
+    @property
+    def primary(self):
+        return self.shards[0].engine
+
+    def place(self, patient_id):
+        """Shard for a new patient"""
+        return patient_id % len(self.shards)
+
+    def locate(self, patient_id):
+        """ShardLocation for a patient from the (cached) directory; None if unknown"""
+        location = self._directory.get(patient_id) if self._directory is not None else None
+        if location is None:
+            with self._lock:
+                self.lookups += 1
+            with self.primary.connect() as connection:
+                row = connection.execute(LOCATE_SQL, {'patient_id': patient_id}).first()
+            if row is None:
+                return None
+            location = ShardLocation(row.shard, bool(row.moving))
+            if self._directory is not None:
+                self._directory.set(patient_id, location)
+        return location
+
+    def locate_username(self, username):
+        """(patient_id, shard) for a username, read straight from the directory; None if unknown"""
+        with self._lock:
+            self.lookups += 1
+        with self.primary.connect() as connection:
+            row = connection.execute(LOCATE_USERNAME_SQL, {'username': username}).first()
+        return (row.patient_id, row.shard) if row is not None else None
+
+    def forget(self, patient_id):
+        if self._directory is not None:
+            self._directory.pop(patient_id)
+
+    def use(self, index):
+        """Send this app context's patient tables to shard ``index``"""
+        g.shard_engine = self.shards[index].engine
+        return self.shards[index]
+
+    @contextmanager
+    def using(self, index):
+        previous = g.get('shard_engine')
+        try:
+            yield self.use(index)
+        finally:
+            g.shard_engine = previous
+
+    def each(self):
+        """Yield every shard in turn with the current app context routed to it (a no-op with one shard)"""
+        if not self.enabled:
+            yield self.shards[0]
+            return
+        for shard in self.shards:
+            with self.using(shard.index):
+                yield shard
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shard-gather')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def gather(self, func, *args):
+        """``func(*args)`` on every shard in parallel, results in shard order.
+
+        With a single shard it runs inline in the current context (so
+        replica routing still applies); otherwise each call gets its own
+        app context and session, bound to its shard.
+        """
+        if not self.enabled:
+            return [func(*args)]
+        with self._lock:
+            self.gathers += 1
+        app = current_app._get_current_object()
+        executor = self._get_executor()
+        futures = [executor.submit(self._run_on, app, shard.index, func, args) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def _run_on(self, app, index, func, args):
+        with app.app_context():
+            self.use(index)
+            return func(*args)
+
+    def dispose(self, close=True):
+        for shard in self.shards[1:]:
+            shard.engine.dispose(close=close)
+
+    def describe(self):
+        return [{
+            'name': shard.name,
+            'database': shard.engine.url.render_as_string(hide_password=True)
+        } for shard in self.shards]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'shards': len(self.shards),
+                'directory_lookups': self.lookups,
+                'directory_cache_hits': self._directory.hits if self._directory is not None else 0,
+                'gathers': self.gathers
+            }
@@ -0,0 +1,62 @@
+"""Fixtures: an application on throwaway SQLite files, with signed-in test clients."""
+import pytest
+
+from app import create_app
+from schema import init_database
+
+TEST_CONFIG = {
+    'TESTING': True,
+    'SESSION_COOKIE_SECURE': False,
+    'PASSWORD_HASH_WORKERS': 0,
+    'AI_ANALYSIS_WORKERS': 0,
+    'PRINCIPAL_CACHE_TTL': 0,
+    'SHARD_DIRECTORY_TTL': 0,
+    'EVENTS_BACKEND': 'local',
+    'AI_ANALYSIS_BACKEND': 'stub',
+    'PROFILE_REQUESTS': False
+}
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build and initialise an app; keyword arguments override the test config"""
+    def factory(**overrides):
+        config = dict(TEST_CONFIG, SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}")
+        config.update(overrides)
+        app = create_app(config)
+        with app.app_context():
+            init_database()
+        return app
+    return factory
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+def sign_up(app, username='patient', conditions=None):
+    """A test client signed in as a new patient with the given conditions"""
+    client = app.test_client()
+    response = client.post('/api/register', json={'username': username, 'password': 'secret'})
+    assert response.status_code == 201, response.json
+    client.patient_id = response.json['patient_id']
+    if conditions is not None:
+        assert client.post('/api/conditions', json=conditions).status_code in (200, 201)
+    return client
+
+
+def sign_in_doctor(app):
+    client = app.test_client()
+    assert client.post('/api/doctor/login', json={'username': 'doctor', 'password': 'admin123'}).status_code == 200
+    return client
+
+
+@pytest.fixture
+def patient_client(app):
+    return sign_up(app, conditions={'has_rhinitis': True, 'has_vertigo': True, 'has_tinnitus': True})
+
+
+@pytest.fixture
+def doctor_client(app):
+    return sign_in_doctor(app)
@@ -0,0 +1,114 @@
+"""Background AI analysis jobs on the stub backend."""
+import threading
+import uuid
+
+import pytest
+
+from ai_jobs import AnalysisJobRunner, StubAnalysisBackend
+from extensions import db
+from models import AnalysisJob
+from routes.analytics import run_analysis_job
+
+
+class CountingBackend(StubAnalysisBackend):
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+
+    def analyze(self, context):
+        self.calls += 1
+        if self.error:
+            raise RuntimeError(self.error)
+        return super().analyze(context)
+
+
+@pytest.fixture
+def backend(app):
+    backend = CountingBackend()
+    app.extensions['symptom_tracker']['analysis_backend'] = backend
+    return backend
+
+
+def create_job(doctor_client, patient_id):
+    return doctor_client.post(f'/api/doctor/patient/{patient_id}/analysis/jobs')
+
+
+def test_jobs_are_deduplicated_per_data_version(backend, patient_client, doctor_client):
+    patient_id = patient_client.patient_id
+    patient_client.post('/api/symptoms', json={'rhinitis_congestion': 3})
+
+    first = create_job(doctor_client, patient_id)
+    assert first.status_code == 200
+    assert first.json['status'] == 'succeeded'
+    assert first.json['result']['model'] == 'stub'
+    second = create_job(doctor_client, patient_id)
+    assert second.json['job_id'] == first.json['job_id']
+    assert backend.calls == 1
+
+    fetched = doctor_client.get(f"/api/doctor/analysis/jobs/{first.json['job_id']}")
+    assert fetched.status_code == 200
+    assert fetched.json['result'] == first.json['result']
+
+    # New data is a new version, so a new job
+    patient_client.post('/api/symptoms', json={'rhinitis_congestion': 5})
+    third = create_job(doctor_client, patient_id)
+    assert third.json['job_id'] != first.json['job_id']
+    assert backend.calls == 2
+
+
+def test_only_a_queued_job_is_claimed(app, backend, patient_client):
+    patient_id = patient_client.patient_id
+    with app.app_context():
+        for status in ('queued', 'running', 'succeeded'):
+            db.session.add(AnalysisJob(job_id=status, patient_id=patient_id, data_version=status,
+                                       backend=backend.name, status=status))
+        db.session.commit()
+
+    for job_id in ('queued', 'running', 'succeeded'):
+        run_analysis_job(app, job_id, patient_id)
+    run_analysis_job(app, 'queued', patient_id)  # A second worker finds it already claimed
+
+    assert backend.calls == 1
+    with app.app_context():
+        statuses = {job.job_id: job.status for job in AnalysisJob.query.all()}
+    assert statuses == {'queued': 'succeeded', 'running': 'running', 'succeeded': 'succeeded'}
+
+
+def test_failed_job_is_recorded_and_retried(app, patient_client, doctor_client):
+    backend = CountingBackend(error='model unavailable')
+    app.extensions['symptom_tracker']['analysis_backend'] = backend
+    patient_id = patient_client.patient_id
+
+    failed = create_job(doctor_client, patient_id)
+    assert failed.status_code == 202
+    assert failed.json['status'] == 'failed'
+    assert failed.json['error'] == 'model unavailable'
+
+    backend.error = None
+    retried = create_job(doctor_client, patient_id)
+    assert retried.json['job_id'] == failed.json['job_id']
+    assert retried.json['status'] == 'succeeded'
+    assert retried.json['error'] is None
+    assert backend.calls == 2
+
+
+def test_runner_collapses_concurrent_submissions():
+    runner = AnalysisJobRunner(workers=1, max_pending=4)
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def job(name):
+        runs.append(name)
+        started.set()
+        release.wait(5)
+
+    key = uuid.uuid4().hex
+    try:
+        assert runner.submit(key, job, 'first')
+        assert started.wait(5)
+        assert not runner.submit(key, job, 'second')
+        assert runner.stats()['deduplicated'] == 1
+    finally:
+        release.set()
+        runner.shutdown()
+    assert runs == ['first']
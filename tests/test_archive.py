@@ -0,0 +1,141 @@
+"""Reads across the hot table and the archive return what they did before archiving."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import sign_in_doctor, sign_up
+from extensions import db
+from models import PatientSummary, SymptomLog, SymptomLogSegment
+from projections import rebuild_patient_summary
+
+CONDITIONS = {'has_rhinitis': True, 'has_vertigo': True, 'has_tinnitus': True}
+ARCHIVE_AFTER_DAYS = 60
+MAX_PAGES = 100
+
+
+@pytest.fixture
+def archived_app(make_app):
+    # Cached bodies would hide the read path; archiving leaves the data version alone
+    app = make_app(RESPONSE_CACHE_MAX_BODY=0)
+    clients = [sign_up(app, f'patient{index}', CONDITIONS) for index in range(2)]
+    for client in clients:
+        for index in range(24):
+            client.post('/api/symptoms', json={'rhinitis_congestion': 1 + index % 5, 'vertigo_severity': index % 4})
+
+    # Spread the logs over the last months, with pairs sharing a created_at to exercise the log_id tie-break
+    now = datetime.utcnow().replace(microsecond=0)
+    with app.app_context():
+        for client in clients:
+            logs = SymptomLog.query.filter_by(patient_id=client.patient_id).order_by(SymptomLog.log_id).all()
+            for index, log in enumerate(logs):
+                log.created_at = now - timedelta(days=8 * ((len(logs) - index) // 2))
+            db.session.flush()
+            rebuild_patient_summary(client.patient_id)
+        db.session.commit()
+    app.patient_ids = [client.patient_id for client in clients]
+    return app
+
+
+def archive(app):
+    result = app.test_cli_runner().invoke(args=['archive-logs', '--older-than-days', str(ARCHIVE_AFTER_DAYS)])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert SymptomLogSegment.query.count() > 0
+        for patient_id in app.patient_ids:
+            assert SymptomLog.query.filter_by(patient_id=patient_id).count() > 0  # Both tiers hold logs
+
+
+def log_ids(response):
+    assert response.status_code == 200, response.json
+    return [log['log_id'] for log in response.json['logs']]
+
+
+def walk_after(doctor, patient_id, limit):
+    """Every log id, newest first, by following next_cursor"""
+    ids, cursor = [], None
+    for _ in range(MAX_PAGES):
+        page = doctor.get(f'/api/doctor/patient/{patient_id}/logs?limit={limit}' + (f'&after={cursor}' if cursor else ''))
+        ids += log_ids(page)
+        cursor = page.json['page']['next_cursor']
+        if not page.json['page']['has_more']:
+            return ids
+    raise AssertionError('the cursor never reached the oldest log')
+
+
+def walk_before(doctor, patient_id, limit, cursor):
+    """Every log id newer than the cursor, newest first, by following prev_cursor"""
+    ids = []
+    for _ in range(MAX_PAGES):
+        page = doctor.get(f'/api/doctor/patient/{patient_id}/logs?limit={limit}&before={cursor}')
+        ids = log_ids(page) + ids
+        cursor = page.json['page']['prev_cursor']
+        if not cursor:
+            return ids
+    raise AssertionError('the cursor never reached the newest log')
+
+
+def ndjson_ids(doctor, patient_id, query=''):
+    response = doctor.get(f'/api/doctor/patient/{patient_id}/logs?format=ndjson{query}')
+    assert response.status_code == 200
+    return [json.loads(line)['log_id'] for line in response.get_data(as_text=True).splitlines()]
+
+
+def export_rows(doctor, query=''):
+    response = doctor.get(f'/api/doctor/export?format=ndjson&compress=none{query}')
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def summary_state(patient_id):
+    summary = db.session.get(PatientSummary, patient_id)
+    return summary.total_logs, summary.last_log_at, summary.last_overall_severity
+
+
+def test_reads_match_across_tiers(archived_app):
+    doctor = sign_in_doctor(archived_app)
+    patient_id = archived_app.patient_ids[0]
+    expected = log_ids(doctor.get(f'/api/doctor/patient/{patient_id}/logs'))
+    window = (datetime.utcnow() - timedelta(days=80)).date().isoformat()
+    export = export_rows(doctor)
+    windowed_export = export_rows(doctor, f'&from={window}&patient_ids={patient_id}')
+
+    archive(archived_app)
+
+    assert log_ids(doctor.get(f'/api/doctor/patient/{patient_id}/logs')) == expected
+    for limit in (1, 5, 24):
+        assert walk_after(doctor, patient_id, limit) == expected
+    # A page of all but the oldest log ends on the second-oldest, deep in the archive
+    second_oldest = doctor.get(f'/api/doctor/patient/{patient_id}/logs?limit={len(expected) - 1}').json['page']['next_cursor']
+    for limit in (1, 5):
+        assert walk_before(doctor, patient_id, limit, second_oldest) == expected[:-2]
+
+    assert ndjson_ids(doctor, patient_id) == expected
+    assert ndjson_ids(doctor, patient_id, f'&after={second_oldest}') == expected[-1:]
+    assert ndjson_ids(doctor, patient_id, f'&before={second_oldest}') == expected[:-2]
+    assert export_rows(doctor) == export
+    assert export_rows(doctor, f'&from={window}&patient_ids={patient_id}') == windowed_export
+
+
+def test_summary_matches_a_rebuild_after_archiving(archived_app):
+    patient_id = archived_app.patient_ids[0]
+    with archived_app.app_context():
+        before = summary_state(patient_id)
+    archive(archived_app)
+
+    with archived_app.app_context():
+        assert summary_state(patient_id) == before
+        rebuild_patient_summary(patient_id)
+        assert summary_state(patient_id) == before
+        db.session.rollback()
+
+    # A new log still lands on top of the incremental summary
+    client = archived_app.test_client()
+    client.post('/api/login', json={'username': 'patient0', 'password': 'secret'})
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 4}).status_code == 201
+    with archived_app.app_context():
+        incremental = summary_state(patient_id)
+        assert incremental[0] == before[0] + 1
+        rebuild_patient_summary(patient_id)
+        assert summary_state(patient_id) == incremental
+        db.session.rollback()
@@ -0,0 +1,116 @@
+"""Anomaly flags and the doctor's needs-attention list."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import projections
+from extensions import db
+from models import PatientBaseline, SymptomLogFlag
+from projections import rebuild_patient_baseline
+
+BASELINE_COLUMNS = [f'{metric}_{part}' for metric in ('rhinitis', 'vertigo', 'tinnitus', 'overall')
+                    for part in ('count', 'mean', 'm2', 'ewma')] + ['anomaly_score', 'anomaly_metric', 'last_log_id']
+
+
+def log_normal_days(client, count=6):
+    for index in range(count):
+        response = client.post('/api/symptoms', json={'rhinitis_congestion': 1 + index % 2})
+        assert response.json['flagged'] is False
+
+
+def attention_ids(doctor_client):
+    response = doctor_client.get('/api/doctor/attention')
+    assert response.status_code == 200
+    return [patient['patient_id'] for patient in response.json['patients']]
+
+
+def baseline_state(patient_id):
+    baseline = db.session.get(PatientBaseline, patient_id)
+    return {column: getattr(baseline, column) for column in BASELINE_COLUMNS}
+
+
+def test_backdated_batch_does_not_clear_a_live_flag(app, patient_client, doctor_client):
+    client = patient_client
+    log_normal_days(client)
+    spike = client.post('/api/symptoms', json={'rhinitis_congestion': 5})
+    assert spike.json['flagged'] is True
+    assert attention_ids(doctor_client) == [client.patient_id]
+    with app.app_context():
+        before = baseline_state(client.patient_id)
+
+    response = client.post('/api/symptoms/batch', json={'entries': [
+        {'log_timestamp': '2025-01-01T09:00:00Z', 'rhinitis_congestion': 1}
+    ]})
+    assert response.json['created'] == 1
+    assert attention_ids(doctor_client) == [client.patient_id]
+
+    with app.app_context():
+        baseline = db.session.get(PatientBaseline, client.patient_id)
+        # The spike is still the newest log and the old log stays off the EWMA
+        assert baseline.last_log_id == spike.json['log_id']
+        state = baseline_state(client.patient_id)
+        assert {column: state[column] for column in state if column.endswith('_ewma') or column.startswith('anomaly')} == \
+            {column: before[column] for column in before if column.endswith('_ewma') or column.startswith('anomaly')}
+        # Mean and variance do not depend on the order the logs were folded in
+        db.session.expunge_all()
+        rebuild_patient_baseline(client.patient_id)
+        db.session.flush()
+        rebuilt = baseline_state(client.patient_id)
+        for column in BASELINE_COLUMNS:
+            if column.endswith(('_count', '_mean', '_m2')):
+                assert state[column] == pytest.approx(rebuilt[column])
+        db.session.rollback()
+
+
+def test_flag_stays_until_acknowledged(app, patient_client, doctor_client):
+    client = patient_client
+    log_normal_days(client)
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 5}).json['flagged'] is True
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 1}).json['flagged'] is False
+    listed = doctor_client.get('/api/doctor/attention').json['patients']
+    assert [patient['patient_id'] for patient in listed] == [client.patient_id]
+    assert listed[0]['metric'] and listed[0]['anomaly_score'] >= app.config['ANOMALY_THRESHOLD']
+
+    response = doctor_client.post(f'/api/doctor/patient/{client.patient_id}/attention/acknowledge')
+    assert response.status_code == 200
+    assert attention_ids(doctor_client) == []
+    assert client.post(f'/api/doctor/patient/{client.patient_id}/attention/acknowledge').status_code == 403
+
+    # A new outlier raises the flag again
+    log_normal_days(client)
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 5}).json['flagged'] is True
+    assert attention_ids(doctor_client) == [client.patient_id]
+
+
+def test_flag_decays(app, patient_client, doctor_client):
+    client = patient_client
+    log_normal_days(client)
+    client.post('/api/symptoms', json={'rhinitis_congestion': 5})
+    client.post('/api/symptoms', json={'rhinitis_congestion': 1})
+    with app.app_context():
+        baseline = db.session.get(PatientBaseline, client.patient_id)
+        baseline.flagged_at = datetime.utcnow() - timedelta(days=app.config['ANOMALY_FLAG_DECAY_DAYS'] + 1)
+        db.session.commit()
+    assert attention_ids(doctor_client) == []
+
+
+def test_backdated_outlier_is_flagged_in_place(app, patient_client, doctor_client, monkeypatch):
+    client = patient_client
+    start = datetime.utcnow() - timedelta(days=3)
+    entries = [{'log_timestamp': (start + timedelta(hours=6 * index)).isoformat(), 'rhinitis_congestion': 1 + index % 2}
+               for index in range(10)]
+    client.post('/api/symptoms/batch', json={'entries': entries})
+    log_normal_days(client, count=2)
+
+    # Scored against the current statistics, without reading the history back
+    def no_history_scan(*args, **kwargs):
+        raise AssertionError('a backdated log must not replay the history')
+    monkeypatch.setattr(projections, 'iter_patient_logs', no_history_scan)
+    response = client.post('/api/symptoms/batch', json={'entries': [
+        {'log_timestamp': (start + timedelta(hours=51)).isoformat(), 'rhinitis_congestion': 5}
+    ]})
+    result = response.json['results'][0]
+    assert result['flagged'] is True
+    with app.app_context():
+        assert db.session.get(SymptomLogFlag, result['log_id']) is not None
+    assert attention_ids(doctor_client) == [client.patient_id]
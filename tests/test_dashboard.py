@@ -0,0 +1,62 @@
+"""Dashboard keyset pages, on one database and merged across shards."""
+import pytest
+
+from conftest import sign_in_doctor, sign_up
+
+CONDITIONS = {'has_rhinitis': True}
+SORTS = ['patient_id', 'total_logs', 'last_log_date', 'latest_severity']
+# Congestion scores logged by each patient; ties in count and latest severity, and three patients without logs
+LOGS = [[3, 2, 4], [4], [1, 2, 4], [], [5, 1], [2], [], [3, 3], []]
+
+
+@pytest.fixture(params=['single', 'sharded'])
+def dashboard_app(request, make_app, tmp_path):
+    if request.param == 'sharded':
+        app = make_app(DATABASE_SHARD_URLS=[f"sqlite:///{tmp_path / 'shard1.db'}", f"sqlite:///{tmp_path / 'shard2.db'}"])
+    else:
+        app = make_app()
+    for index, scores in enumerate(LOGS):
+        client = sign_up(app, f'patient{index}', CONDITIONS)
+        for score in scores:
+            assert client.post('/api/symptoms', json={'rhinitis_congestion': score}).status_code == 201
+    return app
+
+
+def expected_order(patients, sort, order):
+    """Dashboard order: values then patient id in the requested direction, patients without a value last"""
+    descending = order == 'desc'
+    if sort == 'patient_id':
+        return sorted((patient['patient_id'] for patient in patients), reverse=descending)
+    valued = [patient for patient in patients if patient[sort] is not None]
+    empty = [patient for patient in patients if patient[sort] is None]
+    return [patient['patient_id'] for patient in sorted(valued, key=lambda patient: (patient[sort], patient['patient_id']), reverse=descending)] + \
+        sorted((patient['patient_id'] for patient in empty), reverse=descending)
+
+
+def walk(doctor, sort, order, limit):
+    ids, cursor = [], None
+    for _ in range(len(LOGS) + 1):
+        response = doctor.get(f'/api/doctor/dashboard?sort={sort}&order={order}&limit={limit}' + (f'&after={cursor}' if cursor else ''))
+        assert response.status_code == 200, response.json
+        assert response.json['total_patients'] == len(LOGS)
+        assert len(response.json['patients']) <= limit
+        ids += [patient['patient_id'] for patient in response.json['patients']]
+        cursor = response.json['page']['next_cursor']
+        if not response.json['page']['has_more']:
+            return ids
+    raise AssertionError('the cursor never reached the last patient')
+
+
+def test_pages_join_to_the_unpaged_list(dashboard_app):
+    doctor = sign_in_doctor(dashboard_app)
+    for sort in SORTS:
+        for order in ('asc', 'desc'):
+            response = doctor.get(f'/api/doctor/dashboard?sort={sort}&order={order}')
+            assert response.status_code == 200
+            patients = response.json['patients']
+            unpaged = [patient['patient_id'] for patient in patients]
+            assert len(unpaged) == len(LOGS)
+            assert unpaged == expected_order(patients, sort, order), (sort, order)
+
+            for limit in (1, 2, len(LOGS)):
+                assert walk(doctor, sort, order, limit) == unpaged, (sort, order, limit)
@@ -0,0 +1,50 @@
+"""PasswordHasher queue accounting and recovery on a real process pool."""
+import os
+import time
+
+import pytest
+
+from hashing import HashingBusyError, PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_pending=2, timeout=10)
+    yield hasher
+    hasher.shutdown()
+
+
+def wait_for_idle(hasher, seconds=10):
+    deadline = time.monotonic() + seconds
+    while hasher.stats()['queue_depth'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return hasher.stats()['queue_depth']
+
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes(hasher):
+    hasher._run(abs, -1)  # Start the worker before timing anything
+    hasher.timeout = 0.2
+    with pytest.raises(HashingBusyError):
+        hasher._run(time.sleep, 1)
+    # The worker is still sleeping, so the slot is still taken
+    assert hasher.stats()['queue_depth'] == 1
+    assert wait_for_idle(hasher) == 0
+    assert hasher.stats()['completed'] == hasher.stats()['submitted']
+
+
+def test_broken_pool_is_replaced(hasher):
+    with pytest.raises(HashingBusyError):
+        hasher._run(os._exit, 1)
+    assert wait_for_idle(hasher) == 0
+    password_hash = hasher.hash('secret')
+    assert hasher.verify(password_hash, 'secret')
+
+
+def test_hash_many_keeps_within_the_queue_bound(hasher):
+    hasher.method = 'pbkdf2:sha256:1000'
+    passwords = [f'secret{index}' for index in range(7)]
+    hashes = hasher.hash_many(passwords, chunk_size=2)
+    assert all(hasher.verify(password_hash, password) for password_hash, password in zip(hashes, passwords))
+    # Four chunks on a one-worker pool with two slots: never rejected, all released
+    assert hasher.stats()['rejected'] == 0
+    assert wait_for_idle(hasher) == 0
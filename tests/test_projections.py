@@ -0,0 +1,116 @@
+"""Incrementally maintained projections must match a rebuild from the logs."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+
+import projections
+from extensions import db
+from models import PatientSummary, SymptomRollup
+from projections import rebuild_patient_rollups, rebuild_patient_summary
+
+SUMMARY_COLUMNS = ['total_logs', 'last_log_at', 'last_overall_severity', 'has_rhinitis', 'has_vertigo', 'has_tinnitus']
+
+
+def timestamp(days_ago, hour=12):
+    moment = datetime.utcnow().replace(hour=hour, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+    return moment.isoformat() + 'Z'
+
+
+def summary_state(patient_id):
+    summary = db.session.get(PatientSummary, patient_id)
+    return {column: getattr(summary, column) for column in SUMMARY_COLUMNS}
+
+
+def rollup_state(patient_id):
+    columns = [attribute.key for attribute in inspect(SymptomRollup).column_attrs]
+    return {
+        (rollup.period, rollup.period_start): {column: getattr(rollup, column) for column in columns}
+        for rollup in SymptomRollup.query.filter_by(patient_id=patient_id)
+    }
+
+
+def assert_matches_rebuild(app, patient_id):
+    with app.app_context():
+        summary, rollups = summary_state(patient_id), rollup_state(patient_id)
+        db.session.expunge_all()
+        rebuild_patient_summary(patient_id)
+        rebuild_patient_rollups(patient_id)
+        db.session.flush()
+        db.session.expire_all()
+        assert summary_state(patient_id) == summary
+        assert rollup_state(patient_id) == rollups
+        db.session.rollback()
+
+
+def test_single_batch_and_duplicate_writes_match_rebuild(app, patient_client):
+    client = patient_client
+    for score in (1, 4, 2):
+        assert client.post('/api/symptoms', json={'rhinitis_congestion': score, 'vertigo_severity': score}).status_code == 201
+
+    entries = [
+        {'idempotency_key': 'a', 'log_timestamp': timestamp(9), 'rhinitis_runny_nose': 3, 'tinnitus_loudness': 5},
+        {'idempotency_key': 'b', 'log_timestamp': timestamp(9, hour=18), 'vertigo_severity': 2},
+        {'idempotency_key': 'b', 'log_timestamp': timestamp(9, hour=18), 'vertigo_severity': 2},
+        {'idempotency_key': 'c', 'log_timestamp': timestamp(3), 'rhinitis_sneezing': 1, 'tinnitus_impact': 0},
+        {'log_timestamp': timestamp(16), 'rhinitis_itchiness': 5},
+        {'rhinitis_congestion': 9}
+    ]
+    response = client.post('/api/symptoms/batch', json={'entries': entries})
+    assert response.status_code == 200
+    assert (response.json['created'], response.json['duplicates'], response.json['errors']) == (4, 1, 1)
+    assert_matches_rebuild(app, client.patient_id)
+
+    # Replaying the batch adds nothing; a newer single log after it still lands on top
+    response = client.post('/api/symptoms/batch', json={'entries': entries[:4] + [
+        {'idempotency_key': 'd', 'log_timestamp': timestamp(30), 'rhinitis_congestion': 4}
+    ]})
+    assert (response.json['created'], response.json['duplicates']) == (1, 4)
+    assert client.post('/api/symptoms', json={'tinnitus_loudness': 3}).status_code == 201
+    assert_matches_rebuild(app, client.patient_id)
+
+    with app.app_context():
+        assert db.session.get(PatientSummary, client.patient_id).total_logs == 9
+
+
+def test_condition_change_rebuilds_projections(app, patient_client):
+    client = patient_client
+    client.post('/api/symptoms/batch', json={'entries': [
+        {'log_timestamp': timestamp(days), 'rhinitis_congestion': days % 6, 'vertigo_severity': 5 - days % 6}
+        for days in range(12)
+    ]})
+    assert client.post('/api/conditions', json={'has_vertigo': True}).status_code == 200
+    client.post('/api/symptoms', json={'rhinitis_congestion': 2, 'vertigo_severity': 4})
+    assert_matches_rebuild(app, client.patient_id)
+
+
+def test_rollup_created_concurrently_is_folded_into(app, patient_client, monkeypatch):
+    client = patient_client
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 2}).status_code == 201
+
+    # The second write misses the rows on its first look, as if another
+    # transaction created them in between; its INSERT conflicts and it retries
+    calls = []
+    locked_rollups = projections._locked_rollups
+    def racing_lookup(patient_id, keys):
+        calls.append(keys)
+        return {} if len(calls) == 1 else locked_rollups(patient_id, keys)
+    monkeypatch.setattr(projections, '_locked_rollups', racing_lookup)
+
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 4}).status_code == 201
+    assert len(calls) == 2
+    with app.app_context():
+        assert {rollup.log_count for rollup in SymptomRollup.query.filter_by(patient_id=client.patient_id)} == {2}
+    assert_matches_rebuild(app, client.patient_id)
+
+
+def test_rollup_insert_failure_other_than_the_race_is_not_retried(app, patient_client, monkeypatch):
+    client = patient_client
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 2}).status_code == 201
+
+    # The rows never show up on a re-read, so the conflict is not a concurrent first write
+    calls = []
+    monkeypatch.setattr(projections, '_locked_rollups', lambda patient_id, keys: calls.append(keys) or {})
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 4}).status_code == 500
+    assert len(calls) == 2
+    with app.app_context():
+        assert {rollup.log_count for rollup in SymptomRollup.query.filter_by(patient_id=client.patient_id)} == {1}
@@ -0,0 +1,42 @@
+"""Bulk patient imports over HTTP."""
+import pytest
+
+import hashing
+from conftest import sign_in_doctor
+
+CSV = 'username,password,has_rhinitis,has_vertigo,has_tinnitus\nalice,pw1,yes,no,no\nbob,pw2,no,yes,no\n'
+
+
+@pytest.fixture
+def no_dedicated_pools(monkeypatch):
+    """Fail if an import starts a pool of its own instead of using the shared hasher"""
+    def refuse(*args, **kwargs):
+        raise AssertionError('HTTP imports must hash on the shared pool')
+    monkeypatch.setattr(hashing, 'ProcessPoolExecutor', refuse)
+
+
+def post_import(client, body):
+    return client.post('/api/doctor/patients/import?format=csv', data=body, content_type='text/csv')
+
+
+def test_http_import_uses_the_shared_hasher_and_resumes(app, no_dedicated_pools):
+    client = sign_in_doctor(app)
+    response = post_import(client, CSV)
+    assert response.status_code == 200
+    assert response.get_json()['created'] == 2
+
+    response = post_import(client, CSV + 'carol,pw3,no,no,yes\n')
+    report = response.get_json()
+    assert report['created'] == 1
+    assert [row['username'] for row in report['skipped']] == ['alice', 'bob']
+    assert app.test_client().post('/api/login', json={'username': 'carol', 'password': 'pw3'}).status_code == 200
+
+
+def test_http_import_returns_503_when_the_hasher_is_busy(app, monkeypatch):
+    def busy(passwords):
+        raise hashing.HashingBusyError('Password hashing queue is full')
+    with app.app_context():
+        monkeypatch.setattr(app.extensions['symptom_tracker']['password_hasher'], 'hash_many', busy)
+    response = post_import(sign_in_doctor(app), CSV)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
@@ -0,0 +1,125 @@
+"""Read replica routing on SQLite files standing in for a primary and its replicas."""
+import shutil
+import time
+
+import pytest
+from sqlalchemy import event
+
+from conftest import sign_in_doctor, sign_up
+from extensions import replica_router
+from replicas import ReplicaRouter
+
+
+@pytest.fixture
+def replica_app(make_app, tmp_path, monkeypatch):
+    """An app whose replicas are copies of the primary, plus per-engine statement counts"""
+    def factory(*names):
+        reader = sign_up(make_app(), 'reader', {'has_rhinitis': True})
+        reader.post('/api/symptoms', json={'rhinitis_congestion': 2})
+        urls = []
+        for name in names:
+            if name == 'missing':
+                urls.append(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")  # Directory does not exist
+                continue
+            shutil.copy(tmp_path / 'primary.db', tmp_path / f'{name}.db')
+            urls.append(f"sqlite:///{tmp_path / name}.db")
+        # Health checks are driven by the tests, not the background thread
+        monkeypatch.setattr(ReplicaRouter, '_ensure_monitor', lambda self: None)
+        app = make_app(DATABASE_REPLICA_URLS=urls)
+        app.reader_id = reader.patient_id
+        app.counts = {}
+        with app.app_context():
+            for replica in replica_router.replicas:
+                app.counts[replica.name] = 0
+                event.listen(replica.engine, 'before_cursor_execute', counter(app.counts, replica.name))
+        return app
+    return factory
+
+
+def counter(counts, name):
+    def count(*args):
+        counts[name] += 1
+    return count
+
+
+def test_reads_rotate_across_replicas(replica_app):
+    app = replica_app('replica0', 'replica1')
+    doctor = sign_in_doctor(app)
+    touched = []
+    for _ in range(4):
+        before = dict(app.counts)
+        assert doctor.get('/api/doctor/attention').status_code == 200
+        touched.append([name for name in app.counts if app.counts[name] > before[name]])
+    assert touched == [['replica0'], ['replica1'], ['replica0'], ['replica1']]
+    with app.app_context():
+        assert replica_router.stats()['routed'] == 4
+
+
+def test_reads_stick_to_the_primary_after_a_write(replica_app):
+    app = replica_app('replica0')
+    doctor = sign_in_doctor(app)
+    assert doctor.get('/api/doctor/attention').status_code == 200
+    routed = app.counts['replica0']
+    assert routed > 0
+
+    # Acknowledging a flag is a write; the doctor's next reads skip the replica
+    acknowledge = f'/api/doctor/patient/{app.reader_id}/attention/acknowledge'
+    assert doctor.post(acknowledge).status_code == 200
+    assert doctor.get('/api/doctor/attention').status_code == 200
+    assert app.counts['replica0'] == routed
+    with app.app_context():
+        assert replica_router.stats()['sticky'] == 1
+
+    app.config['REPLICA_STICKY_SECONDS'] = 0
+    assert doctor.post(acknowledge).status_code == 200
+    time.sleep(0.01)
+    assert doctor.get('/api/doctor/attention').status_code == 200
+    assert app.counts['replica0'] > routed
+
+
+def test_failed_replica_query_is_answered_by_the_primary(replica_app):
+    app = replica_app('missing')
+    doctor = sign_in_doctor(app)
+    response = doctor.get('/api/doctor/attention')
+    assert response.status_code == 200
+    assert response.json['patients'] == []
+    with app.app_context():
+        stats = replica_router.stats()
+        assert (stats['routed'], stats['retried_on_primary'], stats['healthy']) == (1, 1, 0)
+
+
+def test_unhealthy_replica_is_skipped_until_it_recovers(replica_app, tmp_path):
+    app = replica_app('replica0', 'missing')
+    doctor = sign_in_doctor(app)
+    with app.app_context():
+        replica_router.check()
+        assert [replica['healthy'] for replica in replica_router.describe()] == [True, False]
+    for _ in range(3):
+        assert doctor.get('/api/doctor/attention').status_code == 200
+    with app.app_context():
+        assert replica_router.stats()['routed'] == 3
+
+        replica_router.replicas[0].engine.dispose()
+        shutil.move(tmp_path / 'replica0.db', tmp_path / 'gone.db')
+        (tmp_path / 'replica0.db').mkdir()  # Can no longer be opened
+        replica_router.check()
+        assert replica_router.stats()['healthy'] == 0
+    assert doctor.get('/api/doctor/attention').status_code == 200
+    with app.app_context():
+        assert replica_router.stats()['fallbacks'] == 1
+
+        (tmp_path / 'replica0.db').rmdir()
+        shutil.move(tmp_path / 'gone.db', tmp_path / 'replica0.db')
+        replica_router.check()
+        assert replica_router.stats()['healthy'] == 1
+
+
+def test_health_checks_run_in_the_background(tmp_path):
+    router = ReplicaRouter([f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"], health_interval=60)
+    assert router.choose() is not None  # Nothing probed yet
+    deadline = time.monotonic() + 5
+    while router.replicas[0].checked_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert router.replicas[0].healthy is False
+    assert router.choose() is None
+    router.dispose()
@@ -0,0 +1,172 @@
+"""Patient sharding across several SQLite files: routing, scatter-gather and moves."""
+import pytest
+from sqlalchemy import create_engine, text
+
+import rebalance
+from conftest import sign_in_doctor, sign_up
+from extensions import db, password_hasher, shard_router
+from models import PatientShard
+
+CONDITIONS = {'has_rhinitis': True, 'has_vertigo': True}
+
+
+@pytest.fixture
+def sharded_app(make_app, tmp_path):
+    app = make_app(DATABASE_SHARD_URLS=[f"sqlite:///{tmp_path / 'shard1.db'}", f"sqlite:///{tmp_path / 'shard2.db'}"])
+    app.shard_files = [tmp_path / name for name in ('primary.db', 'shard1.db', 'shard2.db')]
+    return app
+
+
+def rows(app, shard, sql, **params):
+    engine = create_engine(f'sqlite:///{app.shard_files[shard]}')
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text(sql), params).all()
+    finally:
+        engine.dispose()
+
+
+def patient_column(app, shard, table, column, patient_id):
+    return [row[0] for row in rows(app, shard, f'SELECT {column} FROM {table} WHERE patient_id = :id', id=patient_id)]
+
+
+def directory(app, patient_id):
+    with app.app_context():
+        return shard_router.locate(patient_id)
+
+
+def test_patients_are_placed_and_served_by_the_directory(sharded_app):
+    clients = [sign_up(sharded_app, f'patient{index}', CONDITIONS) for index in range(6)]
+    for client in clients:
+        client.post('/api/symptoms', json={'rhinitis_congestion': 3})
+        shard = client.patient_id % 3
+        assert directory(sharded_app, client.patient_id).shard == shard
+        for other in range(3):
+            found = patient_column(sharded_app, other, 'symptom_logs', 'COUNT(*)', client.patient_id)
+            assert found == [1 if other == shard else 0]
+        assert client.get('/api/conditions').json['has_rhinitis'] is True
+
+    # Usernames stay unique across shards, and logins find the right shard
+    duplicate = sharded_app.test_client().post('/api/register', json={'username': 'patient4', 'password': 'x'})
+    assert duplicate.status_code == 409
+    login = sharded_app.test_client().post('/api/login', json={'username': 'patient4', 'password': 'secret'})
+    assert login.json['patient_id'] == clients[4].patient_id
+
+
+def test_doctor_views_merge_every_shard(sharded_app):
+    clients = [sign_up(sharded_app, f'patient{index}', CONDITIONS) for index in range(7)]
+    for count, client in enumerate(clients):
+        for _ in range(count):
+            client.post('/api/symptoms', json={'vertigo_severity': 2})
+    doctor = sign_in_doctor(sharded_app)
+
+    dashboard = doctor.get('/api/doctor/dashboard?sort=total_logs').json
+    assert dashboard['total_patients'] == 7
+    assert [patient['total_logs'] for patient in dashboard['patients']] == [6, 5, 4, 3, 2, 1, 0]
+
+    first = doctor.get('/api/doctor/dashboard?limit=3').json
+    second = doctor.get(f"/api/doctor/dashboard?limit=3&after={first['page']['next_cursor']}").json
+    assert [patient['patient_id'] for patient in first['patients'] + second['patients']] == \
+        sorted(client.patient_id for client in clients)[:6]
+    assert first['total_patients'] == 7
+
+
+def test_move_patient_freezes_copies_flips_and_deletes(sharded_app, monkeypatch):
+    client = sign_up(sharded_app, 'mover', CONDITIONS)
+    for score in (1, 2, 1, 2, 1, 2):
+        client.post('/api/symptoms', json={'rhinitis_congestion': score})
+    batch = client.post('/api/symptoms/batch', json={'entries': [
+        {'idempotency_key': 'spike', 'rhinitis_congestion': 5, 'vertigo_severity': 5}
+    ]}).json['results'][0]
+    assert batch['flagged'] is True
+
+    patient_id = client.patient_id
+    source = directory(sharded_app, patient_id).shard
+    target = (source + 1) % 3
+    # A busier target shard has handed out the moved logs' ids already, so they must be renumbered
+    neighbour = next(other for other in (sign_up(sharded_app, f'neighbour{index}') for index in range(3))
+                     if directory(sharded_app, other.patient_id).shard == target)
+    for _ in range(20):
+        neighbour.post('/api/symptoms', json={'rhinitis_congestion': 1})
+    source_logs = rows(sharded_app, source, 'SELECT log_id, rhinitis_congestion FROM symptom_logs '
+                                            'WHERE patient_id = :id ORDER BY log_id', id=patient_id)
+    version = patient_column(sharded_app, source, 'patient_summary', 'data_version', patient_id)[0]
+
+    seen = []
+    copy_patient_rows = rebalance.copy_patient_rows
+    def copy_while_frozen(*args):
+        # Frozen: the directory says moving, and the patient's writes are refused
+        seen.append(directory(sharded_app, patient_id))
+        seen.append(client.post('/api/symptoms', json={'rhinitis_congestion': 1}).status_code)
+        seen.append(client.get('/api/conditions').status_code)
+        return copy_patient_rows(*args)
+    monkeypatch.setattr(rebalance, 'copy_patient_rows', copy_while_frozen)
+
+    with sharded_app.app_context():
+        copied = rebalance.move_patient(patient_id, target, wait=0)
+        entry = db.session.get(PatientShard, patient_id)
+        assert (entry.shard, entry.moving) == (target, False)
+    assert copied > len(source_logs)
+    assert seen == [(source, True), 503, 200]
+
+    # Source rows are gone; the target has the logs under new ids with every reference rewritten
+    for table in ('symptom_logs', 'patients', 'patient_summary'):
+        assert patient_column(sharded_app, source, table, 'COUNT(*)', patient_id) == [0]
+    target_logs = rows(sharded_app, target, 'SELECT log_id, rhinitis_congestion FROM symptom_logs '
+                                            'WHERE patient_id = :id ORDER BY log_id', id=patient_id)
+    assert [score for _, score in target_logs] == [score for _, score in source_logs]
+    assert min(log_id for log_id, _ in target_logs) > max(log_id for log_id, _ in source_logs)
+    new_ids = {log_id for log_id, _ in target_logs}
+    spike_id = target_logs[-1][0]
+    assert patient_column(sharded_app, target, 'symptom_log_idempotency', 'log_id', patient_id) == [spike_id]
+    assert patient_column(sharded_app, target, 'symptom_log_flags', 'log_id', patient_id) == [spike_id]
+    assert patient_column(sharded_app, target, 'patient_baselines', 'last_log_id', patient_id)[0] in new_ids
+    assert patient_column(sharded_app, target, 'patient_summary', 'data_version', patient_id)[0] > version
+
+    # The patient carries on where they left off
+    replay = client.post('/api/symptoms/batch', json={'entries': [{'idempotency_key': 'spike', 'rhinitis_congestion': 5}]})
+    assert replay.json['results'][0] == {'index': 0, 'idempotency_key': 'spike', 'status': 'duplicate', 'log_id': spike_id}
+    assert client.post('/api/symptoms', json={'rhinitis_congestion': 2}).status_code == 201
+    doctor = sign_in_doctor(sharded_app)
+    assert len(doctor.get(f'/api/doctor/patient/{patient_id}/logs').json['logs']) == len(source_logs) + 1
+
+
+def test_login_does_not_rehash_a_moving_patient(sharded_app):
+    client = sign_up(sharded_app, 'rehash')
+    with sharded_app.app_context():
+        password_hasher.method, password_hasher._full_method = 'pbkdf2:sha256:1000', None
+        db.session.get(PatientShard, client.patient_id).moving = True
+        db.session.commit()
+    shard = directory(sharded_app, client.patient_id).shard
+    stored = patient_column(sharded_app, shard, 'patients', 'password', client.patient_id)
+
+    login = sharded_app.test_client().post('/api/login', json={'username': 'rehash', 'password': 'secret'})
+    assert login.status_code == 200
+    assert patient_column(sharded_app, shard, 'patients', 'password', client.patient_id) == stored
+
+    with sharded_app.app_context():
+        db.session.get(PatientShard, client.patient_id).moving = False
+        db.session.commit()
+    assert sharded_app.test_client().post('/api/login', json={'username': 'rehash', 'password': 'secret'}).status_code == 200
+    upgraded = patient_column(sharded_app, shard, 'patients', 'password', client.patient_id)
+    assert upgraded[0].startswith('pbkdf2:sha256:1000$')
+
+
+def test_registration_reuses_a_directory_entry_left_without_a_patient(sharded_app):
+    # What a sign-up leaves behind when the primary commits and its shard commit fails
+    with sharded_app.app_context():
+        entry = PatientShard(username='orphan', shard=0)
+        db.session.add(entry)
+        db.session.flush()
+        entry.shard = shard_router.place(entry.patient_id)
+        db.session.commit()
+        patient_id, shard = entry.patient_id, entry.shard
+
+    client = sharded_app.test_client()
+    assert client.post('/api/login', json={'username': 'orphan', 'password': 'secret'}).status_code == 401
+    response = client.post('/api/register', json={'username': 'orphan', 'password': 'secret'})
+    assert response.status_code == 201
+    assert response.json['patient_id'] == patient_id
+    assert patient_column(sharded_app, shard, 'patients', 'username', patient_id) == ['orphan']
+    login = sharded_app.test_client().post('/api/login', json={'username': 'orphan', 'password': 'secret'})
+    assert login.json['patient_id'] == patient_id
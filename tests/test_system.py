@@ -0,0 +1,19 @@
+"""Access to the operational endpoints."""
+from conftest import sign_in_doctor
+
+
+def test_metrics_need_a_doctor_without_a_token(app, patient_client, doctor_client):
+    assert app.test_client().get('/metrics').status_code == 401
+    assert patient_client.get('/metrics').status_code == 403
+    response = doctor_client.get('/metrics')
+    assert response.status_code == 200
+    assert b'password_hash' in response.data
+
+
+def test_metrics_accept_the_configured_token(make_app):
+    app = make_app(METRICS_TOKEN='scrape-me')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
+    assert sign_in_doctor(app).get('/metrics').status_code == 200
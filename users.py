@@ -0,0 +1,140 @@
+"""Logged-in principals for Flask-Login and current-user helpers."""
+from flask import current_app
+from flask_login import UserMixin, current_user
+from sqlalchemy import event
+
+from extensions import db, login_manager, principal_cache, shard_router
+from models import Doctor, Patient, PatientShard
+
+# --- User Loader for Flask-Login ---
+class Principal(UserMixin):
+    """Detached snapshot of a logged-in Patient or Doctor used as current_user.
+
+    Only carries identity fields so it can be cached across requests without
+    holding a database session; patients expose ``patient_id`` and doctors
+    ``doctor_id`` exactly like the models do.
+    """
+
+    def __init__(self, user):
+        self.user_type = user.user_type
+        self.username = user.username
+        self.first_name = user.first_name
+        self.last_name = user.last_name
+        self.active = getattr(user, 'is_active', True) is not False
+        if self.user_type == 'patient':
+            self.patient_id = user.patient_id
+        else:
+            self.doctor_id = user.doctor_id
+        self._id = user.get_id()
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def get_id(self):
+        return self._id
+
+def invalidate_principal(user_id):
+    """Drop a cached principal, e.g. after a password or profile change"""
+    principal_cache.pop(user_id)
+
+@login_manager.user_loader
+def load_user(user_id):
+    if current_app.config['PRINCIPAL_CACHE_TTL']:
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+    try:
+        if user_id.startswith('patient_'):
+            patient_id = int(user_id.replace('patient_', ''))
+            user = get_patient(patient_id)
+        elif user_id.startswith('doctor_'):
+            doctor_id = int(user_id.replace('doctor_', ''))
+            user = db.session.get(Doctor, doctor_id)
+        else:
+            user = get_patient(int(user_id))
+    except (TypeError, ValueError):
+        return None
+    if user is None:
+        return None
+
+    principal = Principal(user)
+    if current_app.config['PRINCIPAL_CACHE_TTL']:
+        principal_cache.set(user_id, principal)
+    return principal
+
+@event.listens_for(Patient, 'after_update')
+@event.listens_for(Patient, 'after_delete')
+@event.listens_for(Doctor, 'after_update')
+@event.listens_for(Doctor, 'after_delete')
+def _invalidate_user_principal(mapper, connection, target):
+    invalidate_principal(target.get_id())
+
+# --- Patient lookups that follow the shard directory ---
+def get_patient(patient_id):
+    """Patient by id, read from their shard when sharding is enabled"""
+    if shard_router.enabled:
+        location = shard_router.locate(patient_id)
+        if location is None:
+            return None
+        shard_router.use(location.shard)
+    return db.session.get(Patient, patient_id)
+
+def find_patient(username):
+    """Patient by username, read from their shard when sharding is enabled"""
+    if shard_router.enabled:
+        entry = shard_router.locate_username(username)
+        if entry is None:
+            return None
+        shard_router.use(entry[1])
+    return Patient.query.filter_by(username=username).first()
+
+def patient_moving(patient_id):
+    """Whether a patient's rows are being copied to another shard, so writes must wait"""
+    if not shard_router.enabled:
+        return False
+    location = shard_router.locate(patient_id)
+    return location is not None and location.moving
+
+def assign_patient_shard(username):
+    """Reserve a patient id in the shard directory and route this request to its shard.
+
+    The directory commits on the primary and the patient on its shard, so a
+    sign-up whose shard commit failed leaves an entry without a patient;
+    that entry is reused rather than locking the username out.
+    """
+    entry = PatientShard.query.filter_by(username=username).first()
+    if entry is None:
+        entry = PatientShard(username=username, shard=0)
+        db.session.add(entry)
+        db.session.flush()
+        entry.shard = shard_router.place(entry.patient_id)
+    shard_router.use(entry.shard)
+    return entry.patient_id
+
+# --- Helper Functions ---
+def get_current_user():
+    if current_user.is_authenticated:
+        return current_user
+    return None
+
+def get_current_user_id():
+    user = get_current_user()
+    if user:
+        if hasattr(user, 'patient_id'):
+            return user.patient_id
+        elif hasattr(user, 'doctor_id'):
+            return user.doctor_id
+    return None
+
+def get_current_user_type():
+    user = get_current_user()
+    if user:
+        return user.user_type
+    return None
+
+def get_current_patient_id():
+    if current_user.is_authenticated and hasattr(current_user, 'patient_id'):
+        return current_user.patient_id
+    return None
+